@@ -13,7 +13,7 @@ pause
 echo.
 echo Starting Backend Server...
 echo.
-start "DTMS Backend" cmd /k "cd web\backend && venv\Scripts\activate && python seed_data.py && uvicorn main:app --reload"
+start "DTMS Backend" cmd /k "cd web\backend && venv\Scripts\activate && alembic upgrade head && python seed_data.py && uvicorn main:app --reload"
 
 echo.
 echo Waiting for backend to start...
@@ -0,0 +1,129 @@
+"""
+Analytics Bucket Tests
+Tests for hour/day/week revenue and ridership buckets
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Booking, BookingStatus, Payment, PaymentStatus, PassengerCategoryBucket, Route, RouteRevenueBucket, User
+from schemas import BookingCreate, BookingUpdate, PaymentCreate
+from services import analytics_buckets
+from routers import bookings, payments
+
+# A Wednesday
+T0 = datetime(2026, 1, 7, 10, 30, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(id=1, email="ops@example.com", full_name="Ops", hashed_password="x"),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0),
+        Route(id=2, route_number="2", route_name="R2", start_location="B", end_location="C", fare=40.0),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+def add_paid_booking(db, booking_id, route_id, paid_at, amount, category="general", status=BookingStatus.CONFIRMED):
+    db.add(Booking(id=booking_id, user_id=1, route_id=route_id, booking_reference=f"BK{booking_id}",
+                   passenger_name="P", passenger_category=category, journey_date=paid_at,
+                   fare_amount=amount, status=status))
+    db.add(Payment(booking_id=booking_id, payment_method="upi", transaction_id=f"TXN{booking_id}",
+                   amount=amount, status=PaymentStatus.SUCCESS, payment_date=paid_at))
+
+def test_bucket_start_and_alignment():
+    assert analytics_buckets.bucket_start(T0, "hour") == T0.replace(minute=0)
+    assert analytics_buckets.bucket_start(T0, "day") == datetime(2026, 1, 7, tzinfo=timezone.utc)
+    assert analytics_buckets.bucket_start(T0, "week") == datetime(2026, 1, 5, tzinfo=timezone.utc)
+    assert analytics_buckets.granularity_for(datetime(2026, 1, 5), datetime(2026, 1, 12)) == "week"
+    assert analytics_buckets.granularity_for(datetime(2026, 1, 6), None) == "day"
+    assert analytics_buckets.granularity_for(T0) == "hour"
+    assert analytics_buckets.granularity_for() == "week"
+
+def test_rebuild_and_range_queries(db):
+    add_paid_booking(db, 1, 1, T0, 25.0, "student")
+    add_paid_booking(db, 2, 1, T0 + timedelta(days=1), 25.0)
+    add_paid_booking(db, 3, 2, T0 + timedelta(days=7), 40.0)
+    add_paid_booking(db, 4, 2, T0, 40.0, status=BookingStatus.CANCELLED)
+    db.commit()
+    assert analytics_buckets.rebuild(db)
+    # Rebuilding again replaces the buckets instead of adding to them
+    assert analytics_buckets.rebuild(db)
+
+    assert sorted(analytics_buckets.route_revenue(db), key=lambda r: r["route_name"]) == [
+        {"route_name": "R1", "revenue": 50.0}, {"route_name": "R2", "revenue": 80.0}
+    ]
+    day = datetime(2026, 1, 7, tzinfo=timezone.utc)
+    # Revenue counts successful payments, including the one of the cancelled booking
+    daily = analytics_buckets.route_revenue(db, day, day + timedelta(days=1))
+    assert sorted(r["revenue"] for r in daily) == [25.0, 40.0]
+    hourly = analytics_buckets.route_revenue(db, T0 + timedelta(hours=1), T0 + timedelta(days=1, hours=1))
+    assert hourly == [{"route_name": "R1", "revenue": 25.0}]
+    assert sorted(analytics_buckets.passenger_categories(db), key=lambda r: r["category"]) == [
+        {"category": "general", "count": 2}, {"category": "student", "count": 1}
+    ]
+
+    series = analytics_buckets.revenue_series(db, "week", day - timedelta(days=7), day + timedelta(days=14), route_id=2)
+    assert [(point["bucket_start"], point["revenue"]) for point in series] == [
+        (datetime(2026, 1, 5, tzinfo=timezone.utc), 40.0), (datetime(2026, 1, 12, tzinfo=timezone.utc), 40.0)
+    ]
+
+def test_write_paths_match_rebuild(db):
+    user = db.query(User).first()
+    created = [
+        bookings.create_booking(BookingCreate(route_id=route_id, passenger_name="P", passenger_category=category,
+                                              journey_date=T0 + timedelta(hours=hours)), db=db, current_user=user)
+        for route_id, category, hours in [(1, "general", 0), (1, "senior", 3), (2, "general", 30)]
+    ]
+    for booking in created:
+        payments.create_payment(PaymentCreate(booking_id=booking.id, payment_method="upi", amount=booking.fare_amount),
+                                db=db, current_user=user)
+    bookings.update_booking(created[1].id, BookingUpdate(status=BookingStatus.CANCELLED), db=db, current_user=user)
+
+    def snapshot():
+        revenue = {(r.granularity, r.route_id): r.revenue for r in db.query(RouteRevenueBucket).filter(
+            RouteRevenueBucket.granularity != "hour")}
+        passengers = sorted(
+            (p.granularity, p.bucket_start, p.category, p.passengers)
+            for p in db.query(PassengerCategoryBucket) if p.passengers
+        )
+        return revenue, passengers
+
+    incremental = snapshot()
+    analytics_buckets.rebuild(db)
+    assert snapshot() == incremental
+    assert analytics_buckets.passenger_categories(db) == [{"category": "general", "count": 2}]
+
+def test_rebuild_only_writes_drifted_buckets(db):
+    add_paid_booking(db, 1, 1, T0, 25.0)
+    add_paid_booking(db, 2, 2, T0, 40.0, "student")
+    db.commit()
+    analytics_buckets.rebuild(db)
+    expected = analytics_buckets.route_revenue(db), analytics_buckets.passenger_categories(db)
+
+    # A lost write, a bucket left behind by a deleted payment and a missing bucket
+    db.query(RouteRevenueBucket).filter_by(granularity="week", route_id=1).update({"revenue": 10.0})
+    db.add(RouteRevenueBucket(granularity="week", bucket_start=T0 - timedelta(days=30), route_id=2, revenue=99.0))
+    db.query(PassengerCategoryBucket).filter_by(granularity="week", category="student").delete()
+    db.commit()
+    analytics_buckets.rebuild(db)
+    assert (analytics_buckets.route_revenue(db), analytics_buckets.passenger_categories(db)) == expected
+
+    writes = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", record)
+    assert analytics_buckets.rebuild(db)
+    event.remove(db.get_bind(), "before_cursor_execute", record)
+    assert writes == []
@@ -0,0 +1,151 @@
+"""
+Analytics Job Tests
+Tests for background analytics jobs with result polling and caching
+"""
+import pytest
+import time
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import AnalyticsJob, Booking, BookingStatus, Payment, PaymentStatus, Route, User
+from schemas import AnalyticsJobCreate
+from services import analytics_buckets, analytics_jobs
+from services.analytics_jobs import AnalyticsJobRunner
+from routers import analytics
+
+T0 = datetime(2026, 1, 7, 10, 30, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # Jobs run on other threads with their own sessions, so use a file database
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(analytics_jobs, "SessionLocal", Session)
+    session = Session()
+    session.add_all([
+        User(id=1, email="ops@example.com", full_name="Ops", hashed_password="x"),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0),
+        Booking(id=1, user_id=1, route_id=1, booking_reference="BK1", passenger_name="P", journey_date=T0,
+                fare_amount=25.0, status=BookingStatus.CONFIRMED),
+        Payment(booking_id=1, payment_method="upi", transaction_id="TXN1", amount=25.0,
+                status=PaymentStatus.SUCCESS, payment_date=T0),
+    ])
+    session.commit()
+    analytics_buckets.rebuild(session)
+    yield session
+    session.close()
+
+@pytest.fixture
+def runner(monkeypatch):
+    runner = AnalyticsJobRunner(2, queue_size=5, cache_seconds=60, timeout_seconds=60, retention_hours=24)
+    monkeypatch.setattr(analytics, "job_runner", runner)
+    yield runner
+    runner.shutdown()
+
+def submit(db, **fields):
+    response = Response()
+    body = analytics.create_analytics_job(AnalyticsJobCreate(**fields), response=response, db=db)
+    return body, response
+
+def wait(db, job_id):
+    for _ in range(200):
+        db.expire_all()
+        response = Response()
+        body = analytics.get_analytics_job(job_id, response=response, db=db)
+        if body["status"] not in ("queued", "running"):
+            return body, response
+        time.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+def test_job_computes_the_endpoint_result(db, runner):
+    body, response = submit(db, job_type="route-revenue", **{"from": T0 - timedelta(days=1)})
+    assert body["status"] in ("queued", "running", "succeeded")
+    assert response.headers["Location"] == f"jobs/{body['id']}"
+    done, response = wait(db, body["id"])
+    assert done["status"] == "succeeded" and done["error"] is None
+    assert done["result"] == [{"route_name": "R1", "revenue": 25.0}]
+    assert done["params"] == {"from": "2026-01-06T10:30:00+00:00"}
+    assert response.headers["Cache-Control"] == "private, max-age=60"
+
+    series, _ = submit(db, job_type="passenger-categories/timeseries", bucket="week", to=T0 + timedelta(days=1))
+    done, _ = wait(db, series["id"])
+    assert done["result"] == [{"bucket_start": "2026-01-05T00:00:00+00:00", "category": "general", "count": 1}]
+
+def test_identical_jobs_reuse_a_fresh_result(db, runner):
+    first, _ = submit(db, job_type="kpis")
+    wait(db, first["id"])
+    again, _ = submit(db, job_type="kpis")
+    assert again["id"] == first["id"] and again["status"] == "succeeded"
+
+    runner.cache_seconds = 0
+    recomputed, _ = submit(db, job_type="kpis")
+    assert recomputed["id"] != first["id"]
+    assert wait(db, recomputed["id"])[0]["result"]["passenger_count"] == 1
+
+def test_invalid_jobs_are_rejected_up_front(db, runner):
+    with pytest.raises(HTTPException) as error:
+        submit(db, job_type="drop-tables")
+    assert error.value.status_code == 400
+    with pytest.raises(HTTPException) as error:
+        submit(db, job_type="route-revenue/timeseries", bucket="hour", **{"from": T0 - timedelta(days=60), "to": T0})
+    assert error.value.status_code == 400
+    assert db.query(AnalyticsJob).count() == 0
+
+def test_full_queue_and_failures(db, runner, monkeypatch):
+    runner.queue_size = 0
+    with pytest.raises(HTTPException) as error:
+        submit(db, job_type="kpis")
+    assert error.value.status_code == 503
+
+    runner.queue_size = 5
+    def broken(db):
+        raise HTTPException(status_code=400, detail="boom")
+    monkeypatch.setitem(analytics.JOB_TYPES, "kpis", (broken, ()))
+    failed, _ = wait(db, submit(db, job_type="kpis")[0]["id"])
+    assert failed["status"] == "failed" and failed["error"] == "boom"
+    assert failed["result"] is None
+
+def test_lost_jobs_time_out(db, runner):
+    db.add(AnalyticsJob(id="lost", job_type="kpis", params="{}", params_hash="x", status="running",
+                        created_at=datetime.now(timezone.utc) - timedelta(minutes=5)))
+    db.commit()
+    response = Response()
+    job = analytics.get_analytics_job("lost", response=response, db=db)
+    assert job["status"] == "failed" and job["error"] == "Job timed out"
+    with pytest.raises(HTTPException):
+        analytics.get_analytics_job("missing", response=Response(), db=db)
+
+def test_long_queue_waits_and_runs_do_not_time_out(db, runner):
+    created = datetime.now(timezone.utc) - timedelta(minutes=5)
+    db.add_all([
+        # Started recently after waiting in a full queue
+        AnalyticsJob(id="slow", job_type="kpis", params="{}", params_hash="x", status="running",
+                     created_at=created, started_at=datetime.now(timezone.utc)),
+        # Still queued in this worker
+        AnalyticsJob(id="queued", job_type="kpis", params="{}", params_hash="y", status="queued", created_at=created),
+    ])
+    db.commit()
+    runner._jobs.add("queued")
+    assert analytics.get_analytics_job("slow", response=Response(), db=db)["status"] == "running"
+    assert analytics.get_analytics_job("queued", response=Response(), db=db)["status"] == "queued"
+
+def test_timed_out_job_is_not_flipped_back(db, runner):
+    db.add(AnalyticsJob(id="late", job_type="kpis", params="{}", params_hash="x", status="queued",
+                        created_at=datetime.now(timezone.utc) - timedelta(minutes=5)))
+    db.commit()
+    assert analytics.get_analytics_job("late", response=Response(), db=db)["status"] == "failed"
+
+    # The worker that had it queued gets to it afterwards
+    runner._in_flight += 1
+    runner._run("late", lambda db: {"value": 1})
+    db.expire_all()
+    job = analytics.get_analytics_job("late", response=Response(), db=db)
+    assert job["status"] == "failed" and job["result"] is None
@@ -0,0 +1,101 @@
+"""
+Async Read Path Tests
+Tests for the async engine and the endpoints served from it
+"""
+import pytest
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import Base, async_url
+from models import Bus, Route, Stop
+from pagination import Page
+from routers import analytics, buses, routes, stops
+
+def run_with_session(tmp_path, *steps):
+    """Create the schema in a fresh async SQLite database and await each step(db) in order"""
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        results = []
+        try:
+            for step in steps:
+                async with session_factory() as db:
+                    results.append(await step(db))
+        finally:
+            await engine.dispose()
+        return results
+    return asyncio.run(main())
+
+async def seed(db):
+    db.add_all([
+        Bus(id=1, bus_number="DL-1", registration_number="REG-1", capacity=40, is_active=True),
+        Bus(id=2, bus_number="DL-2", registration_number="REG-2", capacity=50, is_active=False),
+    ])
+    db.add_all([
+        Route(id=1, route_number="R1", route_name="One", bus_id=1, start_location="A", end_location="B", fare=20.0),
+        Route(id=2, route_number="R2", route_name="Two", bus_id=2, start_location="B", end_location="C", fare=30.0),
+    ])
+    db.add_all([
+        Stop(route_id=1, stop_name="Second", stop_order=2),
+        Stop(route_id=1, stop_name="First", stop_order=1),
+        Stop(route_id=2, stop_name="Other", stop_order=1),
+    ])
+    await db.commit()
+
+def test_async_url():
+    assert async_url("postgresql://user:secret@db:5432/dtms") == "postgresql+asyncpg://user:secret@db:5432/dtms"
+    assert async_url("postgresql+psycopg2://user@db/dtms") == "postgresql+asyncpg://user@db/dtms"
+    assert async_url("sqlite:///./test.db") == "sqlite+aiosqlite:///./test.db"
+    with pytest.raises(ValueError):
+        async_url("mysql://user@db/dtms")
+
+def test_route_and_bus_listing(tmp_path):
+    _, all_routes, filtered, route, all_buses = run_with_session(
+        tmp_path,
+        seed,
+        lambda db: routes.get_routes(bus_id=None, page=Page(routes.route_pages), db=db),
+        lambda db: routes.get_routes(bus_id=2, page=Page(routes.route_pages), db=db),
+        lambda db: routes.get_route(route_id=1, db=db),
+        lambda db: buses.get_buses(page=Page(buses.bus_pages, limit=1), db=db),
+    )
+    assert [r.route_number for r in all_routes] == ["R1", "R2"]
+    assert [r.route_number for r in filtered] == ["R2"]
+    assert route.route_name == "One"
+    assert [b.bus_number for b in all_buses] == ["DL-1"]
+
+def test_missing_route_is_404(tmp_path):
+    async def missing(db):
+        with pytest.raises(Exception) as error:
+            await routes.get_route(route_id=99, db=db)
+        return error.value.status_code
+    assert run_with_session(tmp_path, missing) == [404]
+
+def test_stops_are_ordered(tmp_path):
+    _, by_route, filtered = run_with_session(
+        tmp_path,
+        seed,
+        lambda db: stops.get_stops_by_route(route_id=1, db=db),
+        lambda db: stops.get_stops(route_id=1, page=Page(stops.stop_pages, skip=1), db=db),
+    )
+    assert [s.stop_name for s in by_route] == ["First", "Second"]
+    assert [s.stop_name for s in filtered] == ["Second"]
+
+def test_kpis_reconcile_on_async_session(tmp_path):
+    _, kpis, again = run_with_session(
+        tmp_path,
+        seed,
+        analytics.get_kpis,
+        analytics.get_kpis,
+    )
+    assert kpis["active_buses"] == 1
+    assert kpis["passenger_count"] == 0
+    assert again == kpis
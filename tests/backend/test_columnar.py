@@ -0,0 +1,113 @@
+"""
+Columnar Snapshot Tests
+Tests for the .npy snapshot export and NumPy group-by aggregation
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Booking, BookingStatus, Payment, PaymentStatus, Route, User
+
+np = pytest.importorskip("numpy")
+
+from services.columnar import ColumnarSnapshot, date_bucket, export_snapshot
+
+# A Wednesday
+T0 = datetime(2026, 1, 7, 10, 30, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(id=1, email="ops@example.com", full_name="Ops", hashed_password="x"),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0),
+        Route(id=2, route_number="2", route_name="R2", start_location="B", end_location="C", fare=40.0),
+        Route(id=3, route_number="3", route_name="R3", start_location="C", end_location="D", fare=10.0),
+    ])
+    rows = [
+        (1, 1, "student", 0, 25.0, BookingStatus.CONFIRMED, PaymentStatus.SUCCESS),
+        (2, 1, "general", 1, 25.0, BookingStatus.COMPLETED, PaymentStatus.SUCCESS),
+        (3, 2, "general", 7, 40.0, BookingStatus.CONFIRMED, PaymentStatus.SUCCESS),
+        (4, 2, "senior_citizen", 7, 40.0, BookingStatus.CANCELLED, PaymentStatus.REFUNDED),
+        (5, 2, None, 8, 40.0, BookingStatus.PENDING, None),
+    ]
+    for booking_id, route_id, category, days, amount, status, payment_status in rows:
+        at = T0 + timedelta(days=days)
+        session.add(Booking(id=booking_id, user_id=1, route_id=route_id, booking_reference=f"BK{booking_id}",
+                            passenger_name="P", passenger_category=category, journey_date=at,
+                            fare_amount=amount, status=status))
+        if payment_status is not None:
+            session.add(Payment(booking_id=booking_id, payment_method="upi", transaction_id=f"TXN{booking_id}",
+                                amount=amount, status=payment_status, payment_date=at))
+    session.commit()
+    yield session
+    session.close()
+
+@pytest.fixture
+def snapshot(db, tmp_path):
+    return ColumnarSnapshot(export_snapshot(db, str(tmp_path)))
+
+def test_export_writes_memory_mapped_columns(snapshot, tmp_path):
+    assert ColumnarSnapshot.latest(str(tmp_path)).path == snapshot.path
+    bookings = snapshot["bookings"]
+    assert len(bookings) == 5 and len(snapshot["payments"]) == 4 and len(snapshot["routes"]) == 3
+    assert isinstance(bookings["fare_amount"], np.memmap)
+    assert bookings["id"].tolist() == [1, 2, 3, 4, 5]
+    assert bookings["journey_date"][0] == np.datetime64("2026-01-07T10:30:00")
+    # Missing integers are stored as -1, enums by value
+    assert snapshot["routes"]["bus_id"].tolist() == [-1, -1, -1]
+    assert "confirmed" in bookings.categories["status"]
+    assert not os.path.exists(os.path.join(str(tmp_path), "LATEST.tmp"))
+
+def test_group_by_matches_sql(db, snapshot):
+    bookings = snapshot["bookings"]
+    counted = bookings.isin("status", ["confirmed", "completed"])
+    rows = bookings.group_by(["passenger_category"], where=counted)
+    assert {row["passenger_category"]: row["count"] for row in rows} == {"student": 1, "general": 2}
+
+    expected = dict(db.query(Booking.route_id, func.sum(Booking.fare_amount)).group_by(Booking.route_id).all())
+    rows = bookings.group_by(["route_id"], "fare_amount", "sum")
+    assert {row["route_id"]: row["sum"] for row in rows} == expected
+    rows = bookings.group_by(["route_id"], "fare_amount", "mean")
+    assert {row["route_id"]: row["mean"] for row in rows} == {1: 25.0, 2: 40.0}
+
+def test_group_by_date_buckets_and_joined_keys(snapshot):
+    payments = snapshot["payments"]
+    bookings = snapshot["bookings"]
+    route_ids = bookings.lookup("id", payments["booking_id"], "route_id")
+    succeeded = payments.isin("status", ["success"])
+    rows = payments.group_by([("payment_date", "week"), ("route_id", route_ids)], "amount", "sum", where=succeeded)
+    assert rows == [
+        {"payment_date": datetime(2026, 1, 5, tzinfo=timezone.utc), "route_id": 1, "sum": 50.0},
+        {"payment_date": datetime(2026, 1, 12, tzinfo=timezone.utc), "route_id": 2, "sum": 40.0},
+    ]
+    rows = bookings.group_by([("journey_date", "day")])
+    assert [row["count"] for row in rows] == [1, 1, 2, 1]
+
+def test_date_bucket_weeks_start_on_monday():
+    days = np.array(["2026-01-04T23:00", "2026-01-05T00:00", "2026-01-11T12:00"], dtype="datetime64[s]")
+    assert date_bucket(days, "week").astype(str).tolist() == ["2025-12-29", "2026-01-05", "2026-01-05"]
+    assert date_bucket(days, "hour")[2] == np.datetime64("2026-01-11T12")
+    with pytest.raises(ValueError):
+        date_bucket(days, "month")
+
+def test_old_snapshots_are_pruned(db, tmp_path, monkeypatch):
+    import services.columnar as columnar
+    names = iter(["20260101T000000Z", "20260102T000000Z", "20260103T000000Z"])
+    class Clock:
+        @staticmethod
+        def now(tz=None):
+            return datetime.strptime(next(names), "%Y%m%dT%H%M%SZ")
+    monkeypatch.setattr(columnar, "datetime", Clock)
+    for _ in range(3):
+        export_snapshot(db, str(tmp_path), keep=2)
+    assert sorted(os.listdir(str(tmp_path))) == ["20260102T000000Z", "20260103T000000Z", "LATEST"]
+    assert ColumnarSnapshot.latest(str(tmp_path)).path.endswith("20260103T000000Z")
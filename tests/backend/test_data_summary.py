@@ -0,0 +1,77 @@
+"""
+Data Summary Tests
+Tests for the set-based reporting command
+"""
+import pytest
+import json
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Booking, BookingStatus, Bus, Payment, PaymentStatus, Route, User
+import data_summary
+
+T0 = datetime(2026, 1, 7, 10, 30, tzinfo=timezone.utc)
+
+@pytest.fixture
+def session_factory(tmp_path):
+    # Sections run on separate connections, so use a file database
+    engine = create_engine(f"sqlite:///{tmp_path / 'summary.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add_all([
+        User(id=1, email="ops@example.com", full_name="Ops", hashed_password="x"),
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=50, bus_type="AC"),
+        Bus(id=2, bus_number="DTC-2", registration_number="DL-2", capacity=50, bus_type="AC", is_active=False),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0),
+    ])
+    rows = [
+        (1, "student", 20.0, BookingStatus.CONFIRMED, PaymentStatus.SUCCESS, "upi"),
+        (2, "general", 45.0, BookingStatus.COMPLETED, PaymentStatus.SUCCESS, "credit_card"),
+        (3, "general", 120.0, BookingStatus.CANCELLED, PaymentStatus.REFUNDED, "upi"),
+        (4, "senior", 45.0, BookingStatus.PENDING, None, None),
+    ]
+    for booking_id, category, fare, status, payment_status, method in rows:
+        session.add(Booking(id=booking_id, user_id=1, route_id=1, booking_reference=f"BK{booking_id}",
+                            passenger_name="P", passenger_category=category, journey_date=T0,
+                            fare_amount=fare, status=status))
+        if payment_status is not None:
+            session.add(Payment(booking_id=booking_id, payment_method=method, transaction_id=f"TXN{booking_id}",
+                                amount=fare, status=payment_status))
+    session.commit()
+    session.close()
+    return Session
+
+def test_sections_are_computed_by_aggregates(session_factory):
+    summary = data_summary.collect_summary(session_factory)
+    assert list(summary) == list(data_summary.SECTIONS)
+    assert summary["basic_statistics"] == {
+        "users": 1, "routes": 1, "buses": 2, "active_buses": 1, "bookings": 4, "payments": 3, "live_locations": 0
+    }
+    assert summary["revenue_statistics"] == {"total_revenue": 65.0, "successful_payments": 2, "average_fare": 32.5}
+    assert summary["booking_status_distribution"] == {"pending": 1, "confirmed": 1, "cancelled": 1, "completed": 1}
+    assert summary["passenger_categories"] == {"general": 1, "student": 1}
+    assert summary["payment_methods"] == {"credit_card": 1, "upi": 1}
+    assert summary["fare_distribution"] == {"₹0-25": 1, "₹25-50": 2, "₹50-75": 0, "₹75-100": 0, "₹100+": 1}
+    assert summary["bus_types"] == {"AC": 2}
+    assert summary["sample_fares"] == [20.0, 45.0, 120.0]
+
+def test_text_and_json_output(session_factory, monkeypatch, capsys):
+    collect = data_summary.collect_summary
+    monkeypatch.setattr(data_summary, "collect_summary", lambda: collect(session_factory))
+    data_summary.show_data_summary(as_json=True)
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["revenue_statistics"]["total_revenue"] == 65.0
+
+    data_summary.show_data_summary()
+    out = capsys.readouterr().out
+    assert "Buses: 2 (Active: 1)" in out
+    assert "Total Revenue: ₹65.00" in out
+    assert "Credit Card: 1" in out
+    assert "₹100+: 1 bookings" in out
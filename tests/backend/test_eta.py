@@ -0,0 +1,114 @@
+"""
+Stop ETA Tests
+Tests for per-tick arrival predictions from map-matched progress
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Bus, Route, Stop
+from services.location_store import LiveLocationStore
+
+pytest.importorskip("numpy")
+
+from services.eta import EtaEngine
+from services.map_matching import MapMatcher
+
+T0 = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc)
+
+# Three stops ~1.1 km apart heading north
+STOPS = [(1, 28.60, 77.2), (2, 28.61, 77.2), (3, 28.62, 77.2)]
+
+def fix(bus_id, latitude, speed=36.0, seconds=0, longitude=77.2):
+    return {
+        "bus_id": bus_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "speed": speed,
+        "heading": None,
+        "last_updated": T0 + timedelta(seconds=seconds),
+    }
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=50),
+        Bus(id=2, bus_number="DTC-2", registration_number="DL-2", capacity=50),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B",
+              fare=10.0, bus_id=1, distance_km=2.2, estimated_duration_minutes=11),
+    ])
+    # Inserted out of order to check stop_order is respected
+    session.add_all([
+        Stop(id=stop_id, route_id=1, stop_name=f"S{stop_id}", stop_order=stop_id, latitude=lat, longitude=lon)
+        for stop_id, lat, lon in reversed(STOPS)
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+@pytest.fixture
+def engine(db):
+    store = LiveLocationStore()
+    store.load(db)
+    engine = EtaEngine(store, MapMatcher(store))
+    engine.load(db)
+    return engine
+
+def tick(engine, bus_ids):
+    """What the live tracking tick runs for changed buses"""
+    engine.matcher.update(bus_ids)
+    engine.update(bus_ids)
+
+def test_downstream_stops_get_arrivals(engine):
+    engine.store.apply([fix(1, 28.605)])
+    tick(engine, [1])
+    assert engine.arrivals(1) == []
+    arrival = engine.arrivals(2)[0]
+    assert arrival["bus_id"] == 1 and arrival["route_id"] == 1
+    # 556 m at 36 km/h (10 m/s)
+    assert arrival["eta_seconds"] == pytest.approx(56, abs=1)
+    assert abs((arrival["expected_arrival"] - T0).total_seconds() - arrival["distance_m"] / 10) < 0.1
+    assert engine.arrivals(3)[0]["eta_seconds"] == pytest.approx(167, abs=1)
+
+def test_predictions_follow_the_bus_and_fall_back_to_route_speed(engine):
+    engine.store.apply([fix(1, 28.605)])
+    tick(engine, [1])
+    engine.store.apply([fix(1, 28.615, speed=0.0, seconds=60)])
+    tick(engine, [1])
+    assert engine.arrivals(2) == []
+    # Stationary bus: route average of 12 km/h over the remaining 556 m
+    assert engine.arrivals(3)[0]["eta_seconds"] == pytest.approx(167, abs=1)
+
+def test_off_route_and_unassigned_buses_get_no_predictions(engine):
+    engine.store.apply([fix(1, 28.605, longitude=77.3), fix(2, 28.605)])
+    tick(engine, [1, 2])
+    assert engine.arrivals(2) == []
+    assert engine.arrivals(3) == []
+
+def test_rebuild_route_drops_predictions_of_reassigned_bus(engine, db):
+    engine.store.apply([fix(1, 28.605)])
+    tick(engine, [1])
+    route = db.query(Route).filter(Route.id == 1).first()
+    route.bus_id = 2
+    db.commit()
+    engine.store.assign_route(1, 2)
+    engine.rebuild_route(db, 1)
+    assert engine.arrivals(3) == []
+
+def test_matched_progress_is_kept_in_the_store(engine):
+    engine.store.apply([fix(1, 28.615)])
+    tick(engine, [1])
+    progress, offset = engine.store.progress(1)[1]
+    assert progress == pytest.approx(1668, rel=1e-3)
+    assert offset == pytest.approx(0, abs=0.01)
+    engine.store.assign_route(1, None)
+    assert engine.store.progress(1) == {}
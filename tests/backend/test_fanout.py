@@ -0,0 +1,189 @@
+"""
+Fan-out Backend Tests
+Tests for delivering live location updates across workers
+"""
+import asyncio
+import pytest
+import tempfile
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Bus, Route, Stop
+from routers import websocket
+from services.fanout import (
+    InProcessBackend, UnixSocketBackend, decode_changes, decode_rows, encode_changes, encode_rows
+)
+from services.location_store import LiveLocationStore
+from services.spatial_index import StopIndex
+
+def row(bus_id, heading=None):
+    return {
+        "bus_id": bus_id,
+        "latitude": 28.613912,
+        "longitude": 77.209023,
+        "speed": 30.0,
+        "heading": heading,
+        "last_updated": datetime(2026, 1, 1, 8, 0, 5, tzinfo=timezone.utc),
+    }
+
+def test_rows_round_trip():
+    """Test rows survive the datagram encoding unchanged"""
+    rows = [row(1), row(2, heading=90.0)]
+    assert decode_rows(encode_rows(rows)) == rows
+
+def test_changes_round_trip():
+    """Test change notices survive the datagram encoding and are not read as rows"""
+    changes = [("bus", 1), ("route", 7), ("stop", 70000)]
+    data = encode_changes(changes)
+    assert decode_changes(data) == changes
+    with pytest.raises(ValueError):
+        decode_rows(data)
+
+def test_in_process_backend():
+    """Test the in-process backend calls the handler directly"""
+    async def scenario():
+        received = []
+        async def handler(rows):
+            received.extend(rows)
+        backend = InProcessBackend()
+        await backend.start(handler)
+        await backend.publish([row(1)])
+        await backend.stop()
+        assert [r["bus_id"] for r in received] == [1]
+    asyncio.run(scenario())
+
+def test_unix_socket_backend_reaches_other_workers():
+    """Test a publish on one worker runs the handler on every worker"""
+    async def scenario(directory):
+        received = {"a": [], "b": []}
+        def handler_for(name):
+            async def handler(rows):
+                received[name].extend(r["bus_id"] for r in rows)
+            return handler
+        a = UnixSocketBackend(directory, name="a")
+        b = UnixSocketBackend(directory, name="b")
+        await a.start(handler_for("a"))
+        await b.start(handler_for("b"))
+        await a.publish([row(1), row(2)])
+        for _ in range(50):
+            if received["b"]:
+                break
+            await asyncio.sleep(0.01)
+        await a.stop()
+        await b.stop()
+        assert received == {"a": [1, 2], "b": [1, 2]}
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+
+def test_unix_socket_backend_forgets_dead_workers():
+    """Test sockets left by dead workers are removed"""
+    async def scenario(directory):
+        stale = os.path.join(directory, "worker-dead.sock")
+        import socket
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.bind(stale)
+        sock.close()
+        backend = UnixSocketBackend(directory, name="live")
+        async def handler(rows):
+            pass
+        await backend.start(handler)
+        await backend.publish([row(1)])
+        await backend.stop()
+        assert not os.path.exists(stale)
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+
+def test_unix_socket_backend_sends_changes_to_other_workers():
+    """Test changes reach the other workers but not the one that made them"""
+    async def scenario(directory):
+        received = {"a": [], "b": []}
+        def handler_for(name):
+            async def handler(changes):
+                received[name].extend(changes)
+            return handler
+        async def on_rows(rows):
+            pass
+        a = UnixSocketBackend(directory, name="a")
+        b = UnixSocketBackend(directory, name="b")
+        await a.start(on_rows, handler_for("a"))
+        await b.start(on_rows, handler_for("b"))
+        a.publish_changes([("bus", 3), ("route", 4)])
+        for _ in range(50):
+            if received["b"]:
+                break
+            await asyncio.sleep(0.01)
+        await a.stop()
+        await b.stop()
+        assert received == {"a": [], "b": [("bus", 3), ("route", 4)]}
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(directory))
+
+class RecordingEtaEngine:
+    def __init__(self):
+        self.rebuilt = []
+
+    def rebuild_route(self, db, route_id):
+        self.rebuilt.append(route_id)
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    """The caches of a worker that did not handle the writes, over a shared database"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'fanout.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    db.add_all([
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=50),
+        Bus(id=2, bus_number="DTC-2", registration_number="DL-2", capacity=50),
+        Bus(id=3, bus_number="DTC-3", registration_number="DL-3", capacity=50),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=10.0, bus_id=1),
+        Stop(id=1, route_id=1, stop_name="S1", stop_order=1, latitude=28.6, longitude=77.2),
+    ])
+    db.commit()
+    store, stops, eta = LiveLocationStore(), StopIndex(), RecordingEtaEngine()
+    store.load(db)
+    stops.load(db)
+    monkeypatch.setattr(websocket, "SessionLocal", Session)
+    monkeypatch.setattr(websocket, "live_locations", store)
+    monkeypatch.setattr(websocket, "stop_index", stops)
+    monkeypatch.setattr(websocket, "eta_engine", eta)
+    yield db, store, stops, eta
+    db.close()
+
+def test_changes_reload_buses_routes_and_stops(worker):
+    """Test another worker's bus, route and stop writes reach this worker's caches"""
+    db, store, stops, eta = worker
+    store.apply([row(1), row(3)])
+    db.get(Bus, 1).is_active = False
+    db.get(Route, 1).bus_id = 2
+    db.delete(db.get(Bus, 3))
+    db.delete(db.get(Stop, 1))
+    db.add(Stop(id=2, route_id=1, stop_name="S2", stop_order=2, latitude=28.61, longitude=77.2))
+    db.commit()
+
+    asyncio.run(websocket.on_fanout_changes([
+        ("bus", 1), ("route", 1), ("bus", 3), ("stop", 1), ("stop", 2),
+    ]))
+    assert store.snapshot() == []
+    assert store.get(3) is None
+    assert store.route_ids(1) == () and store.route_ids(2) == (1,)
+    assert eta.rebuilt == [1]
+    assert [stop["id"] for stop in stops.nearby(28.6, 77.2, 5000, 10)] == [2]
+
+def test_positions_for_unloaded_buses_are_kept(worker):
+    """Test a position for a bus created through another worker is not dropped"""
+    db, store, _, _ = worker
+    db.add(Bus(id=4, bus_number="DTC-4", registration_number="DL-4", capacity=50))
+    db.commit()
+
+    asyncio.run(websocket.on_fanout_locations([row(4)]))
+    assert store.get(4)["latitude"] == row(4)["latitude"]
@@ -0,0 +1,99 @@
+"""
+KPI Rollup Tests
+Tests that the write paths keep the KPI rollup equal to the full aggregates
+"""
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Booking, BookingStatus, Bus, KPIRollup, Route, User
+from schemas import BookingCreate, BookingUpdate, BusCreate, BusUpdate, PaymentCreate
+from services import kpi_rollup
+from routers import bookings, buses, payments
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    user = User(id=1, email="ops@example.com", full_name="Ops", hashed_password="x")
+    session.add_all([
+        user,
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=50),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+def booking_request():
+    return BookingCreate(route_id=1, passenger_name="Asha", journey_date=datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+def test_read_fills_an_empty_rollup(db):
+    assert kpi_rollup.read(db) == {"active_buses": 1, "total_revenue": 0.0, "passenger_count": 0}
+
+def test_write_paths_keep_rollup_in_step(db):
+    kpi_rollup.read(db)
+    user = db.query(User).first()
+
+    bus = buses.create_bus(BusCreate(bus_number="DTC-2", registration_number="DL-2", capacity=40), db=db, current_user=user)
+    buses.update_bus(1, BusUpdate(is_active=False), db=db, current_user=user)
+    first = bookings.create_booking(booking_request(), db=db, current_user=user)
+    second = bookings.create_booking(booking_request(), db=db, current_user=user)
+    payments.create_payment(PaymentCreate(booking_id=first.id, payment_method="upi", amount=25.0), db=db, current_user=user)
+    payments.create_payment(PaymentCreate(booking_id=second.id, payment_method="card", amount=30.0), db=db, current_user=user)
+    bookings.update_booking(second.id, BookingUpdate(status=BookingStatus.CANCELLED), db=db, current_user=user)
+    bookings.update_booking(first.id, BookingUpdate(status=BookingStatus.COMPLETED), db=db, current_user=user)
+    buses.delete_bus(bus.id, db=db, current_user=user)
+
+    assert kpi_rollup.read(db) == {"active_buses": 0, "total_revenue": 55.0, "passenger_count": 1}
+    assert kpi_rollup.read(db) == kpi_rollup.compute(db)
+
+def test_reconcile_corrects_drift(db):
+    kpi_rollup.read(db)
+    # Written behind the API's back, as the seed scripts do
+    db.add(Booking(user_id=1, route_id=1, booking_reference="BKSEED", passenger_name="Seed",
+                   journey_date=datetime(2026, 1, 1, tzinfo=timezone.utc), fare_amount=25.0,
+                   status=BookingStatus.CONFIRMED))
+    db.commit()
+    assert kpi_rollup.read(db)["passenger_count"] == 0
+    drift = kpi_rollup.reconcile(db)
+    assert drift["passenger_count"] == 1
+    assert kpi_rollup.read(db)["passenger_count"] == 1
+
+def test_writes_are_spread_over_shards(db):
+    kpi_rollup.read(db)
+    for _ in range(40):
+        kpi_rollup.adjust(db, total_revenue=1.0)
+    db.commit()
+    shards = [value for value, in db.query(KPIRollup.value).filter(KPIRollup.name == "total_revenue")]
+    assert len(shards) > 1
+    assert kpi_rollup.read(db)["total_revenue"] == 40.0
+
+    kpi_rollup.reconcile(db)
+    assert db.query(KPIRollup.shard).filter(KPIRollup.name == "total_revenue", KPIRollup.value != 0).all() == []
+    assert kpi_rollup.read(db)["total_revenue"] == 0.0
+
+def test_reconcile_locks_the_rollup_before_computing(db, monkeypatch):
+    calls = []
+    compute = kpi_rollup.compute
+    monkeypatch.setattr(kpi_rollup, "lock_table_exclusive", lambda db, table: calls.append(("lock", table)))
+    monkeypatch.setattr(kpi_rollup, "compute", lambda db: calls.append(("compute",)) or compute(db))
+    kpi_rollup.reconcile(db)
+    assert calls == [("lock", "kpi_rollup"), ("compute",)]
+
+def test_only_one_worker_reconciles(db, monkeypatch):
+    kpi_rollup.read(db)
+    db.add(Booking(user_id=1, route_id=1, booking_reference="BKSEED", passenger_name="Seed",
+                   journey_date=datetime(2026, 1, 1, tzinfo=timezone.utc), fare_amount=25.0,
+                   status=BookingStatus.CONFIRMED))
+    db.commit()
+    monkeypatch.setattr(kpi_rollup, "try_advisory_xact_lock", lambda db, name: False)
+    assert kpi_rollup.reconcile(db) == {}
+    assert kpi_rollup.read(db)["passenger_count"] == 0
@@ -0,0 +1,100 @@
+"""
+Live Frame Tests
+Tests for delta encoding of live tracking frames
+"""
+import asyncio
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from services.live_frames import DeltaEncoder, LiveTrackingStream
+
+def entry(bus_id, latitude, speed=20.0, heading=90.0):
+    return {"bus_id": bus_id, "latitude": latitude, "longitude": 77.2, "speed": speed, "heading": heading}
+
+def test_unchanged_buses_are_skipped():
+    """Test only buses that moved or changed speed are emitted"""
+    encoder = DeltaEncoder()
+    assert len(encoder.changed([entry(1, 28.6), entry(2, 28.7)])) == 2
+    changed = encoder.changed([entry(1, 28.6), entry(2, 28.7, speed=35.0)])
+    assert [e["bus_id"] for e in changed] == [2]
+
+def test_small_moves_accumulate():
+    """Test sub-threshold jitter is dropped but accumulated drift is sent"""
+    encoder = DeltaEncoder()
+    encoder.changed([entry(1, 28.600000)])
+    assert encoder.changed([entry(1, 28.600004)]) == []
+    assert encoder.changed([entry(1, 28.600008)]) == []
+    assert len(encoder.changed([entry(1, 28.600012)])) == 1
+
+def test_keyframe_resets_baseline():
+    """Test a keyframe becomes the baseline for later deltas"""
+    encoder = DeltaEncoder()
+    encoder.changed([entry(1, 28.6)])
+    encoder.reset([entry(1, 28.9)])
+    assert encoder.changed([entry(1, 28.9)]) == []
+
+class FakeManager:
+    def __init__(self):
+        self.frames = []
+
+    async def publish_frame(self, frame_type, entries):
+        self.frames.append((frame_type, [e["bus_id"] for e in entries]))
+
+class FakeStore:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get(self, bus_id):
+        return self.rows.get(bus_id)
+
+    def snapshot(self):
+        return list(self.rows.values())
+
+def row(bus_id, latitude):
+    return {"id": bus_id, "latitude": latitude, "longitude": 77.2, "speed": 10.0, "heading": None}
+
+def test_stream_sends_keyframe_then_deltas():
+    """Test the stream publishes a full keyframe and then only changed buses"""
+    async def scenario():
+        manager = FakeManager()
+        store = FakeStore({1: row(1, 28.6), 2: row(2, 28.7)})
+        stream = LiveTrackingStream(manager, store, keyframe_seconds=30)
+        await stream.publish_keyframe()
+        store.rows[2] = row(2, 28.8)
+        assert await stream.publish_changes([1, 2]) == 1
+        assert await stream.publish_changes([1, 2]) == 0
+        assert manager.frames == [("keyframe", [1, 2]), ("delta", [2])]
+    asyncio.run(scenario())
+
+def test_tick_coalesces_changes_into_one_delta():
+    """Test changes marked between ticks go out as a single delta frame"""
+    async def scenario():
+        manager = FakeManager()
+        store = FakeStore({1: row(1, 28.6), 2: row(2, 28.7), 3: row(3, 28.8)})
+        stream = LiveTrackingStream(manager, store, keyframe_seconds=30, tick_hz=5)
+        await stream.publish_keyframe()
+        for latitude in (28.61, 28.62, 28.63):
+            store.rows[1] = row(1, latitude)
+            stream.mark_changed([1])
+        store.rows[3] = row(3, 28.9)
+        stream.mark_changed([3])
+        assert await stream.tick() == 2
+        assert await stream.tick() == 0
+        assert manager.frames[1:] == [("delta", [1, 3])]
+    asyncio.run(scenario())
+
+def test_tick_loop_runs_at_configured_rate():
+    """Test the tick loop publishes pending changes without being called directly"""
+    async def scenario():
+        manager = FakeManager()
+        store = FakeStore({1: row(1, 28.6)})
+        stream = LiveTrackingStream(manager, store, keyframe_seconds=30, tick_hz=5)
+        stream.tick_seconds = 0.01
+        task = asyncio.create_task(stream.run_ticks())
+        stream.mark_changed([1])
+        await asyncio.sleep(0.05)
+        task.cancel()
+        assert manager.frames == [("delta", [1])]
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+"""
+Location Codec Tests
+Tests for the packed binary live tracking frame format
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from services.location_codec import (
+    BINARY_SUBPROTOCOL, JSON_SUBPROTOCOL, HEADER, RECORD,
+    choose_subprotocol, decode_frame, encode_frame
+)
+
+def test_round_trip():
+    """Test a frame decodes to the same buses within codec precision"""
+    entries = [
+        {"bus_id": 12, "latitude": 28.613912, "longitude": 77.209023, "speed": 42.3, "heading": 271.5},
+        {"bus_id": 7, "latitude": -33.86, "longitude": 151.21, "speed": 0.0, "heading": None},
+    ]
+    data = encode_frame("keyframe", 42, entries)
+    assert len(data) == HEADER.size + 2 * RECORD.size
+
+    frame = decode_frame(data)
+    assert frame["type"] == "keyframe"
+    assert frame["seq"] == 42
+    first, second = frame["buses"]
+    assert first["bus_id"] == 12
+    assert first["latitude"] == pytest.approx(28.613912, abs=1e-6)
+    assert first["longitude"] == pytest.approx(77.209023, abs=1e-6)
+    assert first["speed"] == pytest.approx(42.3)
+    assert first["heading"] == pytest.approx(271.5)
+    assert second["heading"] is None
+
+def test_truncated_frame_rejected():
+    """Test a frame whose length disagrees with its count is rejected"""
+    data = encode_frame("delta", 1, [{"bus_id": 1, "latitude": 28.6, "longitude": 77.2}])
+    with pytest.raises(ValueError):
+        decode_frame(data[:-1])
+
+def test_choose_subprotocol():
+    """Test binary is chosen only when offered and JSON stays the default"""
+    assert choose_subprotocol([JSON_SUBPROTOCOL, BINARY_SUBPROTOCOL]) == BINARY_SUBPROTOCOL
+    assert choose_subprotocol([JSON_SUBPROTOCOL]) == JSON_SUBPROTOCOL
+    assert choose_subprotocol([]) is None
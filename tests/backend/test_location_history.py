@@ -0,0 +1,97 @@
+"""
+Location History Tests
+Tests for the day-partitioned history files, range queries and downsampling
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from services.location_history import LocationHistory
+
+DAY = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+def fix(bus_id, at, latitude=28.6):
+    return {
+        "bus_id": bus_id,
+        "latitude": latitude,
+        "longitude": 77.2,
+        "speed": 30.0,
+        "heading": None,
+        "last_updated": at,
+    }
+
+@pytest.fixture
+def history(tmp_path):
+    return LocationHistory(str(tmp_path), raw_retention_days=7, minute_retention_days=90)
+
+def test_flush_appends_to_day_partitions(history, tmp_path):
+    history.record([fix(1, DAY + timedelta(hours=23, minutes=59)), fix(1, DAY + timedelta(days=1))])
+    assert history.flush() == 2
+    assert history.flush() == 0
+    assert os.path.getsize(tmp_path / "raw" / "2026-01-01" / "1.bin") == 32
+    assert os.path.getsize(tmp_path / "raw" / "2026-01-02" / "1.bin") == 32
+
+def test_range_query_uses_half_open_interval_across_days(history):
+    for second in range(0, 7200, 10):
+        history.record([fix(1, DAY + timedelta(hours=23, seconds=second)), fix(2, DAY + timedelta(seconds=second))])
+        history.flush()
+    points = history.query(1, DAY + timedelta(hours=23, minutes=30), DAY + timedelta(hours=24, minutes=30))
+    assert len(points) == 360
+    assert points[0]["recorded_at"] == DAY + timedelta(hours=23, minutes=30)
+    assert points[-1]["recorded_at"] == DAY + timedelta(hours=24, minutes=29, seconds=50)
+    assert points[0]["heading"] is None
+    assert history.query(3, DAY, DAY + timedelta(days=1)) == []
+
+def test_compact_downsamples_closed_days_and_expires_raw(history, tmp_path):
+    history.record([fix(1, DAY + timedelta(seconds=second), latitude=second) for second in range(0, 1800, 15)])
+    history.flush()
+
+    assert history.compact(now=DAY + timedelta(hours=24, minutes=30)) == 0
+    assert history.compact(now=DAY + timedelta(days=2)) == 1
+    minute = history.query(1, DAY, DAY + timedelta(days=1), "1m")
+    ten_minute = history.query(1, DAY, DAY + timedelta(days=1), "10m")
+    assert len(minute) == 30
+    assert minute[0]["latitude"] == 45
+    assert [p["latitude"] for p in ten_minute] == [585, 1185, 1785]
+
+    history.compact(now=DAY + timedelta(days=9))
+    assert not os.path.exists(tmp_path / "raw" / "2026-01-01")
+    assert history.query(1, DAY, DAY + timedelta(days=1)) == []
+    assert len(history.query(1, DAY, DAY + timedelta(days=1), "1m")) == 30
+
+def test_out_of_order_appends_from_other_workers_stay_sorted(history, tmp_path):
+    # Two workers flushing the same bus's fixes, the later ones first
+    other = LocationHistory(str(tmp_path))
+    other.record([fix(1, DAY + timedelta(minutes=minute)) for minute in (10, 20)])
+    other.flush()
+    history.record([fix(1, DAY + timedelta(minutes=minute)) for minute in (5, 15)])
+    history.flush()
+
+    points = history.query(1, DAY + timedelta(minutes=5), DAY + timedelta(minutes=16))
+    assert [p["recorded_at"].minute for p in points] == [5, 10, 15]
+
+def test_late_fixes_update_downsampled_buckets(history):
+    history.record([fix(1, DAY + timedelta(minutes=1), latitude=1), fix(1, DAY + timedelta(minutes=30), latitude=2)])
+    history.flush()
+    assert history.compact(now=DAY + timedelta(days=2)) == 1
+
+    history.record([fix(1, DAY + timedelta(minutes=1, seconds=30), latitude=3),
+                    fix(1, DAY + timedelta(minutes=45), latitude=4)])
+    history.flush()
+    minute = history.query(1, DAY, DAY + timedelta(days=1), "1m")
+    assert [(p["recorded_at"].minute, p["latitude"]) for p in minute] == [(1, 3), (30, 2), (45, 4)]
+    ten_minute = history.query(1, DAY, DAY + timedelta(days=1), "10m")
+    assert [p["latitude"] for p in ten_minute] == [3, 2, 4]
+    assert history.compact(now=DAY + timedelta(days=2)) == 0
+
+def test_downsampled_query_of_open_day_buckets_raw_records(history):
+    history.record([fix(1, DAY + timedelta(seconds=second)) for second in range(0, 300, 5)])
+    history.flush()
+    assert len(history.query(1, DAY, DAY + timedelta(hours=1), "1m")) == 5
+
+def test_unknown_resolution_is_rejected(history):
+    with pytest.raises(ValueError):
+        history.query(1, DAY, DAY + timedelta(hours=1), "5m")
@@ -0,0 +1,79 @@
+"""
+Location Ingest Tests
+Tests for the bulk upsert of GPS fixes into live_bus_locations
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Bus, LiveBusLocation
+from schemas import LiveLocationFix
+from services.location_ingest import UPSERT_CHUNK_SIZE, UPSERT_COLUMNS, latest_fix_per_bus, upsert_live_locations
+
+@pytest.fixture
+def db():
+    """In-memory database with two buses"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=50),
+        Bus(id=2, bus_number="DTC-2", registration_number="DL-2", capacity=50),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+def fix(bus_id, latitude, recorded_at):
+    return LiveLocationFix(bus_id=bus_id, latitude=latitude, longitude=77.2, recorded_at=recorded_at)
+
+def test_upsert_inserts_and_updates(db):
+    """Test first fixes insert rows and newer fixes update them"""
+    t0 = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc)
+    accepted, stale, unknown = upsert_live_locations(db, [fix(1, 28.60, t0), fix(2, 28.70, t0)])
+    db.commit()
+    assert accepted == [1, 2]
+    assert stale == [] and unknown == []
+
+    accepted, _, _ = upsert_live_locations(db, [fix(1, 28.61, t0 + timedelta(seconds=5))])
+    db.commit()
+    assert accepted == [1]
+    assert db.query(LiveBusLocation).filter_by(bus_id=1).one().latitude == 28.61
+    assert db.query(LiveBusLocation).count() == 2
+
+def test_out_of_order_fix_rejected(db):
+    """Test fixes older than last_updated do not overwrite the stored position"""
+    t0 = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc)
+    upsert_live_locations(db, [fix(1, 28.60, t0)])
+    db.commit()
+
+    accepted, stale, _ = upsert_live_locations(db, [fix(1, 28.50, t0 - timedelta(seconds=30))])
+    db.commit()
+    assert accepted == []
+    assert stale == [1]
+    assert db.query(LiveBusLocation).filter_by(bus_id=1).one().latitude == 28.60
+
+def test_batch_keeps_newest_fix_and_reports_unknown(db):
+    """Test duplicate fixes within a batch collapse to the newest and unknown buses are skipped"""
+    t0 = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc)
+    accepted, _, unknown = upsert_live_locations(db, [
+        fix(1, 28.62, t0 + timedelta(seconds=10)),
+        fix(1, 28.61, t0),
+        fix(99, 28.0, t0),
+    ])
+    db.commit()
+    assert accepted == [1]
+    assert unknown == [99]
+    assert db.query(LiveBusLocation).filter_by(bus_id=1).one().latitude == 28.62
+
+def test_chunk_size_fits_bind_parameter_limit():
+    """Test the upsert chunk size matches the columns actually written per row"""
+    row = latest_fix_per_bus([fix(1, 28.60, None)])[1]
+    assert tuple(row) == UPSERT_COLUMNS
+    assert UPSERT_CHUNK_SIZE * len(row) <= 32766
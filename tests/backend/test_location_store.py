@@ -0,0 +1,97 @@
+"""
+Live Location Store Tests
+Tests for the in-memory latest-position store and its write-behind flush
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Bus, LiveBusLocation
+from services.location_store import LiveLocationStore
+
+T0 = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def db():
+    """In-memory database with two active buses and one inactive bus"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=50),
+        Bus(id=2, bus_number="DTC-2", registration_number="DL-2", capacity=50),
+        Bus(id=3, bus_number="DTC-3", registration_number="DL-3", capacity=50, is_active=False),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+@pytest.fixture
+def store(db):
+    store = LiveLocationStore()
+    store.load(db)
+    return store
+
+def row(bus_id, latitude, seconds=0):
+    return {
+        "bus_id": bus_id,
+        "latitude": latitude,
+        "longitude": 77.2,
+        "speed": 30.0,
+        "heading": None,
+        "last_updated": T0 + timedelta(seconds=seconds),
+    }
+
+def test_apply_and_snapshot(store):
+    """Test applied fixes are served from the snapshot for active buses only"""
+    accepted, stale, unknown = store.apply([row(1, 28.6), row(3, 28.7), row(42, 28.8)])
+    assert accepted == [1, 3]
+    assert unknown == [42]
+
+    snapshot = store.snapshot()
+    assert [loc["id"] for loc in snapshot] == [1]
+    assert snapshot[0]["bus_number"] == "DTC-1"
+    assert snapshot[0]["heading"] is None
+    assert store.snapshot() is snapshot
+
+def test_stale_fix_rejected(store):
+    """Test a fix older than the held position is rejected"""
+    store.apply([row(1, 28.6, seconds=10)])
+    accepted, stale, _ = store.apply([row(1, 28.5, seconds=5)])
+    assert accepted == []
+    assert stale == [1]
+    assert store.get(1)["latitude"] == 28.6
+
+def test_remove_bus_keeps_other_slots(store):
+    """Test removing a bus moves the last slot without corrupting positions"""
+    store.apply([row(1, 28.1), row(2, 28.2)])
+    store.remove_bus(1)
+    assert store.get(1) is None
+    assert store.get(2)["latitude"] == 28.2
+    assert len(store) == 1
+
+def test_flush_persists_dirty_positions(store, db):
+    """Test flush writes only the positions changed since the previous flush"""
+    store.apply([row(1, 28.6), row(2, 28.7)])
+    assert store.flush(db) == 2
+    assert db.query(LiveBusLocation).count() == 2
+    assert store.flush(db) == 0
+
+    store.apply([row(2, 28.75, seconds=5)])
+    assert store.flush(db) == 1
+    assert db.query(LiveBusLocation).filter_by(bus_id=2).one().latitude == 28.75
+
+def test_load_restores_persisted_positions(store, db):
+    """Test a fresh store picks up positions persisted by another"""
+    store.apply([row(2, 28.7)])
+    store.flush(db)
+
+    fresh = LiveLocationStore()
+    fresh.load(db)
+    assert fresh.get(2)["latitude"] == 28.7
@@ -0,0 +1,66 @@
+"""
+Map Matching Tests
+Tests for batch snapping of positions onto route polylines
+"""
+import math
+import random
+import pytest
+import sys
+import os
+
+np = pytest.importorskip("numpy")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from services.map_matching import RouteGeometry, SegmentArrays
+
+# Route 1 heads north, route 7 east then north (an L shape)
+NORTH = RouteGeometry(1, [(1, 28.60, 77.2), (2, 28.61, 77.2), (3, 28.62, 77.2)])
+ELL = RouteGeometry(7, [(4, 28.60, 77.20), (5, 28.60, 77.21), (6, 28.61, 77.21)])
+
+def brute_force(geometry, lat, lon):
+    """Reference: closest point over every segment, one at a time"""
+    meters = math.pi * 6371000.0 / 180
+    best = (None, math.inf)
+    for i, ((lat1, lon1), (lat2, lon2)) in enumerate(zip(geometry.points, geometry.points[1:])):
+        scale = math.cos(math.radians(lat1)) * meters
+        sx, sy = (lon2 - lon1) * scale, (lat2 - lat1) * meters
+        px, py = (lon - lon1) * scale, (lat - lat1) * meters
+        t = min(max((px * sx + py * sy) / (sx * sx + sy * sy), 0.0), 1.0)
+        offset = math.hypot(px - t * sx, py - t * sy)
+        if offset < best[1]:
+            seg_len = geometry.cumulative[i + 1] - geometry.cumulative[i]
+            best = (geometry.cumulative[i] + t * seg_len, offset)
+    return best
+
+def test_cumulative_distances():
+    assert NORTH.cumulative[1] == pytest.approx(1112, rel=1e-3)
+    assert NORTH.cumulative[2] == pytest.approx(2224, rel=1e-3)
+
+def test_batch_matches_reference_for_every_pair():
+    segments = SegmentArrays([ELL, NORTH])
+    rng = random.Random(4)
+    pairs = [(rng.choice([1, 7]), 28.6 + rng.random() * 0.02, 77.19 + rng.random() * 0.03) for _ in range(200)]
+    route_ids, lats, lons = (np.array(column) for column in zip(*pairs))
+    progress, offset = segments.match(route_ids, lats, lons)
+    for (route_id, lat, lon), p, o in zip(pairs, progress, offset):
+        expected = brute_force(NORTH if route_id == 1 else ELL, lat, lon)
+        assert p == pytest.approx(expected[0], abs=1e-6)
+        assert o == pytest.approx(expected[1], abs=1e-6)
+
+def test_snaps_to_corner_segment_and_clamps_ends():
+    segments = SegmentArrays([NORTH, ELL])
+    progress, offset = segments.match(
+        np.array([7, 1, 1]), np.array([28.605, 28.59, 28.615]), np.array([77.2102, 77.2, 77.201])
+    )
+    assert progress[0] == pytest.approx(ELL.cumulative[1] + 556, rel=1e-2)
+    assert offset[0] == pytest.approx(19.6, rel=0.05)
+    assert progress[1] == 0.0 and offset[1] == pytest.approx(1112, rel=1e-3)
+    assert progress[2] == pytest.approx(1668, rel=1e-3)
+
+def test_routes_without_geometry_are_nan():
+    progress, offset = SegmentArrays([NORTH]).match(np.array([1, 5]), np.array([28.6, 28.6]), np.array([77.2, 77.2]))
+    assert progress[0] == 0.0
+    assert math.isnan(progress[1]) and math.isnan(offset[1])
+    empty, _ = SegmentArrays([]).match(np.array([1]), np.array([28.6]), np.array([77.2]))
+    assert math.isnan(empty[0])
@@ -0,0 +1,190 @@
+"""
+Migration Tests
+Tests that the Alembic migrations build the schema of the models, and
+that the hot router queries are answered from an index. The query plans
+are checked on SQLite always and on PostgreSQL when TEST_POSTGRES_URL
+points at an empty database that may be migrated and dropped.
+"""
+import pytest
+from datetime import datetime, timedelta, timezone
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.config import Config
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import create_engine, func, inspect, select, text
+from sqlalchemy.orm import Session
+import json
+import re
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Booking, BookingStatus, Bus, Payment, PaymentStatus, Route, Stop, User
+from pagination import Page, encode_cursor
+from routers.bookings import booking_pages
+from routers.payments import payment_pages
+from routers.stops import stop_pages
+from routers.users import user_pages
+from services.kpi_rollup import COUNTED_BOOKING_STATUSES
+
+ALEMBIC_DIR = os.path.join(os.path.dirname(__file__), '../../web/backend/alembic')
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+def keyset_page(pages, sort, after):
+    """The statement a list endpoint runs for the page after a cursor"""
+    return Page(pages, cursor=encode_cursor(sort, after)).apply(select(pages.model))
+
+PAGE_START = datetime(2025, 1, 20, tzinfo=timezone.utc)
+
+# (name, table that must not be scanned, statement) mirroring the router queries
+HOT_QUERIES = [
+    ("bookings of a user", "bookings",
+     select(Booking).where(Booking.user_id == 7)),
+    ("counted bookings of a route", "bookings",
+     select(func.count(Booking.id)).where(Booking.route_id == 3, Booking.status.in_(COUNTED_BOOKING_STATUSES))),
+    ("stops of a route in order", "stops",
+     select(Stop).where(Stop.route_id == 3).order_by(Stop.stop_order)),
+    ("successful payment revenue", "payments",
+     select(func.sum(Payment.amount)).where(Payment.status == PaymentStatus.SUCCESS)),
+    ("routes of a bus", "routes",
+     select(Route).where(Route.bus_id == 2)),
+    ("bookings page by creation time", "bookings",
+     keyset_page(booking_pages, "-created_at", [PAGE_START, 500])),
+    ("bookings page by journey date", "bookings",
+     keyset_page(booking_pages, "journey_date", [PAGE_START, 500])),
+    ("payments page by payment time", "payments",
+     keyset_page(payment_pages, "payment_date", [PAGE_START, 500])),
+    ("users page by creation time", "users",
+     keyset_page(user_pages, "created_at", [PAGE_START, 20])),
+    ("stops page by stop order", "stops",
+     keyset_page(stop_pages, "stop_order", [10, 200])),
+]
+
+def migrate(connection, revision="head", downgrade=False):
+    config = Config()
+    config.set_main_option("script_location", ALEMBIC_DIR)
+    config.attributes["connection"] = connection
+    # The index migrations need to commit on their own to build indexes concurrently
+    if connection.in_transaction():
+        connection.commit()
+    if downgrade:
+        command.downgrade(config, revision)
+    else:
+        command.upgrade(config, revision)
+    connection.commit()
+
+def seed(connection):
+    session = Session(bind=connection)
+    statuses = list(BookingStatus)
+    session.add_all(User(id=i, email=f"user{i}@example.com", full_name=f"User {i}", hashed_password="x")
+                    for i in range(1, 51))
+    session.add_all(Bus(id=i, bus_number=f"DTC-{i}", registration_number=f"DL-{i}", capacity=40)
+                    for i in range(1, 21))
+    session.add_all(Route(id=i, route_number=str(i), route_name=f"R{i}", start_location="A", end_location="B",
+                          fare=25.0, bus_id=i % 20 + 1) for i in range(1, 41))
+    session.add_all(Stop(route_id=route, stop_name=f"S{route}-{order}", stop_order=order)
+                    for route in range(1, 41) for order in range(1, 21))
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    session.add_all(
+        Booking(id=i, user_id=i % 50 + 1, route_id=i % 40 + 1, booking_reference=f"BK{i}", passenger_name="P",
+                journey_date=start + timedelta(hours=i), fare_amount=25.0, status=statuses[i % len(statuses)])
+        for i in range(1, 2001)
+    )
+    session.add_all(
+        Payment(booking_id=i, payment_method="upi", amount=25.0,
+                status=PaymentStatus.SUCCESS if i % 5 else PaymentStatus.FAILED)
+        for i in range(1, 2001, 2)
+    )
+    session.commit()
+
+def compiled(connection, statement):
+    return str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+
+def sqlite_scans(connection, statement):
+    """Tables in the plan that SQLite reads in full instead of through an index"""
+    plan = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + compiled(connection, statement)).all()
+    return {match.group(1) for *_, detail in plan for match in [re.match(r"SCAN (?:TABLE )?(\w+)$", detail)] if match}
+
+def postgres_scans(connection, statement):
+    """Tables in the plan that PostgreSQL reads sequentially although seq scans are disabled"""
+    plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + compiled(connection, statement)).scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    scans, nodes = set(), [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if node["Node Type"] == "Seq Scan":
+            scans.add(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return scans
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    with engine.connect() as connection:
+        yield connection
+    engine.dispose()
+
+@pytest.fixture
+def postgres_db():
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    engine = create_engine(POSTGRES_URL)
+    with engine.connect() as connection:
+        migrate(connection)
+        try:
+            yield connection
+        finally:
+            connection.rollback()
+            migrate(connection, "base", downgrade=True)
+    engine.dispose()
+
+def test_migrations_match_models(sqlite_db):
+    migrate(sqlite_db)
+    assert compare_metadata(MigrationContext.configure(sqlite_db), Base.metadata) == []
+
+def test_downgrade_removes_everything(sqlite_db):
+    migrate(sqlite_db)
+    migrate(sqlite_db, "0001_baseline", downgrade=True)
+    assert "ix_bookings_user_id" not in {index["name"] for index in inspect(sqlite_db).get_indexes("bookings")}
+    migrate(sqlite_db, "base", downgrade=True)
+    assert inspect(sqlite_db).get_table_names() == ["alembic_version"]
+
+def test_baseline_is_the_schema_before_migrations(sqlite_db):
+    # Databases created by create_all before migrations are stamped at the baseline
+    migrate(sqlite_db, "0001_baseline")
+    assert set(inspect(sqlite_db).get_table_names()) == {
+        "alembic_version", "users", "wallets", "metro_cards", "transactions", "buses", "routes", "stops",
+        "bookings", "payments", "live_bus_locations",
+    }
+
+def test_null_sort_values_are_filled_before_not_null(sqlite_db):
+    migrate(sqlite_db, "0004_pagination_indexes")
+    sqlite_db.execute(text(
+        "INSERT INTO users (id, email, full_name, hashed_password, role, is_active, created_at) "
+        "VALUES (1, 'old@example.com', 'Old', 'x', 'PASSENGER', 1, NULL)"
+    ))
+    migrate(sqlite_db)
+    assert sqlite_db.execute(text("SELECT created_at FROM users WHERE id = 1")).scalar() is not None
+    assert not next(c for c in inspect(sqlite_db).get_columns("users") if c["name"] == "created_at")["nullable"]
+
+def test_baseline_alone_scans_hot_tables(sqlite_db):
+    # Guards the check below: without the index pack the queries do scan
+    migrate(sqlite_db, "0001_baseline")
+    scanned = set().union(*(sqlite_scans(sqlite_db, statement) for _, _, statement in HOT_QUERIES))
+    assert {"bookings", "stops", "payments", "routes", "users"} <= scanned
+
+@pytest.mark.parametrize("name,table,statement", HOT_QUERIES, ids=[name for name, _, _ in HOT_QUERIES])
+def test_hot_queries_use_indexes_on_sqlite(sqlite_db, name, table, statement):
+    migrate(sqlite_db)
+    seed(sqlite_db)
+    assert table not in sqlite_scans(sqlite_db, statement)
+
+@pytest.mark.parametrize("name,table,statement", HOT_QUERIES, ids=[name for name, _, _ in HOT_QUERIES])
+def test_hot_queries_use_indexes_on_postgres(postgres_db, name, table, statement):
+    seed(postgres_db)
+    postgres_db.exec_driver_sql(f"ANALYZE {table}")
+    # Small tables are cheaper to scan; make any usable index win
+    postgres_db.exec_driver_sql("SET enable_seqscan = off")
+    assert table not in postgres_scans(postgres_db, statement)
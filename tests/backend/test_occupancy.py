@@ -0,0 +1,148 @@
+"""
+Trip Occupancy Tests
+Tests for incrementally maintained per-trip load factors
+"""
+import pytest
+from datetime import datetime, time, timedelta, timezone
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import BookingStatus, Bus, Route, TripOccupancy, User
+from schemas import BookingCreate, BookingUpdate, BusUpdate, RouteUpdate
+from services import occupancy
+from routers import analytics, bookings, buses, routes
+
+TODAY = datetime.now(timezone.utc).date()
+
+def at(days):
+    return datetime.combine(TODAY + timedelta(days=days), time(9, 0), tzinfo=timezone.utc)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(id=1, email="ops@example.com", full_name="Ops", hashed_password="x"),
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=4),
+        Bus(id=2, bus_number="DTC-2", registration_number="DL-2", capacity=10),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0, bus_id=1),
+        Route(id=2, route_number="2", route_name="R2", start_location="B", end_location="C", fare=40.0, bus_id=2),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+@pytest.fixture
+def user(db):
+    return db.query(User).first()
+
+def book(db, user, route_id, days, count=1):
+    return [
+        bookings.create_booking(BookingCreate(route_id=route_id, passenger_name="P", journey_date=at(days)),
+                                db=db, current_user=user)
+        for _ in range(count)
+    ]
+
+def trip_rows(db):
+    return sorted(
+        (t.route_id, t.journey_date, t.bus_id, t.capacity, t.passengers) for t in db.query(TripOccupancy)
+    )
+
+def test_bookings_and_cancellations_update_trips(db, user):
+    created = book(db, user, 1, 1, count=3)
+    book(db, user, 2, 1, count=2)
+    book(db, user, 2, 2)
+    bookings.update_booking(created[0].id, BookingUpdate(status=BookingStatus.CANCELLED), db=db, current_user=user)
+
+    trips = analytics.get_trip_occupancy(from_=None, to=None, sort="overcrowded", limit=20,
+                                         route_id=None, bus_id=None, db=db)
+    assert [(t["route_id"], t["journey_date"], t["passengers"], t["load_factor"]) for t in trips] == [
+        (1, TODAY + timedelta(days=1), 2, 0.5),
+        (2, TODAY + timedelta(days=1), 2, 0.2),
+        (2, TODAY + timedelta(days=2), 1, 0.1),
+    ]
+    assert trips[0]["bus_number"] == "DTC-1" and trips[0]["capacity"] == 4
+    underused = analytics.get_trip_occupancy(from_=None, to=None, sort="underused", limit=1,
+                                             route_id=None, bus_id=2, db=db)
+    assert [(t["journey_date"], t["passengers"]) for t in underused] == [(TODAY + timedelta(days=2), 1)]
+
+    incremental = trip_rows(db)
+    assert occupancy.rebuild(db)
+    assert trip_rows(db) == incremental
+
+def test_reassignment_and_capacity_changes_apply_from_today(db, user):
+    book(db, user, 1, -3, count=2)
+    book(db, user, 1, 2, count=2)
+    routes.update_route(1, RouteUpdate(bus_id=2), db=db, current_user=user)
+    assert trip_rows(db) == [
+        (1, TODAY - timedelta(days=3), 1, 4, 2),
+        (1, TODAY + timedelta(days=2), 2, 10, 2),
+    ]
+    buses.update_bus(2, BusUpdate(capacity=8), db=db, current_user=user)
+    book(db, user, 1, 2)
+    assert trip_rows(db)[-1] == (1, TODAY + timedelta(days=2), 2, 8, 3)
+
+def test_rebuild_only_writes_drifted_trips(db, user):
+    book(db, user, 1, 1, count=3)
+    book(db, user, 2, 1)
+    # A lost write, a trip left behind by deleted bookings and a missing trip
+    db.query(TripOccupancy).filter_by(route_id=1).update({"passengers": 1, "capacity": 99})
+    db.add(TripOccupancy(route_id=2, journey_date=TODAY - timedelta(days=5), bus_id=2, capacity=10, passengers=4))
+    db.query(TripOccupancy).filter_by(route_id=2, journey_date=TODAY + timedelta(days=1)).delete()
+    db.commit()
+
+    assert occupancy.rebuild(db)
+    assert trip_rows(db) == [
+        (1, TODAY + timedelta(days=1), 1, 4, 3),
+        (2, TODAY - timedelta(days=5), 2, 10, 0),
+        (2, TODAY + timedelta(days=1), 2, 10, 1),
+    ]
+
+    writes = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not statement.lstrip().upper().startswith("SELECT"):
+            writes.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", record)
+    assert occupancy.rebuild(db)
+    event.remove(db.get_bind(), "before_cursor_execute", record)
+    assert writes == []
+
+def test_rebuild_keeps_writes_made_after_its_snapshot(db, user, monkeypatch):
+    book(db, user, 1, 1, count=2)
+    db.query(TripOccupancy).update({"bus_id": None, "capacity": None})
+    db.commit()
+    drifted = occupancy._drifted_trips(db)
+
+    # Written between the rebuild reading its snapshot and correcting the trip
+    book(db, user, 1, 1)
+    occupancy.route_reassigned(db, 1, 2)
+    db.commit()
+    monkeypatch.setattr(occupancy, "_drifted_trips", lambda db: drifted)
+    assert occupancy.rebuild(db)
+    assert trip_rows(db) == [(1, TODAY + timedelta(days=1), 2, 10, 3)]
+
+def test_summary_by_route_bus_and_day(db, user):
+    book(db, user, 1, 0, count=4)
+    book(db, user, 2, 0, count=5)
+    book(db, user, 2, 1, count=1)
+    by_route = analytics.get_occupancy_summary(from_=None, to=None, group_by="route", db=db)
+    assert [(row["route_id"], row["trips"], row["seats"], row["load_factor"]) for row in by_route] == [
+        (1, 1, 4, 1.0), (2, 2, 20, 0.3)
+    ]
+    by_day = analytics.get_occupancy_summary(from_=None, to=TODAY, group_by="day", db=db)
+    assert by_day == [{"journey_date": TODAY, "trips": 2, "passengers": 9, "seats": 14, "load_factor": 9 / 14}]
+    assert analytics.get_occupancy_summary(from_=None, to=None, group_by="bus", db=db)[0]["bus_id"] == 1
+
+def test_ranges_are_validated():
+    with pytest.raises(HTTPException):
+        analytics._occupancy_range(TODAY, TODAY - timedelta(days=1))
+    with pytest.raises(HTTPException):
+        analytics._occupancy_range(TODAY, TODAY + timedelta(days=400))
+    assert analytics._occupancy_range(TODAY, None) == (TODAY, TODAY + timedelta(days=6))
@@ -0,0 +1,155 @@
+"""
+Pagination Tests
+Tests for keyset (cursor) pagination of the list endpoints
+"""
+import pytest
+import asyncio
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Booking, BookingStatus, Route, Stop, User
+from pagination import NEXT_CURSOR_HEADER, Page, encode_cursor
+from routers import bookings, stops, users
+
+START = datetime(2025, 3, 1, 8, 0)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id=1, email="rider@example.com", full_name="Rider", hashed_password="x", created_at=START))
+    session.add(Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0))
+    # Bookings are created in pairs sharing a timestamp, so the id breaks ties
+    session.add_all(
+        Booking(id=i, user_id=1, route_id=1, booking_reference=f"BK{i}", passenger_name="P", fare_amount=25.0,
+                journey_date=START + timedelta(days=i % 7), status=BookingStatus.CONFIRMED,
+                created_at=START + timedelta(minutes=i // 2))
+        for i in range(1, 26)
+    )
+    session.commit()
+    yield session
+    session.close()
+
+def http_request(query=""):
+    return Request({
+        "type": "http", "method": "GET", "scheme": "http", "server": ("testserver", 80),
+        "path": "/api/bookings/", "query_string": query.encode(), "headers": [(b"host", b"testserver")],
+    })
+
+def list_bookings(db, **params):
+    response = Response()
+    page = Page(bookings.booking_pages, request=http_request("limit=10&skip=0"), response=response, **params)
+    return bookings.get_bookings(page=page, db=db), response
+
+def page_through(db, sort, limit=10):
+    ids, cursor, pages = [], None, 0
+    while True:
+        rows, response = list_bookings(db, sort=None if cursor else sort, cursor=cursor, limit=limit)
+        ids += [row.id for row in rows]
+        pages += 1
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return ids, pages
+
+def expected_order(db, key, reverse=False):
+    return [b.id for b in sorted(db.query(Booking).all(), key=key, reverse=reverse)]
+
+@pytest.mark.parametrize("sort,key,reverse", [
+    ("id", lambda b: b.id, False),
+    ("-id", lambda b: b.id, True),
+    ("created_at", lambda b: (b.created_at, b.id), False),
+    ("-created_at", lambda b: (b.created_at, b.id), True),
+    ("journey_date", lambda b: (b.journey_date, b.id), False),
+])
+def test_pages_cover_every_row_once_in_order(db, sort, key, reverse):
+    ids, pages = page_through(db, sort)
+    assert ids == expected_order(db, key, reverse)
+    assert pages == 3
+
+def test_exact_multiple_has_no_empty_last_page(db):
+    ids, pages = page_through(db, "id", limit=5)
+    assert len(ids) == 25 and pages == 5
+
+def test_next_page_link(db):
+    rows, response = list_bookings(db, sort="created_at", limit=10)
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    link = response.headers["Link"]
+    assert link.startswith("<http://testserver/api/bookings/?limit=10&cursor=") and link.endswith('>; rel="next"')
+    assert "skip" not in link and cursor in link
+
+def test_rows_added_between_pages_do_not_shift_later_pages(db):
+    first, response = list_bookings(db, sort="created_at", limit=10)
+    assert [row.id for row in first] == list(range(1, 11))
+    # A booking sorting before the cursor moves every offset page by one row
+    db.add(Booking(id=100, user_id=1, route_id=1, booking_reference="BK100", passenger_name="P", fare_amount=25.0,
+                   journey_date=START, created_at=START - timedelta(days=1)))
+    db.commit()
+    by_offset, _ = list_bookings(db, sort="created_at", skip=10, limit=10)
+    assert by_offset[0].id == 10
+    by_cursor, _ = list_bookings(db, cursor=response.headers[NEXT_CURSOR_HEADER], limit=10)
+    assert [row.id for row in by_cursor] == list(range(11, 21))
+
+def test_skip_still_works_without_cursor(db):
+    rows, response = list_bookings(db, skip=20, limit=10)
+    assert [row.id for row in rows] == [21, 22, 23, 24, 25]
+    assert NEXT_CURSOR_HEADER not in response.headers
+
+def test_cursor_takes_precedence_over_skip(db):
+    _, response = list_bookings(db, limit=10)
+    rows, _ = list_bookings(db, cursor=response.headers[NEXT_CURSOR_HEADER], skip=20, limit=10)
+    assert rows[0].id == 11
+
+@pytest.mark.parametrize("params,detail", [
+    ({"sort": "passenger_name"}, "Unsupported sort"),
+    ({"cursor": "not a cursor!"}, "Invalid cursor"),
+    ({"cursor": encode_cursor("created_at", [1, 2])}, "Invalid cursor"),
+    ({"cursor": encode_cursor("created_at", ["2025-03-01T08:00:00"])}, "Invalid cursor"),
+    ({"cursor": encode_cursor("id", [True])}, "Invalid cursor"),
+    ({"cursor": encode_cursor("id", [5]), "sort": "created_at"}, "different sort"),
+])
+def test_bad_requests(db, params, detail):
+    with pytest.raises(HTTPException) as error:
+        list_bookings(db, **params)
+    assert error.value.status_code == 400 and detail in error.value.detail
+
+def test_users_by_creation_time(db):
+    db.add_all(User(id=i, email=f"u{i}@example.com", full_name="U", hashed_password="x",
+                    created_at=START - timedelta(hours=i)) for i in range(2, 5))
+    db.commit()
+    response = Response()
+    rows = users.get_all_users(page=Page(users.user_pages, sort="created_at", limit=2, response=response), db=db)
+    assert [row.id for row in rows] == [4, 3]
+    cursor = response.headers[NEXT_CURSOR_HEADER]
+    rows = users.get_all_users(page=Page(users.user_pages, cursor=cursor, limit=2, response=Response()), db=db)
+    assert [row.id for row in rows] == [2, 1]
+
+def test_async_stop_listing_pages_by_stop_order(tmp_path):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'stops.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        async with session_factory() as db:
+            db.add(Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0))
+            db.add_all(Stop(id=i, route_id=1, stop_name=f"S{i}", stop_order=6 - i) for i in range(1, 6))
+            await db.commit()
+            response = Response()
+            first = await stops.get_stops(route_id=1, page=Page(stops.stop_pages, limit=3, response=response), db=db)
+            second = await stops.get_stops(
+                route_id=1, page=Page(stops.stop_pages, cursor=response.headers[NEXT_CURSOR_HEADER], limit=3), db=db
+            )
+        await engine.dispose()
+        return [s.stop_order for s in first], [s.stop_order for s in second]
+
+    assert asyncio.run(main()) == ([1, 2, 3], [4, 5])
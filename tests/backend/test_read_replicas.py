@@ -0,0 +1,196 @@
+"""
+Read Replica Tests
+Tests for routing read-only endpoints to replicas, using one SQLite file
+per database
+"""
+import pytest
+import asyncio
+import sqlite3
+import time
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+pytest.importorskip("aiosqlite")
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+import database
+from config import settings
+from database import (Base, PRIMARY_COOKIE, PRIMARY_UNTIL_HEADER, ReplicaSession, ReplicaSet, get_async_read_db,
+                      get_read_db)
+from models import Route
+from pagination import Page
+from routers import routes
+
+def make_database(path, name, session_class=None):
+    """A database file holding one route named after it"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Route(id=1, route_number="1", route_name=name, start_location="A", end_location="B", fare=25.0))
+    session.commit()
+    session.close()
+    if session_class is None:
+        async_factory = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"), expire_on_commit=False)
+        return sessionmaker(bind=engine), async_factory
+    async_factory = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"), expire_on_commit=False,
+                                       sync_session_class=session_class)
+    return sessionmaker(bind=engine, class_=session_class), async_factory
+
+def fail_next_statement(factory):
+    """Make the next statement on the factory's database fail like a lost replica connection"""
+    failures = [sqlite3.OperationalError("server closed the connection unexpectedly")]
+    def fail(conn, cursor, statement, parameters, context, executemany):
+        if failures:
+            raise exc.OperationalError(statement, parameters, failures.pop())
+    bind = factory.kw["bind"]
+    event.listen(getattr(bind, "sync_engine", bind), "before_cursor_execute", fail)
+
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    primary = make_database(tmp_path / "primary.db", "primary")
+    monkeypatch.setattr(database, "SessionLocal", primary[0])
+    monkeypatch.setattr(database, "AsyncSessionLocal", primary[1])
+    replicas = {name: make_database(tmp_path / f"{name}.db", name, ReplicaSession) for name in ("replica-1", "replica-2")}
+    # A file in a missing directory cannot be opened, like a replica that is down
+    missing = tmp_path / "missing" / "down.db"
+    replicas["down"] = (sessionmaker(bind=create_engine(f"sqlite:///{missing}")),
+                        async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{missing}")))
+    return replicas
+
+def use_replicas(monkeypatch, databases, *names, retry_seconds=30.0):
+    replicas = ReplicaSet([databases[name][0] for name in names], [databases[name][1] for name in names], retry_seconds)
+    monkeypatch.setattr(database, "replicas", replicas)
+    return replicas
+
+def request(method="GET", cookie=None, headers=None):
+    raw = [(b"cookie", f"{cookie}=1".encode())] if cookie else []
+    raw += [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]
+    return Request({"type": "http", "method": method, "headers": raw})
+
+def read_route_name(req):
+    dependency = get_read_db(req)
+    db = next(dependency)
+    try:
+        return db.query(Route.route_name).scalar()
+    finally:
+        dependency.close()
+
+def test_without_replicas_reads_use_the_primary(databases, monkeypatch):
+    use_replicas(monkeypatch, databases)
+    assert read_route_name(request()) == "primary"
+
+def test_reads_rotate_over_replicas(databases, monkeypatch):
+    use_replicas(monkeypatch, databases, "replica-1", "replica-2")
+    assert [read_route_name(request()) for _ in range(4)] == ["replica-1", "replica-2", "replica-1", "replica-2"]
+
+def test_recent_writer_reads_the_primary(databases, monkeypatch):
+    use_replicas(monkeypatch, databases, "replica-1")
+    assert read_route_name(request(cookie=PRIMARY_COOKIE)) == "primary"
+
+def test_unreachable_replica_is_skipped_until_retry(databases, monkeypatch):
+    replicas = use_replicas(monkeypatch, databases, "down", "replica-1")
+    assert [read_route_name(request()) for _ in range(3)] == ["replica-1"] * 3
+    assert 0 not in replicas.candidates()
+
+    replicas._down_until[0] = 0.0
+    assert sorted(replicas.candidates()) == [0, 1]
+
+def test_all_replicas_down_falls_back_to_primary(databases, monkeypatch):
+    use_replicas(monkeypatch, databases, "down")
+    assert read_route_name(request()) == "primary"
+
+def test_failure_during_request_marks_replica_down(databases, monkeypatch):
+    replicas = use_replicas(monkeypatch, databases, "replica-1", "replica-2")
+    dependency = get_read_db(request())
+    next(dependency)
+    with pytest.raises(exc.OperationalError):
+        dependency.throw(exc.OperationalError("SELECT 1", {}, Exception("connection lost")))
+    assert replicas.candidates() == [1]
+    assert read_route_name(request()) == "replica-2"
+
+def test_statement_failing_on_replica_is_retried_on_primary(databases, monkeypatch):
+    replicas = use_replicas(monkeypatch, databases, "replica-1", "replica-2")
+    fail_next_statement(databases["replica-1"][0])
+    assert read_route_name(request()) == "primary"
+    assert replicas.candidates() == [1]
+
+def test_async_statement_failing_on_replica_is_retried_on_primary(databases, monkeypatch):
+    replicas = use_replicas(monkeypatch, databases, "replica-1", "replica-2")
+    fail_next_statement(databases["replica-1"][1])
+
+    async def get_route(req):
+        dependency = get_async_read_db(req)
+        db = await dependency.__anext__()
+        try:
+            return (await routes.get_route(1, db=db)).route_name
+        finally:
+            await dependency.aclose()
+
+    assert asyncio.run(get_route(request())) == "primary"
+    assert replicas.candidates() == [1]
+
+def test_async_endpoint_reads_from_replica(databases, monkeypatch):
+    use_replicas(monkeypatch, databases, "down", "replica-2")
+
+    async def list_routes(req):
+        dependency = get_async_read_db(req)
+        db = await dependency.__anext__()
+        try:
+            return [route.route_name for route in await routes.get_routes(bus_id=None, page=Page(routes.route_pages), db=db)]
+        finally:
+            await dependency.aclose()
+
+    assert asyncio.run(list_routes(request())) == ["replica-2"]
+    assert asyncio.run(list_routes(request(cookie=PRIMARY_COOKIE))) == ["primary"]
+
+@pytest.mark.parametrize("method,status_code,sticky", [
+    ("POST", 201, True),
+    ("DELETE", 204, True),
+    ("GET", 200, False),
+    ("POST", 400, False),
+])
+def test_writes_make_reads_sticky(databases, monkeypatch, method, status_code, sticky):
+    use_replicas(monkeypatch, databases, "replica-1")
+
+    async def call_next(req):
+        return Response(status_code=status_code)
+
+    response = asyncio.run(database.stick_to_primary_after_writes(request(method), call_next))
+    cookie = response.headers.get("set-cookie", "")
+    assert cookie.startswith(f"{PRIMARY_COOKIE}=1") == sticky
+    if sticky:
+        assert f"Max-Age={settings.DB_PRIMARY_STICKY_SECONDS}" in cookie
+
+def test_bearer_clients_read_their_writes(databases, monkeypatch):
+    use_replicas(monkeypatch, databases, "replica-1")
+    monkeypatch.setattr(database, "_sticky_credentials", {})
+
+    async def call_next(req):
+        return Response(status_code=201)
+
+    token = {"Authorization": "Bearer abc"}
+    response = asyncio.run(database.stick_to_primary_after_writes(request("POST", headers=token), call_next))
+    until = float(response.headers[PRIMARY_UNTIL_HEADER])
+    # The header is rounded to milliseconds
+    assert 0 < until - time.time() <= settings.DB_PRIMARY_STICKY_SECONDS + 0.001
+    # The same credentials, or the echoed header, read from the primary without a cookie
+    assert read_route_name(request(headers=token)) == "primary"
+    assert read_route_name(request(headers={PRIMARY_UNTIL_HEADER: response.headers[PRIMARY_UNTIL_HEADER]})) == "primary"
+    assert read_route_name(request(headers={"Authorization": "Bearer other"})) == "replica-1"
+    assert read_route_name(request(headers={PRIMARY_UNTIL_HEADER: f"{time.time() - 1:.3f}"})) == "replica-1"
+    assert read_route_name(request(headers={PRIMARY_UNTIL_HEADER: "soon"})) == "replica-1"
+
+def test_writes_without_replicas_set_no_cookie(databases, monkeypatch):
+    use_replicas(monkeypatch, databases)
+
+    async def call_next(req):
+        return Response(status_code=201)
+
+    response = asyncio.run(database.stick_to_primary_after_writes(request("POST"), call_next))
+    assert "set-cookie" not in response.headers
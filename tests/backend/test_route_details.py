@@ -0,0 +1,122 @@
+"""
+Route Detail Tests
+Tests for the composite route endpoints: stops, bus and live position in a fixed number of queries
+"""
+import pytest
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+pytest.importorskip("aiosqlite")
+
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from database import Base
+from models import Bus, LiveBusLocation, Route, Stop
+from pagination import Page
+from routers import routes
+from services.location_store import LiveLocationStore
+
+STORED_AT = datetime(2024, 1, 1, 8, 0)
+
+def run_with_session(tmp_path, step, route_count=3):
+    """
+    Seed route_count routes with two stops each, every second one with a
+    bus, then await step(db) and return its result with the statements it ran
+    """
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'details.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+        try:
+            async with session_factory() as db:
+                for n in range(1, route_count + 1):
+                    bus_id = None
+                    if n % 2:
+                        bus_id = n
+                        db.add(Bus(id=n, bus_number=f"DL-{n}", registration_number=f"REG-{n}", capacity=40))
+                        db.add(LiveBusLocation(bus_id=n, latitude=28.6, longitude=77.2, speed=10.0,
+                                               last_updated=STORED_AT))
+                    db.add(Route(id=n, route_number=f"R{n}", route_name=f"Route {n}", bus_id=bus_id,
+                                 start_location="A", end_location="B", fare=20.0))
+                    db.add_all([
+                        Stop(route_id=n, stop_name="Last", stop_order=2),
+                        Stop(route_id=n, stop_name="First", stop_order=1),
+                    ])
+                await db.commit()
+
+            statements = []
+            def record(conn, cursor, statement, parameters, context, executemany):
+                statements.append(statement)
+            event.listen(engine.sync_engine, "before_cursor_execute", record)
+            async with session_factory() as db:
+                result = await step(db)
+            event.remove(engine.sync_engine, "before_cursor_execute", record)
+            return result, statements
+        finally:
+            await engine.dispose()
+    return asyncio.run(main())
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = LiveLocationStore()
+    monkeypatch.setattr(routes, "live_locations", store)
+    return store
+
+def test_route_detail_has_ordered_stops_bus_and_position(tmp_path):
+    detail, statements = run_with_session(tmp_path, lambda db: routes.get_route_detail(1, db=db))
+    assert len(statements) == 2
+    assert [stop.stop_name for stop in detail.stops] == ["First", "Last"]
+    assert detail.bus.bus_number == "DL-1"
+    assert detail.bus.live_location.latitude == 28.6
+    assert detail.bus.live_location.last_updated == STORED_AT
+
+def test_route_detail_without_bus(tmp_path):
+    detail, _ = run_with_session(tmp_path, lambda db: routes.get_route_detail(2, db=db))
+    assert detail.bus is None
+    assert len(detail.stops) == 2
+
+def test_route_detail_prefers_live_store_position(tmp_path, store):
+    store.register_bus(Bus(id=1, bus_number="DL-1", registration_number="REG-1", is_active=True))
+    now = datetime.now(timezone.utc)
+    store.apply([{"bus_id": 1, "latitude": 28.7, "longitude": 77.3, "speed": 25.0, "heading": 90.0,
+                  "last_updated": now}])
+    detail, _ = run_with_session(tmp_path, lambda db: routes.get_route_detail(1, db=db))
+    position = detail.bus.live_location
+    assert (position.latitude, position.speed, position.heading) == (28.7, 25.0, 90.0)
+    assert position.last_updated - now < timedelta(seconds=1)
+
+def test_route_detail_not_found(tmp_path):
+    async def step(db):
+        with pytest.raises(HTTPException) as error:
+            await routes.get_route_detail(99, db=db)
+        return error.value.status_code
+    status_code, _ = run_with_session(tmp_path, step)
+    assert status_code == 404
+
+def test_route_details_query_count_does_not_grow_with_routes(tmp_path):
+    def step(db):
+        return routes.get_route_details(page=Page(routes.route_pages, limit=100), db=db)
+    details, statements = run_with_session(tmp_path, step, route_count=20)
+    assert len(details) == 20
+    assert len(statements) == 2
+    assert all([stop.stop_order for stop in detail.stops] == [1, 2] for detail in details)
+    assert sum(detail.bus is not None for detail in details) == 10
+
+def test_route_details_filter_by_bus(tmp_path):
+    def step(db):
+        return routes.get_route_details(bus_id=3, page=Page(routes.route_pages, limit=100), db=db)
+    details, _ = run_with_session(tmp_path, step)
+    assert [detail.id for detail in details] == [3]
+
+def test_route_details_are_paginated(tmp_path):
+    page = Page(routes.route_pages, limit=2)
+    details, _ = run_with_session(tmp_path, lambda db: routes.get_route_details(page=page, db=db))
+    assert [detail.id for detail in details] == [1, 2]
+    assert page.next_cursor is not None
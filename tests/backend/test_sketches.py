@@ -0,0 +1,149 @@
+"""
+Approximate Analytics Tests
+Tests for the distinct-passenger HyperLogLog and top-route count-min sketches
+"""
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import AnalyticsSketch, Route, User
+from schemas import BookingCreate
+from routers import analytics, bookings
+from services.sketches import BookingSketches, HyperLogLog, TopK, HLL_STANDARD_ERROR
+
+T0 = datetime(2026, 1, 7, 10, 30, tzinfo=timezone.utc)
+DAY = date(2026, 1, 7)
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(id=1, email="ops@example.com", full_name="Ops", hashed_password="x"),
+        User(id=2, email="rider@example.com", full_name="Rider", hashed_password="x"),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=25.0),
+        Route(id=2, route_number="2", route_name="R2", start_location="B", end_location="C", fare=40.0),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+@pytest.fixture
+def sketches(monkeypatch):
+    sketches = BookingSketches(retention_days=31)
+    monkeypatch.setattr(bookings, "booking_sketches", sketches)
+    monkeypatch.setattr(analytics, "booking_sketches", sketches)
+    return sketches
+
+def book(db, user_id, route_id, name="P", at=T0):
+    user = db.query(User).filter(User.id == user_id).first()
+    return bookings.create_booking(BookingCreate(route_id=route_id, passenger_name=name, journey_date=at),
+                                   db=db, current_user=user)
+
+def test_hyperloglog_estimate_and_merge():
+    first, second = HyperLogLog(), HyperLogLog()
+    for i in range(20000):
+        first.add(f"rider-{i}")
+        second.add(f"rider-{i + 10000}")
+    assert first.count() == pytest.approx(20000, rel=4 * HLL_STANDARD_ERROR)
+    for i in range(1000):
+        first.add(f"rider-{i}")
+    assert first.count() == pytest.approx(20000, rel=4 * HLL_STANDARD_ERROR)
+    first.merge(second)
+    assert first.count() == pytest.approx(30000, rel=4 * HLL_STANDARD_ERROR)
+    small = HyperLogLog()
+    for name in ["a", "b", "c", "a"]:
+        small.add(name)
+    assert small.count() == 3
+    assert len(small.to_bytes()) == 4096
+
+def test_top_k_never_undercounts_heavy_hitters():
+    sketch = TopK(capacity=5)
+    for route_id in range(1, 201):
+        sketch.add(route_id, 1 + (50 if route_id <= 3 else 0))
+    top = sketch.top(3)
+    assert [route_id for route_id, _ in top] == [1, 2, 3]
+    assert all(count >= 51 for _, count in top)
+    restored = TopK.from_bytes(sketch.to_bytes())
+    assert restored.top(3) == top and restored.total() == sketch.total() == 350
+
+def test_bookings_update_sketches_and_endpoints(db, sketches):
+    book(db, 1, 1, "Asha")
+    book(db, 1, 1, " asha ")
+    book(db, 1, 1, "Ravi")
+    book(db, 2, 1, "Asha")
+    book(db, 2, 2, "Asha")
+    book(db, 2, 2, "Asha", at=T0 + timedelta(days=1))
+
+    rows = analytics.get_approx_distinct_passengers(day=DAY, route_id=None, db=db)
+    assert [(row["route_id"], row["estimate"]) for row in rows] == [(1, 3), (2, 1)]
+    assert rows[0]["standard_error"] == HLL_STANDARD_ERROR
+    top = analytics.get_approx_top_routes(day=DAY, k=1, db=db)
+    assert top == [{"route_id": 1, "route_name": "R1", "estimated_bookings": 4, "max_overcount": 1}]
+
+def test_persist_merges_with_other_workers(db, sketches, monkeypatch):
+    book(db, 1, 1, "Asha")
+    book(db, 1, 2, "Asha")
+    sketches.persist(db, today=DAY)
+    assert db.query(AnalyticsSketch).count() == 3
+
+    book(db, 1, 1, "Kiran")
+    # A second worker that booked other riders concurrently
+    other = BookingSketches()
+    monkeypatch.setattr(bookings, "booking_sketches", other)
+    book(db, 2, 1, "Ravi")
+    book(db, 2, 1, "Meera")
+    other.persist(db, today=DAY)
+    sketches.persist(db, today=DAY)
+
+    assert sketches.distinct_passengers(db, DAY, 1) == 4
+    assert other.top_routes(db, DAY, 2) == ([(1, 4), (2, 1)], 5)
+    assert sketches.top_routes(db, DAY, 2) == ([(1, 4), (2, 1)], 5)
+    # Persisting again without new bookings changes nothing
+    sketches.persist(db, today=DAY)
+    assert sketches.top_routes(db, DAY, 2)[1] == 5
+
+def test_bookings_recorded_during_persist_are_kept(db, sketches, monkeypatch):
+    book(db, 1, 1, "Asha")
+    save = sketches._save
+    recorded = []
+    def save_while_booking(db, sketch_id, merge):
+        # The lock is not held while saving, so a booking can be recorded meanwhile
+        if not recorded:
+            recorded.append(book(db, 2, 1, "Ravi"))
+        save(db, sketch_id, merge)
+    monkeypatch.setattr(sketches, "_save", save_while_booking)
+    sketches.persist(db, today=DAY)
+    monkeypatch.setattr(sketches, "_save", save)
+    sketches.persist(db, today=DAY)
+
+    assert sketches.distinct_passengers(db, DAY, 1) == 2
+    assert sketches.top_routes(db, DAY, 1) == ([(1, 2)], 2)
+
+def test_failed_persist_keeps_changes_for_the_next(db, sketches, monkeypatch):
+    book(db, 1, 1, "Asha")
+    save = sketches._save
+    def fail(db, sketch_id, merge):
+        raise RuntimeError("database unavailable")
+    monkeypatch.setattr(sketches, "_save", fail)
+    with pytest.raises(RuntimeError):
+        sketches.persist(db, today=DAY)
+    book(db, 1, 1, "Ravi")
+    monkeypatch.setattr(sketches, "_save", save)
+    sketches.persist(db, today=DAY)
+
+    assert sketches.distinct_passengers(db, DAY, 1) == 2
+    assert sketches.top_routes(db, DAY, 1) == ([(1, 2)], 2)
+
+def test_old_days_expire(db, sketches):
+    book(db, 1, 1, at=T0 - timedelta(days=40))
+    book(db, 1, 1)
+    sketches.persist(db, today=DAY)
+    assert {row.day for row in db.query(AnalyticsSketch)} == {DAY}
@@ -0,0 +1,110 @@
+"""
+Spatial Index Tests
+Tests for the grid index behind the nearby bus and stop queries
+"""
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from database import Base
+from models import Bus, Route, Stop
+from services.location_store import LiveLocationStore
+from services.spatial_index import GridIndex, StopIndex, haversine_m
+
+T0 = datetime(2026, 1, 1, 8, 0, tzinfo=timezone.utc)
+
+def fix(bus_id, latitude, longitude):
+    return {
+        "bus_id": bus_id,
+        "latitude": latitude,
+        "longitude": longitude,
+        "speed": 20.0,
+        "heading": None,
+        "last_updated": T0,
+    }
+
+def test_haversine_one_degree_of_latitude():
+    assert haversine_m(28.0, 77.0, 29.0, 77.0) == pytest.approx(111195, rel=1e-3)
+
+def test_nearby_filters_by_radius_and_sorts_by_distance():
+    grid = GridIndex()
+    grid.update("a", 28.6100, 77.2000)
+    grid.update("b", 28.6050, 77.2000)
+    grid.update("c", 28.7000, 77.2000)
+    found = grid.nearby(28.6000, 77.2000, 2000, 10)
+    assert [key for key, _ in found] == ["b", "a"]
+    assert found[0][1] == pytest.approx(556, rel=1e-2)
+
+def test_nearby_crosses_cell_boundaries_and_applies_limit():
+    grid = GridIndex(cell_degrees=0.001)
+    for i in range(10):
+        grid.update(i, 28.6 + i * 0.0005, 77.2)
+    found = grid.nearby(28.6, 77.2, 1000, 3)
+    assert [key for key, _ in found] == [0, 1, 2]
+
+def test_update_moves_point_between_cells_and_remove_forgets_it():
+    grid = GridIndex()
+    grid.update(1, 28.6, 77.2)
+    grid.update(1, 19.0, 72.8)
+    assert grid.nearby(28.6, 77.2, 1000, 10) == []
+    assert [key for key, _ in grid.nearby(19.0, 72.8, 10, 10)] == [1]
+    grid.remove(1)
+    assert len(grid) == 0
+    assert grid.nearby(19.0, 72.8, 10, 10) == []
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        Bus(id=1, bus_number="DTC-1", registration_number="DL-1", capacity=50),
+        Bus(id=2, bus_number="DTC-2", registration_number="DL-2", capacity=50),
+        Bus(id=3, bus_number="DTC-3", registration_number="DL-3", capacity=50, is_active=False),
+        Route(id=1, route_number="1", route_name="R1", start_location="A", end_location="B", fare=10.0),
+    ])
+    session.add_all([
+        Stop(id=1, route_id=1, stop_name="Near", stop_order=1, latitude=28.601, longitude=77.2),
+        Stop(id=2, route_id=1, stop_name="Far", stop_order=2, latitude=28.65, longitude=77.2),
+        Stop(id=3, route_id=1, stop_name="Unmapped", stop_order=3),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+def test_store_nearby_returns_active_buses_with_distance(db):
+    store = LiveLocationStore()
+    store.load(db)
+    store.apply([fix(1, 28.602, 77.2), fix(2, 28.601, 77.2), fix(3, 28.6, 77.2)])
+    found = store.nearby(28.6, 77.2, 500, 10)
+    assert [row["id"] for row in found] == [2, 1]
+    assert found[0]["bus_number"] == "DTC-2"
+    assert found[0]["distance_m"] == pytest.approx(111.2, abs=0.5)
+
+def test_store_nearby_follows_moves_and_removals(db):
+    store = LiveLocationStore()
+    store.load(db)
+    store.apply([fix(1, 28.6, 77.2), fix(2, 28.6, 77.2)])
+    store.apply([fix(1, 28.7, 77.2) | {"last_updated": T0.replace(minute=1)}])
+    store.remove_bus(2)
+    assert store.nearby(28.6, 77.2, 500, 10) == []
+    assert [row["id"] for row in store.nearby(28.7, 77.2, 500, 10)] == [1]
+
+def test_stop_index_load_upsert_and_remove(db):
+    index = StopIndex()
+    index.load(db)
+    assert [stop["stop_name"] for stop in index.nearby(28.6, 77.2, 1000, 10)] == ["Near"]
+
+    stop = Stop(id=4, route_id=1, stop_name="New", stop_order=4, latitude=28.6, longitude=77.2)
+    db.add(stop)
+    db.commit()
+    index.upsert(stop)
+    index.remove(1)
+    found = index.nearby(28.6, 77.2, 1000, 10)
+    assert [stop["id"] for stop in found] == [4]
+    assert found[0]["distance_m"] == 0.0
@@ -0,0 +1,61 @@
+"""
+Subscription Index Tests
+Tests for route, bus and bounding box subscriptions on live tracking
+"""
+import pytest
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from services.subscriptions import SubscriptionIndex, parse_topic
+
+def test_route_and_bus_subscriptions():
+    """Test exact-key subscriptions match only their bus or route"""
+    index = SubscriptionIndex()
+    index.subscribe("a", "route", 7)
+    index.subscribe("b", "bus", 3)
+    assert index.match(3, [7], 28.6, 77.2) == {"a", "b"}
+    assert index.match(4, [7], 28.6, 77.2) == {"a"}
+    assert index.match(5, [8], 28.6, 77.2) == set()
+
+def test_bbox_subscription():
+    """Test bounding boxes match positions inside them only"""
+    index = SubscriptionIndex()
+    index.subscribe("a", "bbox", (28.60, 77.20, 28.70, 77.30))
+    assert index.match(1, [], 28.65, 77.25) == {"a"}
+    assert index.match(1, [], 28.75, 77.25) == set()
+
+def test_wide_bbox_subscription():
+    """Test boxes too large for the grid are still matched"""
+    index = SubscriptionIndex()
+    index.subscribe("a", "bbox", (-90.0, -180.0, 90.0, 180.0))
+    assert index.match(1, [], 28.65, 77.25) == {"a"}
+    index.unsubscribe("a", "bbox", (-90.0, -180.0, 90.0, 180.0))
+    assert index.match(1, [], 28.65, 77.25) == set()
+
+def test_unsubscribe_keeps_overlapping_box():
+    """Test removing one box keeps grid cells shared with another box"""
+    index = SubscriptionIndex()
+    index.subscribe("a", "bbox", (28.60, 77.20, 28.70, 77.30))
+    index.subscribe("a", "bbox", (28.65, 77.25, 28.68, 77.28))
+    index.unsubscribe("a", "bbox", (28.65, 77.25, 28.68, 77.28))
+    assert index.match(1, [], 28.66, 77.26) == {"a"}
+
+def test_remove_forgets_everything():
+    """Test remove drops all of a subscriber's topics"""
+    index = SubscriptionIndex()
+    index.subscribe("a", "route", 7)
+    index.subscribe("a", "bbox", (28.60, 77.20, 28.70, 77.30))
+    index.remove("a")
+    assert not index.has_subscriptions("a")
+    assert index.match(1, [7], 28.65, 77.25) == set()
+
+def test_parse_topic():
+    """Test subscription messages are validated"""
+    assert parse_topic({"route_id": "7"}) == ("route", 7)
+    assert parse_topic({"bbox": [28.6, 77.2, 28.7, 77.3]}) == ("bbox", (28.6, 77.2, 28.7, 77.3))
+    with pytest.raises(ValueError):
+        parse_topic({"bbox": [28.7, 77.2, 28.6, 77.3]})
+    with pytest.raises(ValueError):
+        parse_topic({"stop_id": 1})
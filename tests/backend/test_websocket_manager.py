@@ -0,0 +1,168 @@
+"""
+WebSocket Connection Manager Tests
+Tests for queued, backpressure-aware broadcast
+"""
+import asyncio
+import json
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from routers import websocket
+from routers.websocket import ConnectionManager, WS_CLOSE_TRY_AGAIN_LATER
+from services.location_codec import BINARY_SUBPROTOCOL, decode_frame
+
+class FakeWebSocket:
+    """Records sent messages; can be made slow or broken"""
+
+    def __init__(self, delay=0.0, broken=False, subprotocols=()):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.accepted_subprotocol = None
+        self.delay = delay
+        self.broken = broken
+        self.sent = []
+        self.close_code = None
+        self.received = []
+
+    async def accept(self, subprotocol=None):
+        self.accepted_subprotocol = subprotocol
+
+    async def send_text(self, message):
+        if self.broken:
+            raise RuntimeError("connection reset")
+        await asyncio.sleep(self.delay)
+        self.sent.append(message)
+
+    async def send_bytes(self, message):
+        await self.send_text(message)
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+    async def receive(self):
+        return self.received.pop(0)
+
+def run(coro):
+    return asyncio.run(coro)
+
+def test_slow_client_does_not_stall_others():
+    """Test a slow consumer is isolated and keeps only the newest messages"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=2, send_timeout=5.0, slow_consumer_policy="drop_oldest")
+        fast, slow = FakeWebSocket(), FakeWebSocket(delay=10)
+        await manager.connect(fast)
+        await manager.connect(slow)
+        for i in range(5):
+            await manager.broadcast(f"m{i}")
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+        assert fast.sent[0] == '{"type": "keyframe", "seq": 0, "buses": []}'
+        assert fast.sent[1:] == ["m0", "m1", "m2", "m3", "m4"]
+        slow_client = manager.active_connections[slow]
+        assert slow_client.dropped > 0
+        assert list(slow_client.queue._queue)[-1] == "m4"
+        manager.disconnect(fast)
+        manager.disconnect(slow)
+    run(scenario())
+
+def test_disconnect_policy_evicts_slow_client():
+    """Test the disconnect policy closes a consumer whose queue is full"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=1, send_timeout=5.0, slow_consumer_policy="disconnect")
+        slow = FakeWebSocket(delay=10)
+        await manager.connect(slow)
+        for i in range(3):
+            await manager.broadcast(f"m{i}")
+        await asyncio.sleep(0.01)
+        assert slow not in manager.active_connections
+        assert slow.close_code == WS_CLOSE_TRY_AGAIN_LATER
+    run(scenario())
+
+def test_dead_socket_removed():
+    """Test a socket whose send fails is removed from the manager"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=4, send_timeout=5.0)
+        dead = FakeWebSocket(broken=True)
+        await manager.connect(dead)
+        await manager.broadcast("hello")
+        await asyncio.sleep(0.01)
+        assert dead not in manager.active_connections
+    run(scenario())
+
+def test_publish_frame_respects_subscriptions():
+    """Test subscribed clients receive only matching buses and unfiltered clients receive all"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=8, send_timeout=5.0, route_ids=lambda bus_id: [7] if bus_id == 1 else [8])
+        everything, route_only = FakeWebSocket(), FakeWebSocket()
+        await manager.connect(everything)
+        client = await manager.connect(route_only)
+        manager.handle_message(client, '{"action": "subscribe", "route_id": 7}')
+        await manager.publish_frame("delta", [
+            {"bus_id": 1, "latitude": 28.6, "longitude": 77.2},
+            {"bus_id": 2, "latitude": 28.6, "longitude": 77.2},
+        ])
+        await asyncio.sleep(0.01)
+        assert len(json.loads(everything.sent[-1])["buses"]) == 2
+        assert json.loads(route_only.sent[1]) == {"type": "subscribed", "route_id": 7}
+        frame = json.loads(route_only.sent[-1])
+        assert frame["type"] == "delta"
+        assert [bus["bus_id"] for bus in frame["buses"]] == [1]
+        manager.disconnect(everything)
+        manager.disconnect(route_only)
+    run(scenario())
+
+def test_dropped_frames_trigger_keyframe():
+    """Test a client that lost frames gets a keyframe instead of its next delta"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=1, send_timeout=5.0, slow_consumer_policy="drop_oldest")
+        slow = FakeWebSocket(delay=10)
+        client = await manager.connect(slow)
+        await asyncio.sleep(0.001)
+        await manager.publish_frame("delta", [{"bus_id": 1, "latitude": 28.6, "longitude": 77.2}])
+        await manager.publish_frame("delta", [{"bus_id": 1, "latitude": 28.7, "longitude": 77.2}])
+        assert client.needs_keyframe
+        await manager.publish_frame("delta", [{"bus_id": 1, "latitude": 28.8, "longitude": 77.2}])
+        assert json.loads(client.queue._queue[-1])["type"] == "keyframe"
+        assert not client.needs_keyframe
+        manager.disconnect(slow)
+    run(scenario())
+
+def test_binary_subprotocol_gets_packed_frames():
+    """Test clients offering the binary subprotocol receive binary location frames"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=8, send_timeout=5.0)
+        binary, text = FakeWebSocket(subprotocols=["dtms.location.v1.binary"]), FakeWebSocket()
+        await manager.connect(binary)
+        await manager.connect(text)
+        await manager.publish_frame("delta", [{"bus_id": 1, "latitude": 28.6, "longitude": 77.2, "speed": 30.0, "heading": None}])
+        await asyncio.sleep(0.01)
+        assert binary.accepted_subprotocol == BINARY_SUBPROTOCOL
+        assert text.accepted_subprotocol is None
+        frame = decode_frame(binary.sent[-1])
+        assert frame["type"] == "delta"
+        assert frame["buses"][0]["bus_id"] == 1
+        assert json.loads(text.sent[-1])["buses"][0]["latitude"] == 28.6
+        manager.disconnect(binary)
+        manager.disconnect(text)
+    run(scenario())
+
+def test_endpoint_ignores_binary_client_frames(monkeypatch):
+    """Test a binary frame from the client is skipped rather than ending the connection"""
+    async def scenario():
+        manager = ConnectionManager(queue_size=8, send_timeout=5.0)
+        monkeypatch.setattr(websocket, "manager", manager)
+        handled = []
+        monkeypatch.setattr(manager, "handle_message", lambda client, data: handled.append(data))
+        ws = FakeWebSocket()
+        ws.received = [
+            {"type": "websocket.receive", "bytes": b"\x01\x02"},
+            {"type": "websocket.receive", "text": json.dumps({"action": "subscribe", "route_id": 12})},
+            {"type": "websocket.disconnect", "code": 1000},
+        ]
+        await websocket.websocket_endpoint(ws)
+        await asyncio.sleep(0.01)
+        assert not ws.received
+        assert not manager.active_connections
+        assert [json.loads(data)["route_id"] for data in handled] == [12]
+    run(scenario())
@@ -0,0 +1,92 @@
+"""
+Async Read Path Benchmark
+Compares requests per second of a route listing served the sync way (a
+session per request on the threadpool, 40 threads by default) against the
+async engine, at increasing numbers of concurrent requests. Each request
+also waits --latency seconds in the database (pg_sleep) to stand in for a
+slow query or a remote database; only PostgreSQL supports it. Against
+SQLite (--latency 0) the async side is slower: aiosqlite runs every
+connection on a thread of its own, so there is no waiting to overlap.
+Run with: DATABASE_URL=postgresql://... python tests/benchmarks/bench_async_reads.py
+"""
+import argparse
+import asyncio
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from anyio import to_thread
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import DATABASE_URL, async_url
+from models import Route
+
+CONCURRENCY = [10, 40, 100, 200]
+REQUESTS_PER_CLIENT = 5
+
+def pool_args(url, concurrency):
+    # Enough connections for every client, so only the threadpool limits the sync path
+    return {} if url.startswith("sqlite") else {"pool_size": concurrency, "max_overflow": 0}
+
+def route_query(latency):
+    query = select(Route).limit(100)
+    if latency:
+        query = query.where(func.pg_sleep(latency).isnot(None))
+    return query
+
+async def run_sync(url, concurrency, latency):
+    engine = create_engine(url, **pool_args(url, concurrency))
+    session_factory = sessionmaker(bind=engine)
+
+    def request():
+        with session_factory() as db:
+            return db.execute(route_query(latency)).scalars().all()
+
+    async def client():
+        for _ in range(REQUESTS_PER_CLIENT):
+            await to_thread.run_sync(request)
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - started
+    finally:
+        engine.dispose()
+
+async def run_async(url, concurrency, latency):
+    engine = create_async_engine(async_url(url), **pool_args(url, concurrency))
+    session_factory = async_sessionmaker(engine)
+
+    async def client():
+        for _ in range(REQUESTS_PER_CLIENT):
+            async with session_factory() as db:
+                (await db.execute(route_query(latency))).scalars().all()
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - started
+    finally:
+        await engine.dispose()
+
+async def main(url, latency):
+    threads = int(to_thread.current_default_thread_limiter().total_tokens)
+    print(f"threadpool: {threads} threads, {REQUESTS_PER_CLIENT} requests per client, latency {latency}s")
+    print(f"{'clients':>8} {'engine':>7} {'seconds':>9} {'req/s':>9}")
+    for concurrency in CONCURRENCY:
+        for name, run in (("sync", run_sync), ("async", run_async)):
+            seconds = await run(url, concurrency, latency)
+            print(f"{concurrency:>8} {name:>7} {seconds:>9.3f} {concurrency * REQUESTS_PER_CLIENT / seconds:>9.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sync and async route listing")
+    parser.add_argument("--url", default=DATABASE_URL, help="database URL (default: DATABASE_URL)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds each query waits in the database")
+    args = parser.parse_args()
+    if args.latency and not args.url.startswith("postgresql"):
+        parser.error("--latency needs PostgreSQL; pass --latency 0 for other databases")
+    asyncio.run(main(args.url, args.latency))
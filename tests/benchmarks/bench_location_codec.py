@@ -0,0 +1,47 @@
+"""
+Live Tracking Frame Benchmark
+Compares bytes per frame and encode time of JSON text frames against the
+packed binary codec.
+Run with: python tests/benchmarks/bench_location_codec.py
+"""
+import json
+import random
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../web/backend'))
+
+from services.location_codec import encode_frame
+
+FLEET_SIZES = [100, 1000, 5000]
+REPEAT = 20
+
+def make_entries(count):
+    random.seed(count)
+    return [
+        {
+            "bus_id": bus_id,
+            "latitude": round(random.uniform(28.4089, 28.8955), 6),
+            "longitude": round(random.uniform(76.8380, 77.3490), 6),
+            "speed": round(random.uniform(0, 60), 1),
+            "heading": round(random.uniform(0, 360), 1),
+        }
+        for bus_id in range(1, count + 1)
+    ]
+
+def encode_json(entries):
+    return json.dumps({"type": "keyframe", "seq": 1, "buses": entries})
+
+def main():
+    print(f"{'buses':>6} {'codec':>7} {'bytes':>10} {'bytes/bus':>10} {'encode ms':>10}")
+    for count in FLEET_SIZES:
+        entries = make_entries(count)
+        for name, encode in (("json", encode_json), ("binary", lambda e: encode_frame("keyframe", 1, e))):
+            payload = encode(entries)
+            size = len(payload.encode() if isinstance(payload, str) else payload)
+            seconds = min(timeit.repeat(lambda: encode(entries), number=1, repeat=REPEAT))
+            print(f"{count:>6} {name:>7} {size:>10} {size / count:>10.1f} {seconds * 1000:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -5,65 +5,46 @@ Script to add sample live bus locations for demonstration
 import sys
 import os
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Add the backend directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy.orm import Session
 from database import SessionLocal
-from models import Bus, LiveBusLocation
+from models import Bus
+from schemas import LiveLocationFix
+from services.location_ingest import upsert_live_locations
 
 def add_live_bus_locations(db: Session):
     """Add live locations for all active buses"""
     
-    buses = db.query(Bus).filter(Bus.is_active == True).all()
+    bus_ids = [bus_id for (bus_id,) in db.query(Bus.id).filter(Bus.is_active == True).all()]
     
     # Delhi coordinates range (approximate)
     delhi_lat_range = (28.4089, 28.8955)  # Min, Max latitude
     delhi_lng_range = (76.8380, 77.3490)  # Min, Max longitude
     
-    locations_added = 0
+    fixes = []
+    now = datetime.now(timezone.utc)
     
-    for bus in buses:
-        # Check if location already exists
-        existing_location = db.query(LiveBusLocation).filter(
-            LiveBusLocation.bus_id == bus.id
-        ).first()
-        
-        # Round coordinates to 6 decimal places for realistic GPS precision
-        latitude = round(random.uniform(*delhi_lat_range), 6)
-        longitude = round(random.uniform(*delhi_lng_range), 6)
-        
-        # Round speed to nearest 5 km/h for realistic values
-        speed = round(random.uniform(0, 60) / 5) * 5
-        
-        # Round heading to nearest 10 degrees
-        heading = round(random.uniform(0, 360) / 10) * 10
-        
-        if existing_location:
-            # Update existing location
-            existing_location.latitude = latitude
-            existing_location.longitude = longitude
-            existing_location.speed = speed
-            existing_location.heading = heading
-            existing_location.last_updated = datetime.now()
-        else:
-            # Create new location
-            location = LiveBusLocation(
-                bus_id=bus.id,
-                latitude=latitude,
-                longitude=longitude,
-                speed=speed,
-                heading=heading,
-                last_updated=datetime.now()
-            )
-            db.add(location)
-        
-        locations_added += 1
+    for bus_id in bus_ids:
+        fixes.append(LiveLocationFix(
+            bus_id=bus_id,
+            # Round coordinates to 6 decimal places for realistic GPS precision
+            latitude=round(random.uniform(*delhi_lat_range), 6),
+            longitude=round(random.uniform(*delhi_lng_range), 6),
+            # Round speed to nearest 5 km/h for realistic values
+            speed=round(random.uniform(0, 60) / 5) * 5,
+            # Round heading to nearest 10 degrees
+            heading=round(random.uniform(0, 360) / 10) * 10,
+            recorded_at=now
+        ))
     
+    # One set-based upsert instead of a query and update per bus
+    accepted, _, _ = upsert_live_locations(db, fixes)
     db.commit()
-    return locations_added
+    return len(accepted)
 
 def main():
     """Main function to add live bus locations"""
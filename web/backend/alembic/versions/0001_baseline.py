@@ -0,0 +1,201 @@
+"""Schema baseline
+
+The users, wallets, metro cards, transactions, buses, routes, stops,
+bookings, payments and live bus location tables as the server created
+them with Base.metadata.create_all before any analytics tables existed.
+A database created that way is at this revision: run
+`alembic stamp 0001_baseline` once, then upgrade.
+
+Revision ID: 0001_baseline
+Revises: 
+Create Date: 2026-10-17 20:28:19.831469
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_baseline'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('buses',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bus_number', sa.String(length=50), nullable=False),
+    sa.Column('registration_number', sa.String(length=50), nullable=False),
+    sa.Column('capacity', sa.Integer(), nullable=False),
+    sa.Column('bus_type', sa.String(length=50), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('registration_number')
+    )
+    op.create_index(op.f('ix_buses_bus_number'), 'buses', ['bus_number'], unique=True)
+    op.create_index(op.f('ix_buses_id'), 'buses', ['id'], unique=False)
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('phone', sa.String(length=20), nullable=True),
+    sa.Column('full_name', sa.String(length=255), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('role', sa.Enum('ADMIN', 'OPERATOR', 'PASSENGER', name='userrole'), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_index(op.f('ix_users_phone'), 'users', ['phone'], unique=True)
+    op.create_table('live_bus_locations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bus_id', sa.Integer(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=False),
+    sa.Column('longitude', sa.Float(), nullable=False),
+    sa.Column('speed', sa.Float(), nullable=True),
+    sa.Column('heading', sa.Float(), nullable=True),
+    sa.Column('last_updated', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['bus_id'], ['buses.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('bus_id')
+    )
+    op.create_index(op.f('ix_live_bus_locations_id'), 'live_bus_locations', ['id'], unique=False)
+    op.create_table('metro_cards',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('card_number', sa.String(length=50), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_metro_cards_card_number'), 'metro_cards', ['card_number'], unique=True)
+    op.create_index(op.f('ix_metro_cards_id'), 'metro_cards', ['id'], unique=False)
+    op.create_table('routes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('route_number', sa.String(length=50), nullable=False),
+    sa.Column('route_name', sa.String(length=255), nullable=False),
+    sa.Column('bus_id', sa.Integer(), nullable=True),
+    sa.Column('start_location', sa.String(length=255), nullable=False),
+    sa.Column('end_location', sa.String(length=255), nullable=False),
+    sa.Column('distance_km', sa.Float(), nullable=True),
+    sa.Column('estimated_duration_minutes', sa.Integer(), nullable=True),
+    sa.Column('fare', sa.Float(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['bus_id'], ['buses.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_routes_id'), 'routes', ['id'], unique=False)
+    op.create_index(op.f('ix_routes_route_number'), 'routes', ['route_number'], unique=True)
+    op.create_table('wallets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('balance', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+    op.create_index(op.f('ix_wallets_id'), 'wallets', ['id'], unique=False)
+    op.create_table('bookings',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('route_id', sa.Integer(), nullable=False),
+    sa.Column('booking_reference', sa.String(length=50), nullable=False),
+    sa.Column('passenger_name', sa.String(length=255), nullable=False),
+    sa.Column('passenger_category', sa.String(length=50), nullable=True),
+    sa.Column('seat_number', sa.String(length=10), nullable=True),
+    sa.Column('journey_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('fare_amount', sa.Float(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'CONFIRMED', 'CANCELLED', 'COMPLETED', name='bookingstatus'), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['route_id'], ['routes.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_bookings_booking_reference'), 'bookings', ['booking_reference'], unique=True)
+    op.create_index(op.f('ix_bookings_id'), 'bookings', ['id'], unique=False)
+    op.create_table('stops',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('route_id', sa.Integer(), nullable=False),
+    sa.Column('stop_name', sa.String(length=255), nullable=False),
+    sa.Column('stop_order', sa.Integer(), nullable=False),
+    sa.Column('latitude', sa.Float(), nullable=True),
+    sa.Column('longitude', sa.Float(), nullable=True),
+    sa.Column('estimated_arrival_time', sa.String(length=10), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['route_id'], ['routes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_stops_id'), 'stops', ['id'], unique=False)
+    op.create_table('transactions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('wallet_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('transaction_type', sa.Enum('CREDIT', 'DEBIT', name='transactiontype'), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('reference_id', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['wallet_id'], ['wallets.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_transactions_id'), 'transactions', ['id'], unique=False)
+    op.create_table('payments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('booking_id', sa.Integer(), nullable=False),
+    sa.Column('payment_method', sa.String(length=50), nullable=False),
+    sa.Column('transaction_id', sa.String(length=100), nullable=True),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('status', sa.Enum('PENDING', 'SUCCESS', 'FAILED', 'REFUNDED', name='paymentstatus'), nullable=True),
+    sa.Column('payment_date', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['booking_id'], ['bookings.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('booking_id')
+    )
+    op.create_index(op.f('ix_payments_id'), 'payments', ['id'], unique=False)
+    op.create_index(op.f('ix_payments_transaction_id'), 'payments', ['transaction_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_payments_transaction_id'), table_name='payments')
+    op.drop_index(op.f('ix_payments_id'), table_name='payments')
+    op.drop_table('payments')
+    op.drop_index(op.f('ix_transactions_id'), table_name='transactions')
+    op.drop_table('transactions')
+    op.drop_index(op.f('ix_stops_id'), table_name='stops')
+    op.drop_table('stops')
+    op.drop_index(op.f('ix_bookings_id'), table_name='bookings')
+    op.drop_index(op.f('ix_bookings_booking_reference'), table_name='bookings')
+    op.drop_table('bookings')
+    op.drop_index(op.f('ix_wallets_id'), table_name='wallets')
+    op.drop_table('wallets')
+    op.drop_index(op.f('ix_routes_route_number'), table_name='routes')
+    op.drop_index(op.f('ix_routes_id'), table_name='routes')
+    op.drop_table('routes')
+    op.drop_index(op.f('ix_metro_cards_id'), table_name='metro_cards')
+    op.drop_index(op.f('ix_metro_cards_card_number'), table_name='metro_cards')
+    op.drop_table('metro_cards')
+    op.drop_index(op.f('ix_live_bus_locations_id'), table_name='live_bus_locations')
+    op.drop_table('live_bus_locations')
+    op.drop_index(op.f('ix_users_phone'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_buses_id'), table_name='buses')
+    op.drop_index(op.f('ix_buses_bus_number'), table_name='buses')
+    op.drop_table('buses')
+    # PostgreSQL keeps enum types after their tables are dropped
+    for name in ('userrole', 'bookingstatus', 'paymentstatus', 'transactiontype'):
+        sa.Enum(name=name).drop(op.get_bind(), checkfirst=True)
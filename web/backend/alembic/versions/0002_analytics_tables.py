@@ -0,0 +1,97 @@
+"""Tables of the live tracking and analytics services
+
+- kpi_rollup: incrementally maintained KPI totals
+- route_revenue_buckets, passenger_category_buckets: revenue and
+  ridership per hour, day and week
+- analytics_sketches: persisted HyperLogLog and count-min sketches
+- analytics_jobs: background analytics jobs and their results
+- trip_occupancy: passengers and capacity per route per journey day
+
+They are derived from the baseline tables, which the services rebuild
+them from.
+
+Revision ID: 0002_analytics_tables
+Revises: 0001_baseline
+Create Date: 2026-10-18 09:12:40.205118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_analytics_tables'
+down_revision = '0001_baseline'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('analytics_jobs',
+    sa.Column('id', sa.String(length=36), nullable=False),
+    sa.Column('job_type', sa.String(length=50), nullable=False),
+    sa.Column('params', sa.Text(), nullable=False),
+    sa.Column('params_hash', sa.String(length=64), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_analytics_jobs_params_hash'), 'analytics_jobs', ['params_hash'], unique=False)
+    op.create_table('analytics_sketches',
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('sketch_key', sa.String(length=50), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('kind', 'sketch_key', 'day')
+    )
+    op.create_index(op.f('ix_analytics_sketches_day'), 'analytics_sketches', ['day'], unique=False)
+    op.create_table('kpi_rollup',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.create_table('passenger_category_buckets',
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('category', sa.String(length=50), nullable=False),
+    sa.Column('passengers', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('granularity', 'bucket_start', 'category')
+    )
+    op.create_table('route_revenue_buckets',
+    sa.Column('granularity', sa.String(length=10), nullable=False),
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('route_id', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['route_id'], ['routes.id'], ),
+    sa.PrimaryKeyConstraint('granularity', 'bucket_start', 'route_id')
+    )
+    op.create_table('trip_occupancy',
+    sa.Column('route_id', sa.Integer(), nullable=False),
+    sa.Column('journey_date', sa.Date(), nullable=False),
+    sa.Column('bus_id', sa.Integer(), nullable=True),
+    sa.Column('capacity', sa.Integer(), nullable=True),
+    sa.Column('passengers', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['route_id'], ['routes.id'], ),
+    sa.PrimaryKeyConstraint('route_id', 'journey_date')
+    )
+    op.create_index(op.f('ix_trip_occupancy_bus_id'), 'trip_occupancy', ['bus_id'], unique=False)
+    op.create_index(op.f('ix_trip_occupancy_journey_date'), 'trip_occupancy', ['journey_date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_trip_occupancy_journey_date'), table_name='trip_occupancy')
+    op.drop_index(op.f('ix_trip_occupancy_bus_id'), table_name='trip_occupancy')
+    op.drop_table('trip_occupancy')
+    op.drop_table('route_revenue_buckets')
+    op.drop_table('passenger_category_buckets')
+    op.drop_table('kpi_rollup')
+    op.drop_index(op.f('ix_analytics_sketches_day'), table_name='analytics_sketches')
+    op.drop_table('analytics_sketches')
+    op.drop_index(op.f('ix_analytics_jobs_params_hash'), table_name='analytics_jobs')
+    op.drop_table('analytics_jobs')
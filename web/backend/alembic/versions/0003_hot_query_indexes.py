@@ -0,0 +1,46 @@
+"""Indexes for the hot filters of the routers
+
+- bookings.user_id: GET /api/bookings/ lists the current user's bookings
+- bookings(route_id, status): a route's bookings in the states that hold
+  a seat or count as passengers (occupancy, KPIs, analytics backfills)
+- stops(route_id, stop_order): stops of a route in order, without a sort
+- payments.status: successful payments for revenue totals
+- routes.bus_id: routes assigned to a bus (GET /api/routes/?bus_id=)
+
+On PostgreSQL the indexes are built CONCURRENTLY so writes to the
+tables are not blocked while they are created.
+
+Revision ID: 0003_hot_query_indexes
+Revises: 0002_analytics_tables
+Create Date: 2026-10-17 20:28:33.687543
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_hot_query_indexes'
+down_revision = '0002_analytics_tables'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_bookings_user_id', 'bookings', ['user_id']),
+    ('ix_bookings_route_id_status', 'bookings', ['route_id', 'status']),
+    ('ix_stops_route_id_stop_order', 'stops', ['route_id', 'stop_order']),
+    ('ix_payments_status', 'payments', ['status']),
+    ('ix_routes_bus_id', 'routes', ['bus_id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,47 @@
+"""Indexes for keyset pagination of the list endpoints
+
+Each sort offered by a paginated list endpoint is backed by an index on
+(sort column, id), so a page is one index range scan after the cursor
+whatever its depth. Sorting by id uses the primary key, and bus_number
+and route_number have unique indexes already.
+
+- bookings(created_at, id), bookings(journey_date, id): GET /api/bookings/
+- payments(payment_date, id): GET /api/payments/
+- users(created_at, id): GET /api/users/
+- stops(stop_order, id): GET /api/stops/ without a route filter (with one,
+  ix_stops_route_id_stop_order serves it)
+
+Revision ID: 0004_pagination_indexes
+Revises: 0003_hot_query_indexes
+Create Date: 2026-10-17 21:05:12.418204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_pagination_indexes'
+down_revision = '0003_hot_query_indexes'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_bookings_created_at_id', 'bookings', ['created_at', 'id']),
+    ('ix_bookings_journey_date_id', 'bookings', ['journey_date', 'id']),
+    ('ix_payments_payment_date_id', 'payments', ['payment_date', 'id']),
+    ('ix_users_created_at_id', 'users', ['created_at', 'id']),
+    ('ix_stops_stop_order_id', 'stops', ['stop_order', 'id']),
+]
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
@@ -0,0 +1,47 @@
+"""Make the timestamp sort columns of the paginated lists NOT NULL
+
+A keyset page filters on (sort column, id) > cursor, which never matches
+a NULL, so rows without users.created_at, bookings.created_at or
+payments.payment_date could not be paged to. The columns are filled by
+server defaults; rows that still have NULLs get the payment's creation
+time or the current time first.
+
+On PostgreSQL, SET NOT NULL scans each table under an exclusive lock.
+
+Revision ID: 0005_pagination_sorts_not_null
+Revises: 0004_pagination_indexes
+Create Date: 2026-10-18 10:02:51.377910
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_pagination_sorts_not_null'
+down_revision = '0004_pagination_indexes'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('users', 'created_at', None),
+    ('bookings', 'created_at', None),
+    ('payments', 'payment_date', 'created_at'),
+]
+
+
+def upgrade() -> None:
+    for table, column, fallback in COLUMNS:
+        rows = sa.table(table, *(sa.column(name) for name in (column, fallback) if name))
+        value = sa.func.coalesce(rows.c[fallback], sa.func.now()) if fallback else sa.func.now()
+        op.execute(rows.update().where(rows.c[column].is_(None)).values({column: value}))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, existing_type=sa.DateTime(timezone=True),
+                                  existing_server_default=sa.func.now(), nullable=False)
+
+
+def downgrade() -> None:
+    for table, column, _ in reversed(COLUMNS):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(column, existing_type=sa.DateTime(timezone=True),
+                                  existing_server_default=sa.func.now(), nullable=True)
@@ -0,0 +1,44 @@
+"""Spread each KPI of kpi_rollup over several rows
+
+Every booking, payment and bus write added to the single row of its KPI,
+so concurrent write transactions queued on that row's lock until they
+committed. Rows are now keyed by (name, shard); writes pick a shard at
+random and reads sum them. The table only holds totals derived from the
+source tables, so it is recreated empty and refilled by the next
+reconciliation.
+
+Revision ID: 0006_kpi_rollup_shards
+Revises: 0005_pagination_sorts_not_null
+Create Date: 2026-10-18 11:20:07.664150
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_kpi_rollup_shards'
+down_revision = '0005_pagination_sorts_not_null'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_table('kpi_rollup')
+    op.create_table('kpi_rollup',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('shard', sa.Integer(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('name', 'shard')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('kpi_rollup')
+    op.create_table('kpi_rollup',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
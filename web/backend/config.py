@@ -1,3 +1,4 @@
+from pydantic import Field
 from pydantic_settings import BaseSettings
 from typing import List
 
@@ -9,6 +10,57 @@ class Settings(BaseSettings):
     ALLOWED_ORIGINS: str = "http://localhost:5173"
     DEBUG: bool = True
 
+    # Database connection pool (size it against the request threadpool, 40 threads by default)
+    DB_POOL_SIZE: int = Field(10, ge=1)
+    DB_MAX_OVERFLOW: int = Field(20, ge=0)
+    DB_POOL_TIMEOUT: float = Field(30.0, gt=0)
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE: int = 1800  # seconds; -1 disables
+
+    # Read replicas (comma-separated URLs) for read-only endpoints, used round-robin
+    DATABASE_REPLICA_URLS: str = ""
+    # A replica that failed is skipped this long
+    DB_REPLICA_RETRY_SECONDS: float = 30.0
+    # After a write, the client reads from the primary this long so it sees its own writes
+    DB_PRIMARY_STICKY_SECONDS: int = Field(5, ge=1)
+
+    # Live tracking
+    LIVE_LOCATION_FLUSH_SECONDS: float = 2.0
+    LIVE_KEYFRAME_SECONDS: float = 30.0
+    # Delta frames are coalesced and sent at this rate
+    LIVE_TICK_HZ: float = Field(2.0, ge=1, le=5)
+
+    # WebSocket fan-out
+    WS_SEND_QUEUE_SIZE: int = 32
+    WS_SEND_TIMEOUT_SECONDS: float = 5.0
+    WS_SLOW_CONSUMER_POLICY: str = "drop_oldest"  # drop_oldest | disconnect
+    WS_FANOUT_BACKEND: str = "inprocess"  # inprocess | unix (several workers on one host)
+    WS_FANOUT_SOCKET_DIR: str = "/tmp/dtms-fanout"
+
+    # Analytics
+    KPI_RECONCILE_SECONDS: float = 300.0
+    # Rows per KPI that writes are spread over
+    KPI_ROLLUP_SHARDS: int = Field(16, ge=1)
+    # Revenue/ridership buckets are rebuilt from the source tables this often
+    ANALYTICS_BUCKET_REBUILD_SECONDS: float = 900.0
+    OCCUPANCY_REBUILD_SECONDS: float = 900.0
+    SKETCH_PERSIST_SECONDS: float = 30.0
+    SKETCH_RETENTION_DAYS: int = 31
+    ANALYTICS_JOB_WORKERS: int = Field(2, ge=1, le=16)
+    ANALYTICS_JOB_QUEUE_SIZE: int = 20
+    ANALYTICS_JOB_CACHE_SECONDS: float = 300.0
+    ANALYTICS_JOB_TIMEOUT_SECONDS: float = 600.0
+    ANALYTICS_JOB_RETENTION_HOURS: float = 24.0
+
+    # Location history
+    HISTORY_DIR: str = "data/location_history"
+    HISTORY_RAW_RETENTION_DAYS: int = 7
+    HISTORY_1M_RETENTION_DAYS: int = 90
+    HISTORY_COMPACT_SECONDS: float = 3600.0
+
+    # Columnar analytics snapshots (written by export_columnar.py)
+    COLUMNAR_DIR: str = "data/columnar"
+
     class Config:
         env_file = ".env"
 
@@ -1,131 +1,182 @@
 #!/usr/bin/env python3
 """
 Script to show summary of current mock data
+
+Every section is a single aggregate query computed by the database, and
+independent sections run concurrently, each on its own connection. Use
+--json for machine-readable output.
 """
 import sys
 import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the backend directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import case, func, select
 from database import SessionLocal
 from models import User, Booking, Payment, Route, Bus, LiveBusLocation, BookingStatus, PaymentStatus
 
-def show_data_summary():
+FARE_RANGES = [
+    (0, 25, "₹0-25"),
+    (25, 50, "₹25-50"),
+    (50, 75, "₹50-75"),
+    (75, 100, "₹75-100"),
+    (100, None, "₹100+"),
+]
+
+def basic_statistics(db: Session) -> dict:
+    def count(model):
+        return select(func.count()).select_from(model).scalar_subquery()
+    row = db.execute(select(
+        count(User).label("users"),
+        count(Route).label("routes"),
+        count(Bus).label("buses"),
+        select(func.count()).select_from(Bus).where(Bus.is_active == True).scalar_subquery().label("active_buses"),
+        count(Booking).label("bookings"),
+        count(Payment).label("payments"),
+        count(LiveBusLocation).label("live_locations"),
+    )).one()
+    return dict(row._mapping)
+
+def revenue_statistics(db: Session) -> dict:
+    total, payments = db.query(
+        func.coalesce(func.sum(Payment.amount), 0.0), func.count(Payment.id)
+    ).filter(Payment.status == PaymentStatus.SUCCESS).one()
+    return {
+        "total_revenue": float(total),
+        "successful_payments": payments,
+        "average_fare": float(total) / payments if payments else 0.0,
+    }
+
+def booking_status_distribution(db: Session) -> dict:
+    rows = db.query(Booking.status, func.count(Booking.id)).group_by(Booking.status).all()
+    return {status.value: count for status, count in rows}
+
+def passenger_categories(db: Session) -> dict:
+    rows = db.query(
+        Booking.passenger_category, func.count(Booking.id)
+    ).filter(
+        Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.COMPLETED])
+    ).group_by(Booking.passenger_category).all()
+    return {category or "unknown": count for category, count in rows}
+
+def payment_methods(db: Session) -> dict:
+    rows = db.query(
+        Payment.payment_method, func.count(Payment.id)
+    ).filter(
+        Payment.status == PaymentStatus.SUCCESS
+    ).group_by(Payment.payment_method).all()
+    return dict(rows)
+
+def fare_distribution(db: Session) -> dict:
+    buckets = []
+    for min_fare, max_fare, label in FARE_RANGES:
+        condition = Booking.fare_amount >= min_fare
+        if max_fare is not None:
+            condition = condition & (Booking.fare_amount < max_fare)
+        buckets.append(func.coalesce(func.sum(case((condition, 1), else_=0)), 0))
+    counts = db.query(*buckets).one()
+    return {label: count for (_, _, label), count in zip(FARE_RANGES, counts)}
+
+def bus_types(db: Session) -> dict:
+    rows = db.query(Bus.bus_type, func.count(Bus.id)).group_by(Bus.bus_type).all()
+    return {bus_type or "unknown": count for bus_type, count in rows}
+
+def sample_fares(db: Session) -> list:
+    rows = db.query(Booking.fare_amount).distinct().order_by(Booking.fare_amount).limit(10).all()
+    return [fare for fare, in rows]
+
+SECTIONS = {
+    "basic_statistics": basic_statistics,
+    "revenue_statistics": revenue_statistics,
+    "booking_status_distribution": booking_status_distribution,
+    "passenger_categories": passenger_categories,
+    "payment_methods": payment_methods,
+    "fare_distribution": fare_distribution,
+    "bus_types": bus_types,
+    "sample_fares": sample_fares,
+}
+
+def collect_summary(session_factory=SessionLocal, max_workers: int = len(SECTIONS)) -> dict:
+    """Run every section, concurrently and each on its own session"""
+    def run(section):
+        db = session_factory()
+        try:
+            return section(db)
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(run, section) for name, section in SECTIONS.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+def print_summary(summary: dict):
+    basic = summary["basic_statistics"]
+    revenue = summary["revenue_statistics"]
+
+    print("=" * 60)
+    print("DTMS MOCK DATA SUMMARY")
+    print("=" * 60)
+
+    print(f"\n📊 BASIC STATISTICS")
+    print(f"Users: {basic['users']}")
+    print(f"Routes: {basic['routes']}")
+    print(f"Buses: {basic['buses']} (Active: {basic['active_buses']})")
+    print(f"Bookings: {basic['bookings']}")
+    print(f"Payments: {basic['payments']}")
+    print(f"Live Locations: {basic['live_locations']}")
+
+    print(f"\n💰 REVENUE STATISTICS")
+    print(f"Total Revenue: ₹{revenue['total_revenue']:,.2f}")
+    print(f"Successful Payments: {revenue['successful_payments']}")
+    print(f"Average Fare: ₹{revenue['average_fare']:.2f}")
+
+    print(f"\n🎫 BOOKING STATUS DISTRIBUTION")
+    for status, count in summary["booking_status_distribution"].items():
+        print(f"{status.title()}: {count}")
+
+    print(f"\n👥 PASSENGER CATEGORIES (Confirmed/Completed)")
+    for category, count in summary["passenger_categories"].items():
+        print(f"{category.title()}: {count}")
+
+    print(f"\n💳 PAYMENT METHODS (Successful)")
+    for method, count in summary["payment_methods"].items():
+        print(f"{method.replace('_', ' ').title()}: {count}")
+
+    print(f"\n💵 FARE DISTRIBUTION")
+    for label, count in summary["fare_distribution"].items():
+        print(f"{label}: {count} bookings")
+
+    print(f"\n🚌 BUS TYPES")
+    for bus_type, count in summary["bus_types"].items():
+        print(f"{bus_type}: {count}")
+
+    print(f"\n🔢 SAMPLE ROUNDED FARE AMOUNTS")
+    for fare in summary["sample_fares"]:
+        print(f"₹{fare:.2f}")
+
+    print(f"\n" + "=" * 60)
+    print("Data is ready for dashboard demonstration!")
+    print("=" * 60)
+
+def show_data_summary(as_json: bool = False):
     """Show comprehensive summary of mock data"""
-    db = SessionLocal()
     try:
-        print("=" * 60)
-        print("DTMS MOCK DATA SUMMARY")
-        print("=" * 60)
-        
-        # Basic counts
-        user_count = db.query(User).count()
-        route_count = db.query(Route).count()
-        bus_count = db.query(Bus).count()
-        active_bus_count = db.query(Bus).filter(Bus.is_active == True).count()
-        booking_count = db.query(Booking).count()
-        payment_count = db.query(Payment).count()
-        location_count = db.query(LiveBusLocation).count()
-        
-        print(f"\n📊 BASIC STATISTICS")
-        print(f"Users: {user_count}")
-        print(f"Routes: {route_count}")
-        print(f"Buses: {bus_count} (Active: {active_bus_count})")
-        print(f"Bookings: {booking_count}")
-        print(f"Payments: {payment_count}")
-        print(f"Live Locations: {location_count}")
-        
-        # Revenue statistics
-        successful_payments = db.query(Payment).filter(Payment.status == PaymentStatus.SUCCESS).all()
-        total_revenue = sum(p.amount for p in successful_payments)
-        avg_fare = total_revenue / len(successful_payments) if successful_payments else 0
-        
-        print(f"\n💰 REVENUE STATISTICS")
-        print(f"Total Revenue: ₹{total_revenue:,.2f}")
-        print(f"Successful Payments: {len(successful_payments)}")
-        print(f"Average Fare: ₹{avg_fare:.2f}")
-        
-        # Booking status distribution
-        booking_stats = db.query(
-            Booking.status, 
-            func.count(Booking.id).label('count')
-        ).group_by(Booking.status).all()
-        
-        print(f"\n🎫 BOOKING STATUS DISTRIBUTION")
-        for status, count in booking_stats:
-            print(f"{status.value.title()}: {count}")
-        
-        # Passenger category distribution
-        category_stats = db.query(
-            Booking.passenger_category,
-            func.count(Booking.id).label('count')
-        ).filter(
-            Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.COMPLETED])
-        ).group_by(Booking.passenger_category).all()
-        
-        print(f"\n👥 PASSENGER CATEGORIES (Confirmed/Completed)")
-        for category, count in category_stats:
-            print(f"{category.title()}: {count}")
-        
-        # Payment method distribution
-        payment_method_stats = db.query(
-            Payment.payment_method,
-            func.count(Payment.id).label('count')
-        ).filter(
-            Payment.status == PaymentStatus.SUCCESS
-        ).group_by(Payment.payment_method).all()
-        
-        print(f"\n💳 PAYMENT METHODS (Successful)")
-        for method, count in payment_method_stats:
-            print(f"{method.replace('_', ' ').title()}: {count}")
-        
-        # Fare amount ranges
-        fare_ranges = [
-            (0, 25, "₹0-25"),
-            (25, 50, "₹25-50"),
-            (50, 75, "₹50-75"),
-            (75, 100, "₹75-100"),
-            (100, float('inf'), "₹100+")
-        ]
-        
-        print(f"\n💵 FARE DISTRIBUTION")
-        for min_fare, max_fare, label in fare_ranges:
-            if max_fare == float('inf'):
-                count = db.query(Booking).filter(Booking.fare_amount >= min_fare).count()
-            else:
-                count = db.query(Booking).filter(
-                    Booking.fare_amount >= min_fare,
-                    Booking.fare_amount < max_fare
-                ).count()
-            print(f"{label}: {count} bookings")
-        
-        # Bus type distribution
-        bus_type_stats = db.query(
-            Bus.bus_type,
-            func.count(Bus.id).label('count')
-        ).group_by(Bus.bus_type).all()
-        
-        print(f"\n🚌 BUS TYPES")
-        for bus_type, count in bus_type_stats:
-            print(f"{bus_type}: {count}")
-        
-        # Sample fare amounts to show rounding
-        sample_fares = db.query(Booking.fare_amount).distinct().limit(10).all()
-        print(f"\n🔢 SAMPLE ROUNDED FARE AMOUNTS")
-        for fare in sorted([f[0] for f in sample_fares])[:10]:
-            print(f"₹{fare:.2f}")
-        
-        print(f"\n" + "=" * 60)
-        print("Data is ready for dashboard demonstration!")
-        print("=" * 60)
-        
+        summary = collect_summary()
     except Exception as e:
-        print(f"Error generating summary: {e}")
-    finally:
-        db.close()
+        print(f"Error generating summary: {e}", file=sys.stderr)
+        sys.exit(1)
+    if as_json:
+        print(json.dumps(summary, indent=2, ensure_ascii=False))
+    else:
+        print_summary(summary)
 
 if __name__ == "__main__":
-    show_data_summary()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Show a summary of the data in the database")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args()
+    show_data_summary(as_json=args.json)
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Script to export bookings, payments and routes as a columnar snapshot
+
+Analysts open the snapshot with services.columnar.ColumnarSnapshot and
+aggregate it with NumPy instead of querying the database:
+
+    snapshot = ColumnarSnapshot.latest("data/columnar")
+    bookings = snapshot["bookings"]
+    bookings.group_by(["passenger_category", ("journey_date", "week")])
+"""
+import sys
+import os
+import argparse
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config import settings
+from database import SessionLocal
+from services.columnar import ColumnarSnapshot, export_snapshot
+
+def export_columnar(output_dir: str, keep: int):
+    """Export a snapshot and print its row counts"""
+    db = SessionLocal()
+    try:
+        path = export_snapshot(db, output_dir, keep=keep)
+        snapshot = ColumnarSnapshot(path)
+        print(f"📦 Exported snapshot to {path}")
+        for table, meta in snapshot.manifest["tables"].items():
+            print(f"{table}: {meta['rows']} rows")
+    except Exception as e:
+        print(f"Error exporting snapshot: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=settings.COLUMNAR_DIR, help="snapshot directory")
+    parser.add_argument("--keep", type=int, default=3, help="number of snapshots to keep")
+    args = parser.parse_args()
+    export_columnar(args.output, args.keep)
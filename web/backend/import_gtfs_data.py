@@ -2,12 +2,11 @@ import zipfile
 import csv
 import os
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Base, Route, Stop, Bus
+from database import SessionLocal
+from models import Route, Stop, Bus
 import random
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Tables come from `alembic upgrade head`, run before importing
 
 def import_gtfs_data(gtfs_zip_path):
     """Import GTFS data from zip file into database (keeping existing data)"""
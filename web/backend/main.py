@@ -1,20 +1,60 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import asyncio
 import os
 from dotenv import load_dotenv
 
-from database import engine, Base
-from routers import auth, buses, routes, stops, bookings, payments, users, analytics, websocket
+from config import settings
+from database import SessionLocal, stick_to_primary_after_writes
+from routers import auth, buses, routes, stops, bookings, payments, users, analytics, system, websocket
+from services.location_store import live_locations, flush_live_locations, run_flush_loop
+from services.spatial_index import stop_index
+from services.eta import eta_engine
+from services.kpi_rollup import run_reconcile_loop
+from services import analytics_buckets, occupancy
+from services.location_history import location_history, run_history_loop
+from services.sketches import persist_sketches, run_persist_loop
+from services.analytics_jobs import job_runner
 
 load_dotenv()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    Base.metadata.create_all(bind=engine)
+    # Startup; the schema is created and upgraded with `alembic upgrade head`
+    db = SessionLocal()
+    try:
+        live_locations.load(db)
+        stop_index.load(db)
+        eta_engine.load(db)
+    finally:
+        db.close()
+    await websocket.fanout.start(websocket.on_fanout_locations, websocket.on_fanout_changes)
+    flush_task = asyncio.create_task(run_flush_loop(settings.LIVE_LOCATION_FLUSH_SECONDS))
+    keyframe_task = asyncio.create_task(websocket.stream.run_keyframes())
+    tick_task = asyncio.create_task(websocket.stream.run_ticks())
+    reconcile_task = asyncio.create_task(run_reconcile_loop(settings.KPI_RECONCILE_SECONDS))
+    bucket_task = asyncio.create_task(analytics_buckets.run_rebuild_loop(settings.ANALYTICS_BUCKET_REBUILD_SECONDS))
+    occupancy_task = asyncio.create_task(occupancy.run_rebuild_loop(settings.OCCUPANCY_REBUILD_SECONDS))
+    sketch_task = asyncio.create_task(run_persist_loop(settings.SKETCH_PERSIST_SECONDS))
+    history_task = asyncio.create_task(run_history_loop(
+        location_history, settings.LIVE_LOCATION_FLUSH_SECONDS, settings.HISTORY_COMPACT_SECONDS
+    ))
     yield
     # Shutdown
+    reconcile_task.cancel()
+    bucket_task.cancel()
+    occupancy_task.cancel()
+    sketch_task.cancel()
+    history_task.cancel()
+    tick_task.cancel()
+    keyframe_task.cancel()
+    flush_task.cancel()
+    job_runner.shutdown()
+    await websocket.fanout.stop()
+    flush_live_locations()
+    location_history.flush()
+    persist_sketches()
 
 app = FastAPI(
     title="Smart DTC Transit API",
@@ -32,8 +72,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursors and the read-your-writes deadline are returned in headers
+    expose_headers=["X-Next-Cursor", "Link", "X-Read-Primary-Until"],
 )
 
+# With read replicas, a client's reads go to the primary for a while after it writes
+app.middleware("http")(stick_to_primary_after_writes)
+
 # Include routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(users.router, prefix="/api/users", tags=["Users"])
@@ -43,6 +88,7 @@ app.include_router(stops.router, prefix="/api/stops", tags=["Stops"])
 app.include_router(bookings.router, prefix="/api/bookings", tags=["Bookings"])
 app.include_router(payments.router, prefix="/api/payments", tags=["Payments"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["Analytics"])
+app.include_router(system.router, prefix="/api/system", tags=["System"])
 app.include_router(websocket.router, prefix="/ws", tags=["WebSocket"])
 
 @app.get("/")
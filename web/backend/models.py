@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, Boolean, Date, DateTime, ForeignKey, Index, LargeBinary, Text, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -27,6 +27,8 @@ class TransactionType(str, enum.Enum):
 
 class User(Base):
     __tablename__ = "users"
+    # Keyset pagination by creation time
+    __table_args__ = (Index("ix_users_created_at_id", "created_at", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -35,7 +37,7 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     role = Column(SQLEnum(UserRole), default=UserRole.PASSENGER)
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     wallet = relationship("Wallet", back_populates="user", uselist=False)
@@ -101,7 +103,7 @@ class Route(Base):
     id = Column(Integer, primary_key=True, index=True)
     route_number = Column(String(50), unique=True, index=True, nullable=False)
     route_name = Column(String(255), nullable=False)
-    bus_id = Column(Integer, ForeignKey("buses.id"))
+    bus_id = Column(Integer, ForeignKey("buses.id"), index=True)
     start_location = Column(String(255), nullable=False)
     end_location = Column(String(255), nullable=False)
     distance_km = Column(Float)
@@ -112,11 +114,16 @@ class Route(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     bus = relationship("Bus", back_populates="route_assignments")
-    stops = relationship("Stop", back_populates="route")
+    stops = relationship("Stop", back_populates="route", order_by="Stop.stop_order")
     bookings = relationship("Booking", back_populates="route")
 
 class Stop(Base):
     __tablename__ = "stops"
+    # Stops of a route are always read in order; all stops are paginated by stop order
+    __table_args__ = (
+        Index("ix_stops_route_id_stop_order", "route_id", "stop_order"),
+        Index("ix_stops_stop_order_id", "stop_order", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     route_id = Column(Integer, ForeignKey("routes.id"), nullable=False)
@@ -131,9 +138,16 @@ class Stop(Base):
 
 class Booking(Base):
     __tablename__ = "bookings"
+    # A route's bookings in the states that hold a seat or count as passengers,
+    # and keyset pagination by creation and journey time
+    __table_args__ = (
+        Index("ix_bookings_route_id_status", "route_id", "status"),
+        Index("ix_bookings_created_at_id", "created_at", "id"),
+        Index("ix_bookings_journey_date_id", "journey_date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     route_id = Column(Integer, ForeignKey("routes.id"), nullable=False)
     booking_reference = Column(String(50), unique=True, index=True, nullable=False)
     passenger_name = Column(String(255), nullable=False)
@@ -142,7 +156,7 @@ class Booking(Base):
     journey_date = Column(DateTime(timezone=True), nullable=False)
     fare_amount = Column(Float, nullable=False)
     status = Column(SQLEnum(BookingStatus), default=BookingStatus.PENDING)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     user = relationship("User", back_populates="bookings")
@@ -151,14 +165,16 @@ class Booking(Base):
 
 class Payment(Base):
     __tablename__ = "payments"
+    # Keyset pagination by payment time
+    __table_args__ = (Index("ix_payments_payment_date_id", "payment_date", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     booking_id = Column(Integer, ForeignKey("bookings.id"), unique=True, nullable=False)
     payment_method = Column(String(50), nullable=False)
     transaction_id = Column(String(100), unique=True, index=True)
     amount = Column(Float, nullable=False)
-    status = Column(SQLEnum(PaymentStatus), default=PaymentStatus.PENDING)
-    payment_date = Column(DateTime(timezone=True), server_default=func.now())
+    status = Column(SQLEnum(PaymentStatus), default=PaymentStatus.PENDING, index=True)
+    payment_date = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     booking = relationship("Booking", back_populates="payment")
@@ -175,3 +191,62 @@ class LiveBusLocation(Base):
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     bus = relationship("Bus", back_populates="live_location")
+
+class KPIRollup(Base):
+    __tablename__ = "kpi_rollup"
+
+    # Each metric is spread over several rows summed on read, so concurrent
+    # writes rarely wait on the same row lock
+    name = Column(String(50), primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    value = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class RouteRevenueBucket(Base):
+    __tablename__ = "route_revenue_buckets"
+
+    granularity = Column(String(10), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    route_id = Column(Integer, ForeignKey("routes.id"), primary_key=True)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+class PassengerCategoryBucket(Base):
+    __tablename__ = "passenger_category_buckets"
+
+    granularity = Column(String(10), primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    category = Column(String(50), primary_key=True)
+    passengers = Column(Integer, nullable=False, default=0)
+
+class TripOccupancy(Base):
+    __tablename__ = "trip_occupancy"
+
+    route_id = Column(Integer, ForeignKey("routes.id"), primary_key=True)
+    journey_date = Column(Date, primary_key=True, index=True)
+    # Bus assigned to the route for this trip; kept after the bus is reassigned or deleted
+    bus_id = Column(Integer, index=True)
+    capacity = Column(Integer)
+    passengers = Column(Integer, nullable=False, default=0)
+
+class AnalyticsSketch(Base):
+    __tablename__ = "analytics_sketches"
+
+    kind = Column(String(20), primary_key=True)
+    sketch_key = Column(String(50), primary_key=True)
+    day = Column(Date, primary_key=True, index=True)
+    data = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class AnalyticsJob(Base):
+    __tablename__ = "analytics_jobs"
+
+    id = Column(String(36), primary_key=True)
+    job_type = Column(String(50), nullable=False)
+    params = Column(Text, nullable=False)
+    params_hash = Column(String(64), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="queued")
+    result = Column(Text)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
@@ -0,0 +1,155 @@
+"""
+Keyset (cursor) pagination for list endpoints
+
+A page is ordered by one sort column plus the primary key as a tie
+breaker, and the next page starts after the (sort value, id) of the last
+row instead of skipping rows, so every page costs one index range scan
+however deep the client pages. The response body stays a plain list;
+when there are more rows, the cursor of the next page is returned in the
+X-Next-Cursor header and as a Link: <...>; rel="next" URL.
+
+Cursors are opaque to clients (URL-safe base64 of JSON naming the sort
+and the last row's key). skip still works for old clients but is ignored
+when a cursor is given.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence
+
+from fastapi import HTTPException, Query, Request, Response, status
+from sqlalchemy import tuple_
+
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _to_json(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def encode_cursor(sort: str, key: Sequence) -> str:
+    payload = json.dumps({"sort": sort, "after": [_to_json(value) for value in key]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _invalid_cursor():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise _invalid_cursor()
+    if not isinstance(payload, dict) or not isinstance(payload.get("sort"), str) \
+            or not isinstance(payload.get("after"), list):
+        raise _invalid_cursor()
+    return payload
+
+class Pagination:
+    """
+    Dependency for a paginated list of model rows. sorts names the columns
+    clients may sort by (each also descending with a leading "-"); they
+    must not be nullable and should be indexed together with the primary key.
+    """
+
+    def __init__(self, model, sorts: Sequence[str], default: str = "id"):
+        self.model = model
+        self.id_column = model.id
+        self.columns: Dict[str, object] = {name: getattr(model, name) for name in sorts}
+        self.default = default
+
+    def __call__(
+        self,
+        request: Request,
+        response: Response,
+        cursor: Optional[str] = Query(None, description="Cursor of the page, from X-Next-Cursor"),
+        sort: Optional[str] = Query(None, description="Sort column, descending with a leading -"),
+        skip: int = Query(0, ge=0, description="Deprecated: use cursor"),
+        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE)
+    ) -> "Page":
+        return Page(self, sort, cursor, skip, limit, request, response)
+
+class Page:
+    """One requested page: applies the order and start to a query and publishes the next cursor"""
+
+    def __init__(self, pagination: Pagination, sort: Optional[str] = None, cursor: Optional[str] = None,
+                 skip: int = 0, limit: int = 100, request: Optional[Request] = None,
+                 response: Optional[Response] = None):
+        self.pagination = pagination
+        self.skip = skip
+        self.limit = limit
+        self.request = request
+        self.response = response
+        self.after = None
+        if cursor is not None:
+            payload = decode_cursor(cursor)
+            if sort is not None and sort != payload["sort"]:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                    detail="Cursor was issued for a different sort")
+            sort = payload["sort"]
+        self.sort = sort or pagination.default
+        self.name = self.sort.lstrip("-")
+        self.descending = self.sort.startswith("-")
+        if self.name not in pagination.columns:
+            allowed = ", ".join(sorted(pagination.columns))
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail=f"Unsupported sort '{self.sort}'; use one of: {allowed}")
+        if cursor is not None:
+            self.after = self._parse_key(payload["after"])
+
+    def _key_columns(self) -> List:
+        column = self.pagination.columns[self.name]
+        if column is self.pagination.id_column:
+            return [column]
+        return [column, self.pagination.id_column]
+
+    def _parse_key(self, values: list) -> List:
+        columns = self._key_columns()
+        if len(values) != len(columns):
+            raise _invalid_cursor()
+        key = []
+        for column, value in zip(columns, values):
+            python_type = column.type.python_type
+            try:
+                if python_type in (datetime, date) and isinstance(value, str):
+                    value = python_type.fromisoformat(value)
+                elif python_type is float and isinstance(value, int):
+                    value = float(value)
+            except ValueError:
+                raise _invalid_cursor()
+            if not isinstance(value, python_type) or isinstance(value, bool):
+                raise _invalid_cursor()
+            key.append(value)
+        return key
+
+    def apply(self, query):
+        """Order a Query or Select by the page's key and start it after the cursor"""
+        columns = self._key_columns()
+        if self.after is not None:
+            key = tuple_(*columns) if len(columns) > 1 else columns[0]
+            after = tuple_(*self.after) if len(columns) > 1 else self.after[0]
+            query = query.filter(key < after if self.descending else key > after)
+        order = [column.desc() for column in columns] if self.descending else columns
+        query = query.order_by(*order)
+        if self.after is None and self.skip:
+            query = query.offset(self.skip)
+        # One extra row tells whether there is a next page
+        return query.limit(self.limit + 1)
+
+    def finish(self, rows: Sequence) -> List:
+        """The rows of this page; sets the next page's cursor on the response when there is one"""
+        rows = list(rows)
+        if len(rows) > self.limit:
+            rows = rows[:self.limit]
+            last = rows[-1]
+            self.next_cursor = encode_cursor(
+                self.sort, [getattr(last, column.key) for column in self._key_columns()]
+            )
+            if self.response is not None:
+                self.response.headers[NEXT_CURSOR_HEADER] = self.next_cursor
+                if self.request is not None:
+                    url = self.request.url.remove_query_params("skip").include_query_params(cursor=self.next_cursor)
+                    self.response.headers["Link"] = f'<{url}>; rel="next"'
+        else:
+            self.next_cursor = None
+        return rows
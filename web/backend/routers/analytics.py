@@ -1,64 +1,230 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from typing import Any, Dict, List, Optional
+from datetime import date, datetime, timedelta, timezone
+import json
+import math
 
-from database import get_db
-from models import Bus, Booking, Payment, PaymentStatus, BookingStatus
-from schemas import KPIResponse, RouteRevenueResponse, PassengerCategoryResponse
+from database import get_async_db, get_db, get_read_db
+from models import Route
+from schemas import (
+    KPIResponse, RouteRevenueResponse, PassengerCategoryResponse,
+    RouteRevenueBucketResponse, PassengerCategoryBucketResponse,
+    ApproxDistinctPassengersResponse, ApproxTopRouteResponse,
+    TripOccupancyResponse, OccupancySummaryResponse,
+    AnalyticsJobCreate, AnalyticsJobResponse
+)
 from auth_utils import get_current_active_user
+from services import analytics_buckets, kpi_rollup, occupancy
+from services.analytics_jobs import job_runner, JobQueueFull, QUEUED, RUNNING
+from services.sketches import booking_sketches, CMS_EPSILON, HLL_STANDARD_ERROR, TOP_K_CAPACITY
 
 router = APIRouter()
 
-@router.get("/kpis", response_model=KPIResponse)
-def get_kpis(db: Session = Depends(get_db)):
-    # Active buses
-    active_buses = db.query(Bus).filter(Bus.is_active == True).count()
-    
-    # Total revenue
-    total_revenue = db.query(func.sum(Payment.amount)).filter(
-        Payment.status == PaymentStatus.SUCCESS
-    ).scalar() or 0.0
-    
-    # Passenger count
-    passenger_count = db.query(Booking).filter(
-        Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.COMPLETED])
-    ).count()
+def compute_kpis(db: Session):
+    # Active buses, revenue and passengers are kept up to date by the write paths
+    kpis = kpi_rollup.read(db)
     
     # On-time performance (mock calculation)
-    on_time_performance = 87.5
+    kpis["on_time_performance"] = 87.5
     
-    return {
-        "active_buses": active_buses,
-        "total_revenue": total_revenue,
-        "passenger_count": passenger_count,
-        "on_time_performance": on_time_performance
-    }
+    return kpis
+
+@router.get("/kpis", response_model=KPIResponse)
+async def get_kpis(db: AsyncSession = Depends(get_async_db)):
+    # The rollup is read (and reconciled when empty) on the async connection
+    return await db.run_sync(compute_kpis)
+
+# Default window of the time series endpoints
+DEFAULT_SERIES_DAYS = 90
+# Hourly series are limited to keep responses small
+MAX_HOURLY_SERIES_DAYS = 31
+
+def _check_range(start: Optional[datetime], end: Optional[datetime]):
+    if start is not None and end is not None and end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+
+def _series_range(start: Optional[datetime], end: Optional[datetime], bucket: str):
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=DEFAULT_SERIES_DAYS)
+    _check_range(start, end)
+    if bucket == "hour" and end - start > timedelta(days=MAX_HOURLY_SERIES_DAYS):
+        raise HTTPException(status_code=400, detail=f"Hourly series are limited to {MAX_HOURLY_SERIES_DAYS} days")
+    return start, end
 
 @router.get("/route-revenue", response_model=List[RouteRevenueResponse])
-def get_route_revenue(db: Session = Depends(get_db)):
-    from models import Route
-    
-    results = db.query(
-        Route.route_name,
-        func.sum(Payment.amount).label("revenue")
-    ).join(
-        Booking, Booking.route_id == Route.id
-    ).join(
-        Payment, Payment.booking_id == Booking.id
-    ).filter(
-        Payment.status == PaymentStatus.SUCCESS
-    ).group_by(Route.route_name).all()
-    
-    return [{"route_name": r[0], "revenue": r[1] or 0.0} for r in results]
+def get_route_revenue(
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Revenue per route, all time or between from and to"""
+    _check_range(from_, to)
+    return analytics_buckets.route_revenue(db, from_, to)
+
+@router.get("/route-revenue/timeseries", response_model=List[RouteRevenueBucketResponse])
+def get_route_revenue_timeseries(
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    route_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Revenue per route per bucket (defaults to the last 90 days)"""
+    start, end = _series_range(from_, to, bucket)
+    return analytics_buckets.revenue_series(db, bucket, start, end, route_id)
 
 @router.get("/passenger-categories", response_model=List[PassengerCategoryResponse])
-def get_passenger_categories(db: Session = Depends(get_db)):
-    results = db.query(
-        Booking.passenger_category,
-        func.count(Booking.id).label("count")
-    ).filter(
-        Booking.status.in_([BookingStatus.CONFIRMED, BookingStatus.COMPLETED])
-    ).group_by(Booking.passenger_category).all()
-    
-    return [{"category": r[0], "count": r[1]} for r in results]
+def get_passenger_categories(
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Passengers per category by journey date, all time or between from and to"""
+    _check_range(from_, to)
+    return analytics_buckets.passenger_categories(db, from_, to)
+
+@router.get("/passenger-categories/timeseries", response_model=List[PassengerCategoryBucketResponse])
+def get_passenger_categories_timeseries(
+    from_: Optional[datetime] = Query(None, alias="from"),
+    to: Optional[datetime] = None,
+    bucket: str = Query("day", pattern="^(hour|day|week)$"),
+    category: Optional[str] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Passengers per category per bucket (defaults to the last 90 days)"""
+    start, end = _series_range(from_, to, bucket)
+    return analytics_buckets.passenger_series(db, bucket, start, end, category)
+
+@router.get("/approx/distinct-passengers", response_model=List[ApproxDistinctPassengersResponse])
+def get_approx_distinct_passengers(
+    day: Optional[date] = None,
+    route_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Estimated distinct passengers per route for a journey day (defaults to today, UTC)"""
+    day = day or datetime.now(timezone.utc).date()
+    if route_id is not None:
+        estimates = {route_id: booking_sketches.distinct_passengers(db, day, route_id)}
+    else:
+        estimates = booking_sketches.distinct_passengers_by_route(db, day)
+    return [
+        {"route_id": rid, "day": day, "estimate": estimate, "standard_error": HLL_STANDARD_ERROR}
+        for rid, estimate in sorted(estimates.items())
+    ]
+
+@router.get("/approx/top-routes", response_model=List[ApproxTopRouteResponse])
+def get_approx_top_routes(
+    day: Optional[date] = None,
+    k: int = Query(10, ge=1, le=TOP_K_CAPACITY),
+    db: Session = Depends(get_read_db)
+):
+    """Estimated busiest routes by bookings for a journey day (defaults to today, UTC)"""
+    day = day or datetime.now(timezone.utc).date()
+    top, total = booking_sketches.top_routes(db, day, k)
+    names = dict(db.query(Route.id, Route.route_name).filter(Route.id.in_([rid for rid, _ in top])).all())
+    max_overcount = math.ceil(CMS_EPSILON * total)
+    return [
+        {"route_id": rid, "route_name": names.get(rid), "estimated_bookings": count, "max_overcount": max_overcount}
+        for rid, count in top
+    ]
+
+# Default window of the occupancy endpoints, starting today
+DEFAULT_OCCUPANCY_DAYS = 7
+MAX_OCCUPANCY_DAYS = 366
+
+def _occupancy_range(start: Optional[date], end: Optional[date]):
+    start = start or datetime.now(timezone.utc).date()
+    end = end or start + timedelta(days=DEFAULT_OCCUPANCY_DAYS - 1)
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (end - start).days >= MAX_OCCUPANCY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Occupancy ranges are limited to {MAX_OCCUPANCY_DAYS} days")
+    return start, end
+
+@router.get("/occupancy/trips", response_model=List[TripOccupancyResponse])
+def get_trip_occupancy(
+    from_: Optional[date] = Query(None, alias="from"),
+    to: Optional[date] = None,
+    sort: str = Query("overcrowded", pattern="^(overcrowded|underused)$"),
+    limit: int = Query(20, ge=1, le=500),
+    route_id: Optional[int] = None,
+    bus_id: Optional[int] = None,
+    db: Session = Depends(get_read_db)
+):
+    """Most overcrowded or most underused trips between from and to (defaults to the next 7 days)"""
+    start, end = _occupancy_range(from_, to)
+    return occupancy.trips(db, start, end, sort, limit, route_id, bus_id)
+
+@router.get("/occupancy/summary", response_model=List[OccupancySummaryResponse])
+def get_occupancy_summary(
+    from_: Optional[date] = Query(None, alias="from"),
+    to: Optional[date] = None,
+    group_by: str = Query("route", pattern="^(route|bus|day)$"),
+    db: Session = Depends(get_read_db)
+):
+    """Load factor per route, bus or journey date between from and to (defaults to the next 7 days)"""
+    start, end = _occupancy_range(from_, to)
+    return occupancy.summary(db, start, end, group_by)
+
+# Job type -> (endpoint computing it, AnalyticsJobCreate fields it takes)
+JOB_TYPES: Dict[str, tuple] = {
+    "kpis": (compute_kpis, ()),
+    "route-revenue": (get_route_revenue, ("from_", "to")),
+    "route-revenue/timeseries": (get_route_revenue_timeseries, ("from_", "to", "bucket", "route_id")),
+    "passenger-categories": (get_passenger_categories, ("from_", "to")),
+    "passenger-categories/timeseries": (get_passenger_categories_timeseries, ("from_", "to", "bucket", "category")),
+}
+
+def _job_response(job, response: Response) -> Dict[str, Any]:
+    if job.status in (QUEUED, RUNNING):
+        response.headers["Cache-Control"] = "no-store"
+        response.headers["Retry-After"] = "1"
+    else:
+        # Finished jobs never change
+        response.headers["Cache-Control"] = f"private, max-age={int(job_runner.cache_seconds)}"
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status,
+        "params": json.loads(job.params),
+        "result": json.loads(job.result) if job.result is not None else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+@router.post("/jobs", response_model=AnalyticsJobResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_analytics_job(job: AnalyticsJobCreate, response: Response, db: Session = Depends(get_db)):
+    """Compute one of the analytics endpoints in the background; poll GET /jobs/{id} for the result"""
+    if job.job_type not in JOB_TYPES:
+        raise HTTPException(status_code=400, detail=f"job_type must be one of: {', '.join(JOB_TYPES)}")
+    endpoint, fields = JOB_TYPES[job.job_type]
+    params = {field: getattr(job, field) for field in fields}
+    # Reject bad ranges now rather than in a failed job
+    if "bucket" in params:
+        _series_range(job.from_, job.to, job.bucket)
+    elif "from_" in params:
+        _check_range(job.from_, job.to)
+
+    def run(job_db: Session) -> Any:
+        return endpoint(db=job_db, **params)
+
+    stored_params = {field.rstrip("_"): value for field, value in params.items() if value is not None}
+    try:
+        queued = job_runner.submit(db, job.job_type, stored_params, run)
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many analytics jobs queued, try again later")
+    # Relative to this endpoint's URL
+    response.headers["Location"] = f"jobs/{queued.id}"
+    return _job_response(queued, response)
+
+@router.get("/jobs/{job_id}", response_model=AnalyticsJobResponse)
+def get_analytics_job(job_id: str, response: Response, db: Session = Depends(get_db)):
+    """Status of an analytics job, with its result once it succeeded"""
+    job = job_runner.get(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job, response)
@@ -3,13 +3,18 @@ from sqlalchemy.orm import Session
 from typing import List
 import uuid
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Booking, Route, User
 from schemas import BookingCreate, BookingUpdate, BookingResponse
 from auth_utils import get_current_active_user
+from pagination import Page, Pagination
+from services import analytics_events
+from services.sketches import booking_sketches
 
 router = APIRouter()
 
+booking_pages = Pagination(Booking, sorts=("id", "created_at", "journey_date"))
+
 @router.post("/", response_model=BookingResponse, status_code=status.HTTP_201_CREATED)
 def create_booking(
     booking: BookingCreate,
@@ -31,30 +36,31 @@ def create_booking(
         **booking.dict()
     )
     db.add(db_booking)
+    analytics_events.booking_status_changed(db, db_booking, None)
     db.commit()
     db.refresh(db_booking)
+    booking_sketches.record(db, db_booking)
     return db_booking
 
 @router.get("/", response_model=List[BookingResponse])
 def get_bookings(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    page: Page = Depends(booking_pages),
+    db: Session = Depends(get_read_db)
 ):
     """Get all bookings - public endpoint for admin dashboard"""
-    bookings = db.query(Booking).offset(skip).limit(limit).all()
-    return bookings
+    bookings = page.apply(db.query(Booking)).all()
+    return page.finish(bookings)
 
 @router.get("/my-bookings", response_model=List[BookingResponse])
 def get_my_bookings(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
     bookings = db.query(Booking).filter(Booking.user_id == current_user.id).all()
     return bookings
 
 @router.get("/{booking_id}", response_model=BookingResponse)
-def get_booking(booking_id: int, db: Session = Depends(get_db)):
+def get_booking(booking_id: int, db: Session = Depends(get_read_db)):
     booking = db.query(Booking).filter(Booking.id == booking_id).first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
@@ -71,8 +77,10 @@ def update_booking(
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
+    previous_status = booking.status
     for key, value in booking_update.dict(exclude_unset=True).items():
         setattr(booking, key, value)
+    analytics_events.booking_status_changed(db, booking, previous_status)
     
     db.commit()
     db.refresh(booking)
@@ -1,14 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
+from datetime import datetime
 
-from database import get_db
-from models import Bus, User, LiveBusLocation
-from schemas import BusCreate, BusUpdate, BusResponse
+from database import get_async_read_db, get_db, get_read_db
+from models import Bus, User
+from schemas import (
+    BusCreate, BusUpdate, BusResponse, LiveLocationBatch, LiveLocationBatchResponse, LocationHistoryPoint
+)
 from auth_utils import get_current_active_user
+from pagination import Page, Pagination
+from services import analytics_events
+from services.location_store import live_locations
+from services.location_history import location_history, RESOLUTIONS
+from services.spatial_index import MAX_NEARBY_RADIUS_M
+from routers.websocket import fanout
 
 router = APIRouter()
 
+bus_pages = Pagination(Bus, sorts=("id", "bus_number"))
+
 @router.post("/", response_model=BusResponse, status_code=status.HTTP_201_CREATED)
 def create_bus(
     bus: BusCreate,
@@ -17,57 +31,78 @@ def create_bus(
 ):
     db_bus = Bus(**bus.dict())
     db.add(db_bus)
+    db.flush()
+    analytics_events.bus_saved(db, False, db_bus.is_active)
     db.commit()
     db.refresh(db_bus)
+    live_locations.register_bus(db_bus)
+    fanout.publish_changes([("bus", db_bus.id)])
     return db_bus
 
 @router.get("/", response_model=List[BusResponse])
-def get_buses(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+async def get_buses(
+    page: Page = Depends(bus_pages),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    result = await db.execute(page.apply(select(Bus)))
+    return page.finish(result.scalars().all())
+
+@router.post("/locations:batch", response_model=LiveLocationBatchResponse)
+async def ingest_location_batch(
+    batch: LiveLocationBatch,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
 ):
-    buses = db.query(Bus).offset(skip).limit(limit).all()
-    return buses
+    """Apply GPS fixes to the live store; fixes older than the held position are rejected"""
+    accepted, stale, unknown = await run_in_threadpool(live_locations.ingest, db, batch.fixes)
+    rows = live_locations.fix_rows(accepted)
+    location_history.record(rows)
+    # Other workers apply the accepted positions to their stores and stream them to clients
+    await fanout.publish(rows)
+    return {
+        "received": len(batch.fixes),
+        "accepted": len(accepted),
+        "stale": len(stale),
+        "unknown_bus_ids": unknown
+    }
 
 @router.get("/live-locations", response_model=List[dict])
-def get_live_bus_locations(db: Session = Depends(get_db)):
-    """Get all buses with their live GPS locations"""
-    locations = db.query(
-        Bus.id,
-        Bus.bus_number,
-        Bus.registration_number,
-        Bus.bus_type,
-        Bus.is_active,
-        LiveBusLocation.latitude,
-        LiveBusLocation.longitude,
-        LiveBusLocation.speed,
-        LiveBusLocation.heading,
-        LiveBusLocation.last_updated
-    ).join(
-        LiveBusLocation, Bus.id == LiveBusLocation.bus_id
-    ).filter(
-        Bus.is_active == True
-    ).all()
-    
-    return [
-        {
-            "id": loc.id,
-            "bus_number": loc.bus_number,
-            "registration_number": loc.registration_number,
-            "bus_type": loc.bus_type,
-            "is_active": loc.is_active,
-            "latitude": loc.latitude,
-            "longitude": loc.longitude,
-            "speed": loc.speed,
-            "heading": loc.heading,
-            "last_updated": loc.last_updated
-        }
-        for loc in locations
-    ]
+async def get_live_bus_locations():
+    """Get all buses with their live GPS locations (served from the in-memory store)"""
+    return live_locations.snapshot()
+
+@router.get("/nearby", response_model=List[dict])
+def get_nearby_buses(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=MAX_NEARBY_RADIUS_M),
+    limit: int = Query(20, ge=1, le=100)
+):
+    """Active buses within radius_m of a point, nearest first"""
+    return live_locations.nearby(lat, lon, radius_m, limit)
+
+# Longest time range a single history request may span, per resolution
+MAX_HISTORY_DAYS = {"raw": 1, "1m": 31, "10m": 366}
+
+@router.get("/{bus_id}/history", response_model=List[LocationHistoryPoint])
+def get_bus_location_history(
+    bus_id: int,
+    start: datetime,
+    end: datetime,
+    resolution: str = Query("raw", pattern="^(" + "|".join(RESOLUTIONS) + ")$")
+):
+    """Recorded positions of a bus between start and end, oldest first"""
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    if (end - start).total_seconds() > MAX_HISTORY_DAYS[resolution] * 86400:
+        raise HTTPException(
+            status_code=400,
+            detail=f"{resolution} history is limited to {MAX_HISTORY_DAYS[resolution]} days per request"
+        )
+    return location_history.query(bus_id, start, end, resolution)
 
 @router.get("/{bus_id}", response_model=BusResponse)
-def get_bus(bus_id: int, db: Session = Depends(get_db)):
+def get_bus(bus_id: int, db: Session = Depends(get_read_db)):
     bus = db.query(Bus).filter(Bus.id == bus_id).first()
     if not bus:
         raise HTTPException(status_code=404, detail="Bus not found")
@@ -84,11 +119,18 @@ def update_bus(
     if not bus:
         raise HTTPException(status_code=404, detail="Bus not found")
     
+    was_active = bus.is_active
+    previous_capacity = bus.capacity
     for key, value in bus_update.dict(exclude_unset=True).items():
         setattr(bus, key, value)
+    analytics_events.bus_saved(db, was_active, bus.is_active)
+    if bus.capacity != previous_capacity:
+        analytics_events.bus_capacity_changed(db, bus.id, bus.capacity)
     
     db.commit()
     db.refresh(bus)
+    live_locations.register_bus(bus)
+    fanout.publish_changes([("bus", bus.id)])
     return bus
 
 @router.delete("/{bus_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -102,5 +144,8 @@ def delete_bus(
         raise HTTPException(status_code=404, detail="Bus not found")
     
     db.delete(bus)
+    analytics_events.bus_saved(db, bus.is_active, False)
     db.commit()
+    live_locations.remove_bus(bus_id)
+    fanout.publish_changes([("bus", bus_id)])
     return None
@@ -3,13 +3,17 @@ from sqlalchemy.orm import Session
 from typing import List
 import uuid
 
-from database import get_db
+from database import get_db, get_read_db
 from models import Payment, Booking, User, BookingStatus, PaymentStatus
 from schemas import PaymentCreate, PaymentResponse
 from auth_utils import get_current_active_user
+from pagination import Page, Pagination
+from services import analytics_events
 
 router = APIRouter()
 
+payment_pages = Pagination(Payment, sorts=("id", "payment_date"))
+
 @router.post("/", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
 def create_payment(
     payment: PaymentCreate,
@@ -39,7 +43,10 @@ def create_payment(
     db.add(db_payment)
     
     # Update booking status
+    previous_status = booking.status
     booking.status = BookingStatus.CONFIRMED
+    analytics_events.payment_succeeded(db, db_payment, booking)
+    analytics_events.booking_status_changed(db, booking, previous_status)
     
     db.commit()
     db.refresh(db_payment)
@@ -47,16 +54,15 @@ def create_payment(
 
 @router.get("/", response_model=List[PaymentResponse])
 def get_payments(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    page: Page = Depends(payment_pages),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    payments = db.query(Payment).offset(skip).limit(limit).all()
-    return payments
+    payments = page.apply(db.query(Payment)).all()
+    return page.finish(payments)
 
 @router.get("/{payment_id}", response_model=PaymentResponse)
-def get_payment(payment_id: int, db: Session = Depends(get_db)):
+def get_payment(payment_id: int, db: Session = Depends(get_read_db)):
     payment = db.query(Payment).filter(Payment.id == payment_id).first()
     if not payment:
         raise HTTPException(status_code=404, detail="Payment not found")
@@ -1,14 +1,44 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import List
 
-from database import get_db
-from models import Route, User
-from schemas import RouteCreate, RouteUpdate, RouteResponse
+from database import get_async_read_db, get_db
+from models import Bus, Route, User
+from schemas import BusPosition, RouteCreate, RouteDetailResponse, RouteUpdate, RouteResponse
 from auth_utils import get_current_active_user
+from pagination import Page, Pagination
+from services import analytics_events
+from services.eta import eta_engine
+from services.location_store import live_locations
+from routers.websocket import fanout
 
 router = APIRouter()
 
+route_pages = Pagination(Route, sorts=("id", "route_number"))
+
+def _detail_query():
+    """
+    Routes with their bus, its stored position and their ordered stops in
+    two statements however many routes are loaded: routes joined to buses
+    and positions, then the stops of all of them at once.
+    """
+    return select(Route).options(
+        joinedload(Route.bus).joinedload(Bus.live_location),
+        selectinload(Route.stops),
+    )
+
+def _route_detail(route: Route) -> RouteDetailResponse:
+    detail = RouteDetailResponse.model_validate(route)
+    # The live store is loaded from the stored positions and flushed to
+    # them, so when it has the bus its position is never the older one
+    if detail.bus is not None:
+        position = live_locations.get(detail.bus.id)
+        if position is not None:
+            detail.bus.live_location = BusPosition.model_validate(position)
+    return detail
+
 @router.post("/", response_model=RouteResponse, status_code=status.HTTP_201_CREATED)
 def create_route(
     route: RouteCreate,
@@ -19,26 +49,49 @@ def create_route(
     db.add(db_route)
     db.commit()
     db.refresh(db_route)
+    live_locations.assign_route(db_route.id, db_route.bus_id)
+    fanout.publish_changes([("route", db_route.id)])
     return db_route
 
 @router.get("/", response_model=List[RouteResponse])
-def get_routes(
-    skip: int = 0,
-    limit: int = 100,
+async def get_routes(
     bus_id: int = None,
-    db: Session = Depends(get_db)
+    page: Page = Depends(route_pages),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    query = db.query(Route)
+    query = select(Route)
     
     if bus_id is not None:
-        query = query.filter(Route.bus_id == bus_id)
+        query = query.where(Route.bus_id == bus_id)
     
-    routes = query.offset(skip).limit(limit).all()
-    return routes
+    result = await db.execute(page.apply(query))
+    return page.finish(result.scalars().all())
+
+@router.get("/full", response_model=List[RouteDetailResponse])
+async def get_route_details(
+    bus_id: int = None,
+    page: Page = Depends(route_pages),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    query = _detail_query()
+    
+    if bus_id is not None:
+        query = query.where(Route.bus_id == bus_id)
+    
+    result = await db.execute(page.apply(query))
+    return [_route_detail(route) for route in page.finish(result.scalars().all())]
+
+@router.get("/{route_id}/full", response_model=RouteDetailResponse)
+async def get_route_detail(route_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    result = await db.execute(_detail_query().where(Route.id == route_id))
+    route = result.scalars().first()
+    if not route:
+        raise HTTPException(status_code=404, detail="Route not found")
+    return _route_detail(route)
 
 @router.get("/{route_id}", response_model=RouteResponse)
-def get_route(route_id: int, db: Session = Depends(get_db)):
-    route = db.query(Route).filter(Route.id == route_id).first()
+async def get_route(route_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    route = await db.get(Route, route_id)
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
     return route
@@ -54,11 +107,17 @@ def update_route(
     if not route:
         raise HTTPException(status_code=404, detail="Route not found")
     
+    previous_bus_id = route.bus_id
     for key, value in route_update.dict(exclude_unset=True).items():
         setattr(route, key, value)
+    if route.bus_id != previous_bus_id:
+        analytics_events.route_reassigned(db, route.id, route.bus_id)
     
     db.commit()
     db.refresh(route)
+    live_locations.assign_route(route.id, route.bus_id)
+    eta_engine.rebuild_route(db, route.id)
+    fanout.publish_changes([("route", route.id)])
     return route
 
 @router.delete("/{route_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -73,4 +132,7 @@ def delete_route(
     
     db.delete(route)
     db.commit()
+    live_locations.assign_route(route_id, None)
+    eta_engine.rebuild_route(db, route_id)
+    fanout.publish_changes([("route", route_id)])
     return None
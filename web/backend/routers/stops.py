@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import get_async_read_db, get_db, get_read_db
 from models import Stop, User
-from schemas import StopCreate, StopResponse
+from schemas import StopCreate, StopResponse, NearbyStopResponse, StopArrival
 from auth_utils import get_current_active_user
+from pagination import Page, Pagination
+from services.eta import eta_engine
+from services.spatial_index import MAX_NEARBY_RADIUS_M, stop_index
+from routers.websocket import fanout
 
 router = APIRouter()
 
+stop_pages = Pagination(Stop, sorts=("stop_order", "id"), default="stop_order")
+
 @router.post("/", response_model=StopResponse, status_code=status.HTTP_201_CREATED)
 def create_stop(
     stop: StopCreate,
@@ -19,30 +27,47 @@ def create_stop(
     db.add(db_stop)
     db.commit()
     db.refresh(db_stop)
+    stop_index.upsert(db_stop)
+    eta_engine.rebuild_route(db, db_stop.route_id)
+    fanout.publish_changes([("stop", db_stop.id), ("route", db_stop.route_id)])
     return db_stop
 
 @router.get("/", response_model=List[StopResponse])
-def get_stops(
+async def get_stops(
     route_id: int = None,
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    page: Page = Depends(stop_pages),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    query = db.query(Stop)
+    query = select(Stop)
     
     if route_id is not None:
-        query = query.filter(Stop.route_id == route_id)
+        query = query.where(Stop.route_id == route_id)
     
-    stops = query.order_by(Stop.stop_order).offset(skip).limit(limit).all()
-    return stops
+    result = await db.execute(page.apply(query))
+    return page.finish(result.scalars().all())
 
 @router.get("/route/{route_id}", response_model=List[StopResponse])
-def get_stops_by_route(route_id: int, db: Session = Depends(get_db)):
-    stops = db.query(Stop).filter(Stop.route_id == route_id).order_by(Stop.stop_order).all()
-    return stops
+async def get_stops_by_route(route_id: int, db: AsyncSession = Depends(get_async_read_db)):
+    result = await db.execute(select(Stop).where(Stop.route_id == route_id).order_by(Stop.stop_order))
+    return result.scalars().all()
+
+@router.get("/nearby", response_model=List[NearbyStopResponse])
+def get_nearby_stops(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(500, gt=0, le=MAX_NEARBY_RADIUS_M),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Stops within radius_m of a point, nearest first"""
+    return stop_index.nearby(lat, lon, radius_m, limit)
+
+@router.get("/{stop_id}/arrivals", response_model=List[StopArrival])
+def get_stop_arrivals(stop_id: int):
+    """Predicted arrivals of buses at a stop, soonest first (recomputed every live tracking tick)"""
+    return eta_engine.arrivals(stop_id)
 
 @router.get("/{stop_id}", response_model=StopResponse)
-def get_stop(stop_id: int, db: Session = Depends(get_db)):
+def get_stop(stop_id: int, db: Session = Depends(get_read_db)):
     stop = db.query(Stop).filter(Stop.id == stop_id).first()
     if not stop:
         raise HTTPException(status_code=404, detail="Stop not found")
@@ -58,6 +83,10 @@ def delete_stop(
     if not stop:
         raise HTTPException(status_code=404, detail="Stop not found")
     
+    route_id = stop.route_id
     db.delete(stop)
     db.commit()
+    stop_index.remove(stop_id)
+    eta_engine.rebuild_route(db, route_id)
+    fanout.publish_changes([("stop", stop_id), ("route", route_id)])
     return None
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Depends, Query
+from anyio import to_thread
+
+from database import async_engine, engine, pool_stats
+from models import User
+from schemas import DBPoolStatusResponse
+from auth_utils import get_current_active_user
+
+router = APIRouter()
+
+@router.get("/db-pool", response_model=DBPoolStatusResponse)
+async def get_db_pool_status(
+    pool: str = Query("sync", pattern="^(sync|async)$"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Connection pool usage of this worker, next to the size of the threadpool
+    running sync endpoints. Waits count checkouts that found every connection
+    in use; a growing count means the pool is smaller than the concurrency
+    the threadpool allows. pool=async reports the pool of the async engine.
+    """
+    stats = pool_stats(async_engine if pool == "async" else engine)
+    stats["threadpool_size"] = int(to_thread.current_default_thread_limiter().total_tokens)
+    return stats
@@ -2,30 +2,32 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 
-from database import get_db
+from database import get_read_db
 from models import User
 from schemas import UserResponse
 from auth_utils import get_current_active_user
+from pagination import Page, Pagination
 
 router = APIRouter()
 
+user_pages = Pagination(User, sorts=("id", "created_at"))
+
 @router.get("/me", response_model=UserResponse)
 def get_current_user_info(current_user: User = Depends(get_current_active_user)):
     return current_user
 
 @router.get("/", response_model=List[UserResponse])
 def get_all_users(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    page: Page = Depends(user_pages),
+    db: Session = Depends(get_read_db)
 ):
-    users = db.query(User).offset(skip).limit(limit).all()
-    return users
+    users = page.apply(db.query(User)).all()
+    return page.finish(users)
 
 @router.get("/{user_id}", response_model=UserResponse)
 def get_user(
     user_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
@@ -1,54 +1,311 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union
+import asyncio
 import json
+import logging
 
-from database import get_db
-from models import LiveBusLocation
+from config import settings
+from database import SessionLocal
+from models import Bus, Route, Stop
+from services.eta import eta_engine
+from services.map_matching import map_matcher
+from services.fanout import Change, create_fanout_backend
+from services.live_frames import LiveTrackingStream, location_entry
+from services.location_codec import BINARY_SUBPROTOCOL, choose_subprotocol, encode_frame
+from services.location_store import live_locations
+from services.spatial_index import stop_index
+from services.subscriptions import SubscriptionIndex, TOPIC_FIELDS, parse_topic
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Close code sent to consumers evicted by the "disconnect" policy (RFC 6455 "Try Again Later")
+WS_CLOSE_TRY_AGAIN_LATER = 1013
+
+class ClientConnection:
+    """A connected socket with a bounded outgoing queue drained by its own task"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int, binary: bool = False):
+        self.websocket = websocket
+        # Location frames use the packed binary codec instead of JSON text
+        self.binary = binary
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.sender: Optional[asyncio.Task] = None
+        self.dropped = 0
+        # Set when a frame was dropped; the next delta is replaced by a keyframe
+        self.needs_keyframe = False
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Fans messages out to connected sockets without awaiting any of them.
+
+    broadcast() only enqueues; each connection has a sender task that
+    writes its queue to the socket. When a queue is full the consumer is
+    too slow and the policy decides what happens: "drop_oldest" discards
+    the oldest pending message to make room and resynchronises the client
+    with a keyframe instead of its next delta, "disconnect" closes the
+    socket. Sockets whose send fails or times out are removed.
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+    Clients may narrow what they receive by subscribing to a route, a bus
+    or a bounding box; a client with no subscriptions receives every
+    location update. Clients that negotiate the binary subprotocol get
+    location frames packed by services.location_codec; acknowledgements
+    and errors stay JSON text.
+    """
+
+    def __init__(
+        self,
+        queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+        send_timeout: float = settings.WS_SEND_TIMEOUT_SECONDS,
+        slow_consumer_policy: str = settings.WS_SLOW_CONSUMER_POLICY,
+        snapshot: Callable[[], List[dict]] = lambda: [],
+        route_ids: Callable[[int], Iterable[int]] = lambda bus_id: ()
+    ):
+        if slow_consumer_policy not in ("drop_oldest", "disconnect"):
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.slow_consumer_policy = slow_consumer_policy
+        self.snapshot = snapshot
+        self.route_ids = route_ids
+        self.active_connections: Dict[WebSocket, ClientConnection] = {}
+        self.subscriptions = SubscriptionIndex()
+        self._unfiltered: Set[ClientConnection] = set()
+        self._seq = 0
+
+    async def connect(self, websocket: WebSocket) -> ClientConnection:
+        subprotocol = choose_subprotocol(websocket.scope.get("subprotocols", []))
+        await websocket.accept(subprotocol=subprotocol)
+        client = ClientConnection(websocket, self.queue_size, binary=subprotocol == BINARY_SUBPROTOCOL)
+        client.sender = asyncio.create_task(self._drain(client))
+        self.active_connections[websocket] = client
+        self._unfiltered.add(client)
+        self.send_keyframe(client)
+        return client
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        client = self.active_connections.pop(websocket, None)
+        if client is None:
+            return
+        self.subscriptions.remove(client)
+        self._unfiltered.discard(client)
+        if client.sender is not asyncio.current_task():
+            client.sender.cancel()
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
+        for client in list(self.active_connections.values()):
+            self.send(client, message)
+
+    async def publish_frame(self, frame_type: str, entries: List[dict]):
+        """
+        Send a "keyframe" or "delta" frame of location entries.
+
+        Unfiltered clients share one encoded frame per wire format;
+        subscribed clients get a frame holding only the buses they are
+        interested in.
+        """
+        self._seq += 1
+        selected: Dict[ClientConnection, List[dict]] = {}
+        for entry in entries:
+            for client in self._interested(entry):
+                selected.setdefault(client, []).append(entry)
+
+        keyframe = frame_type == "keyframe"
+        shared: Dict[bool, Union[str, bytes]] = {}
+        for client in list(self._unfiltered):
+            if not keyframe and client.needs_keyframe:
+                self.send_keyframe(client)
+                continue
+            if client.binary not in shared:
+                shared[client.binary] = self._frame(frame_type, entries, client.binary)
+            if keyframe:
+                client.needs_keyframe = False
+            self.send(client, shared[client.binary], keyframe=keyframe)
+        for client, buses in selected.items():
+            if not keyframe and client.needs_keyframe:
+                self.send_keyframe(client)
+            else:
+                if keyframe:
+                    client.needs_keyframe = False
+                self.send(client, self._frame(frame_type, buses, client.binary), keyframe=keyframe)
+
+    def send_keyframe(self, client: ClientConnection):
+        """Send one client every bus it is interested in"""
+        client.needs_keyframe = False
+        entries = self.snapshot()
+        if client not in self._unfiltered:
+            entries = [entry for entry in entries if client in self._interested(entry)]
+        self.send(client, self._frame("keyframe", entries, client.binary), keyframe=True)
+
+    def handle_message(self, client: ClientConnection, data: str):
+        """Apply a subscribe/unsubscribe request and acknowledge it to the sender"""
+        try:
+            request = json.loads(data)
+            action = request["action"]
+            if action not in ("subscribe", "unsubscribe"):
+                raise ValueError(f"Unknown action: {action}")
+            kind, value = parse_topic(request)
+        except (ValueError, KeyError, TypeError) as e:
+            self.send(client, json.dumps({"type": "error", "detail": str(e)}))
+            return
+
+        if action == "subscribe":
+            self.subscriptions.subscribe(client, kind, value)
+        else:
+            self.subscriptions.unsubscribe(client, kind, value)
+        if self.subscriptions.has_subscriptions(client):
+            self._unfiltered.discard(client)
+        else:
+            self._unfiltered.add(client)
+        self.send(client, json.dumps({"type": f"{action}d", TOPIC_FIELDS[kind]: value}))
+        # New baseline for the narrowed (or widened) set of buses
+        self.send_keyframe(client)
+
+    def send(self, client: ClientConnection, message: Union[str, bytes], keyframe: bool = False):
+        """Queue a message for one client, applying the slow consumer policy"""
+        try:
+            client.queue.put_nowait(message)
+            return
+        except asyncio.QueueFull:
+            client.dropped += 1
+
+        if self.slow_consumer_policy == "disconnect":
+            logger.info("Disconnecting slow websocket consumer after %d queued messages", self.queue_size)
+            self.disconnect(client.websocket)
+            asyncio.create_task(self._close(client.websocket, WS_CLOSE_TRY_AGAIN_LATER))
+        else:
+            client.queue.get_nowait()
+            client.queue.put_nowait(message)
+            # Whatever was dropped is superseded when the new message is a keyframe
+            if not keyframe:
+                client.needs_keyframe = True
+
+    def _interested(self, entry: dict) -> Set[ClientConnection]:
+        return self.subscriptions.match(
+            entry["bus_id"], self.route_ids(entry["bus_id"]), entry["latitude"], entry["longitude"]
+        )
+
+    def _frame(self, frame_type: str, entries: List[dict], binary: bool = False) -> Union[str, bytes]:
+        if binary:
+            return encode_frame(frame_type, self._seq, entries)
+        return json.dumps({"type": frame_type, "seq": self._seq, "buses": entries})
+
+    async def _drain(self, client: ClientConnection):
+        try:
+            while True:
+                message = await client.queue.get()
+                if isinstance(message, bytes):
+                    send = client.websocket.send_bytes(message)
+                else:
+                    send = client.websocket.send_text(message)
+                await asyncio.wait_for(send, self.send_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Dead socket or a send that exceeded the timeout
+            self.disconnect(client.websocket)
+            await self._close(client.websocket)
+
+    async def _close(self, websocket: WebSocket, code: int = 1000):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+manager = ConnectionManager(
+    snapshot=lambda: [location_entry(row) for row in live_locations.snapshot()],
+    route_ids=live_locations.route_ids
+)
+stream = LiveTrackingStream(manager, live_locations, settings.LIVE_KEYFRAME_SECONDS, settings.LIVE_TICK_HZ)
+# Map-matching and then stop arrival predictions follow the same tick as the delta frames
+stream.add_tick_listener(map_matcher.update)
+stream.add_tick_listener(eta_engine.update)
+fanout = create_fanout_backend(settings.WS_FANOUT_BACKEND, settings.WS_FANOUT_SOCKET_DIR)
+
+def _load_buses(bus_ids: List[int]):
+    db = SessionLocal()
+    try:
+        live_locations.load_buses(db, bus_ids)
+    finally:
+        db.close()
+
+async def on_fanout_locations(rows: List[dict]):
+    """Runs in every worker for each batch of positions published through the fan-out"""
+    # A no-op in the publishing worker, whose store already holds these rows
+    _, _, unknown = live_locations.apply(rows, mark_dirty=False)
+    if unknown:
+        # Buses created through another worker, as in LiveLocationStore.ingest()
+        await run_in_threadpool(_load_buses, unknown)
+        unknown = set(unknown)
+        live_locations.apply([row for row in rows if row["bus_id"] in unknown], mark_dirty=False)
+    # Sent with the next tick, batched with any other changes until then
+    stream.mark_changed(row["bus_id"] for row in rows)
+
+def apply_changes(db: Session, changes: List[Change]):
+    """
+    Reload buses, route assignments and stops written by another worker
+    into this worker's live store, stop index and arrival predictions.
+    A row that no longer exists is removed.
+    """
+    for kind, key in changes:
+        if kind == "bus":
+            bus = db.get(Bus, key)
+            if bus is None:
+                live_locations.remove_bus(key)
+            else:
+                live_locations.register_bus(bus)
+        elif kind == "route":
+            route = db.get(Route, key)
+            live_locations.assign_route(key, route.bus_id if route is not None else None)
+            eta_engine.rebuild_route(db, key)
+        elif kind == "stop":
+            stop = db.get(Stop, key)
+            if stop is None:
+                stop_index.remove(key)
+            else:
+                stop_index.upsert(stop)
+
+def _apply_changes(changes: List[Change]):
+    db = SessionLocal()
+    try:
+        apply_changes(db, changes)
+    finally:
+        db.close()
 
-manager = ConnectionManager()
+async def on_fanout_changes(changes: List[Change]):
+    """Runs in every other worker for each batch of changes published through the fan-out"""
+    await run_in_threadpool(_apply_changes, changes)
 
 @router.websocket("/live-tracking")
 async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+    """
+    Live bus positions. Send {"action": "subscribe", "route_id": 12},
+    {"action": "subscribe", "bus_id": 3} or
+    {"action": "subscribe", "bbox": [min_lat, min_lon, max_lat, max_lon]}
+    (or "unsubscribe") to receive only matching updates. Offer the
+    "dtms.location.v1.binary" subprotocol to receive packed binary frames.
+    """
+    client = await manager.connect(websocket)
     try:
         while True:
-            data = await websocket.receive_text()
-            # Echo back or process data
-            await manager.broadcast(f"Message: {data}")
-    except WebSocketDisconnect:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            # Subscriptions are JSON text; binary frames from the client are ignored
+            if message.get("text") is not None:
+                manager.handle_message(client, message["text"])
+    except (WebSocketDisconnect, RuntimeError):
+        # RuntimeError: the socket was closed by the manager while receiving
+        pass
+    finally:
         manager.disconnect(websocket)
 
 @router.get("/broadcast-location/{bus_id}")
-async def broadcast_bus_location(bus_id: int, db: Session = Depends(get_db)):
-    location = db.query(LiveBusLocation).filter(LiveBusLocation.bus_id == bus_id).first()
-    if location:
-        message = json.dumps({
-            "bus_id": location.bus_id,
-            "latitude": location.latitude,
-            "longitude": location.longitude,
-            "speed": location.speed
-        })
-        await manager.broadcast(message)
-        return {"status": "broadcasted"}
-    return {"status": "not found"}
+async def broadcast_bus_location(bus_id: int):
+    rows = live_locations.fix_rows([bus_id])
+    if not rows:
+        return {"status": "not found"}
+    await fanout.publish(rows)
+    return {"status": "broadcasted"}
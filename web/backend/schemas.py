@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List
-from datetime import datetime
+from typing import Any, Dict, Optional, List
+from datetime import date, datetime
 from models import UserRole, BookingStatus, PaymentStatus, TransactionType
 
 # User Schemas
@@ -127,6 +127,19 @@ class StopResponse(StopBase):
     class Config:
         from_attributes = True
 
+class NearbyStopResponse(StopResponse):
+    distance_m: float
+
+class StopArrival(BaseModel):
+    stop_id: int
+    route_id: int
+    bus_id: int
+    bus_number: Optional[str] = None
+    distance_m: float
+    eta_seconds: int
+    expected_arrival: datetime
+    position_updated: datetime
+
 # Booking Schemas
 class BookingBase(BaseModel):
     route_id: int
@@ -179,6 +192,25 @@ class LiveLocationUpdate(BaseModel):
     speed: Optional[float] = 0.0
     heading: Optional[float] = None
 
+class LiveLocationFix(LiveLocationUpdate):
+    recorded_at: Optional[datetime] = None
+
+class LiveLocationBatch(BaseModel):
+    fixes: List[LiveLocationFix] = Field(..., min_length=1, max_length=10000)
+
+class LocationHistoryPoint(BaseModel):
+    recorded_at: datetime
+    latitude: float
+    longitude: float
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+
+class LiveLocationBatchResponse(BaseModel):
+    received: int
+    accepted: int
+    stale: int
+    unknown_bus_ids: List[int]
+
 class LiveLocationResponse(BaseModel):
     id: int
     bus_id: int
@@ -191,6 +223,24 @@ class LiveLocationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Route Detail Schemas
+class BusPosition(BaseModel):
+    latitude: float
+    longitude: float
+    speed: Optional[float] = None
+    heading: Optional[float] = None
+    last_updated: datetime
+
+    class Config:
+        from_attributes = True
+
+class RouteBusResponse(BusResponse):
+    live_location: Optional[BusPosition] = None
+
+class RouteDetailResponse(RouteResponse):
+    bus: Optional[RouteBusResponse] = None
+    stops: List[StopResponse] = []
+
 # Analytics Schemas
 class KPIResponse(BaseModel):
     active_buses: int
@@ -205,3 +255,82 @@ class RouteRevenueResponse(BaseModel):
 class PassengerCategoryResponse(BaseModel):
     category: str
     count: int
+
+class RouteRevenueBucketResponse(BaseModel):
+    bucket_start: datetime
+    route_id: int
+    route_name: str
+    revenue: float
+
+class PassengerCategoryBucketResponse(BaseModel):
+    bucket_start: datetime
+    category: str
+    count: int
+
+class ApproxDistinctPassengersResponse(BaseModel):
+    route_id: int
+    day: date
+    estimate: int
+    standard_error: float
+
+class ApproxTopRouteResponse(BaseModel):
+    route_id: int
+    route_name: Optional[str] = None
+    estimated_bookings: int
+    max_overcount: int
+
+class TripOccupancyResponse(BaseModel):
+    route_id: int
+    route_name: str
+    journey_date: date
+    bus_id: Optional[int] = None
+    bus_number: Optional[str] = None
+    capacity: int
+    passengers: int
+    load_factor: float
+
+class OccupancySummaryResponse(BaseModel):
+    route_id: Optional[int] = None
+    bus_id: Optional[int] = None
+    journey_date: Optional[date] = None
+    trips: int
+    passengers: int
+    seats: int
+    load_factor: float
+
+class AnalyticsJobCreate(BaseModel):
+    job_type: str
+    from_: Optional[datetime] = Field(None, alias="from")
+    to: Optional[datetime] = None
+    bucket: str = Field("day", pattern="^(hour|day|week)$")
+    route_id: Optional[int] = None
+    category: Optional[str] = None
+
+    class Config:
+        populate_by_name = True
+
+class AnalyticsJobResponse(BaseModel):
+    id: str
+    job_type: str
+    status: str
+    params: Dict[str, Any]
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+# System Schemas
+class DBPoolStatusResponse(BaseModel):
+    pool_size: Optional[int] = None
+    max_overflow: Optional[int] = None
+    timeout_seconds: Optional[float] = None
+    checked_out: Optional[int] = None
+    checked_in: Optional[int] = None
+    overflow_in_use: Optional[int] = None
+    checkouts: Optional[int] = None
+    waits: Optional[int] = None
+    timeouts: Optional[int] = None
+    wait_seconds_total: Optional[float] = None
+    wait_seconds_max: Optional[float] = None
+    threadpool_size: int
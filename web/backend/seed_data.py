@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine, Base
+from database import SessionLocal
 from models import User, Bus, Route, Stop, Booking, Payment, Wallet, LiveBusLocation
 from models import UserRole, BookingStatus, PaymentStatus
 from auth_utils import get_password_hash
@@ -7,9 +7,7 @@ from datetime import datetime, timedelta
 import random
 
 def seed_database():
-    # Create tables
-    Base.metadata.create_all(bind=engine)
-    
+    # Tables come from `alembic upgrade head`, run before seeding
     db = SessionLocal()
     
     try:
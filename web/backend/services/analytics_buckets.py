@@ -0,0 +1,254 @@
+"""
+Pre-aggregated revenue and ridership per hour, day and week
+
+Every successful payment adds its amount to the route's revenue bucket
+(by payment date) and every booking that becomes confirmed or completed
+adds a passenger to its category's bucket (by journey date), once for
+each granularity. Range and time series queries then read at most one
+row per route or category per bucket instead of scanning bookings and
+payments. Buckets are aligned to UTC; weeks start on Monday.
+
+Writes made outside the API (seed, cleanup and import scripts) and lost
+races are corrected by rebuilding every bucket from the source tables at
+startup and periodically afterwards. The rebuild only writes the buckets
+that drifted, adding the difference, so the write paths are not blocked
+behind it.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, literal_column, select, type_coerce, union_all
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, dialect_insert, try_advisory_xact_lock
+from models import Booking, Payment, PaymentStatus, PassengerCategoryBucket, Route, RouteRevenueBucket
+from services.kpi_rollup import COUNTED_BOOKING_STATUSES
+
+logger = logging.getLogger(__name__)
+
+GRANULARITIES = ("hour", "day", "week")
+DEFAULT_CATEGORY = "general"
+# Revenue differences below this are float rounding, not drift
+REVENUE_TOLERANCE = 0.001
+# Corrected buckets per upsert statement
+CORRECTION_CHUNK_SIZE = 1000
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def bucket_start(value: datetime, granularity: str) -> datetime:
+    """Start of the UTC bucket containing value"""
+    value = _utc(value).replace(minute=0, second=0, microsecond=0)
+    if granularity == "hour":
+        return value
+    value = value.replace(hour=0)
+    if granularity == "day":
+        return value
+    if granularity == "week":
+        return value - timedelta(days=value.weekday())
+    raise ValueError(f"Unknown bucket: {granularity}")
+
+def granularity_for(*bounds: Optional[datetime]) -> str:
+    """Coarsest granularity whose bucket boundaries line up with every given bound"""
+    bounds = [_utc(bound) for bound in bounds if bound is not None]
+    for granularity in ("week", "day"):
+        if all(bucket_start(bound, granularity) == bound for bound in bounds):
+            return granularity
+    # Bounds inside an hour are widened to whole hours
+    return "hour"
+
+def add_revenue(db: Session, route_id: int, at: datetime, amount: float):
+    """Add a payment to its route's buckets within the caller's transaction"""
+    insert = dialect_insert(db)
+    stmt = insert(RouteRevenueBucket).values([
+        {"granularity": g, "bucket_start": bucket_start(at, g), "route_id": route_id, "revenue": amount}
+        for g in GRANULARITIES
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[RouteRevenueBucket.granularity, RouteRevenueBucket.bucket_start, RouteRevenueBucket.route_id],
+        set_={"revenue": RouteRevenueBucket.revenue + stmt.excluded.revenue},
+    ))
+
+def add_passengers(db: Session, category: Optional[str], at: datetime, count: int):
+    """Add (or with a negative count, remove) passengers within the caller's transaction"""
+    insert = dialect_insert(db)
+    stmt = insert(PassengerCategoryBucket).values([
+        {
+            "granularity": g,
+            "bucket_start": bucket_start(at, g),
+            "category": category or DEFAULT_CATEGORY,
+            "passengers": count,
+        }
+        for g in GRANULARITIES
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[
+            PassengerCategoryBucket.granularity, PassengerCategoryBucket.bucket_start, PassengerCategoryBucket.category
+        ],
+        set_={"passengers": PassengerCategoryBucket.passengers + stmt.excluded.passengers},
+    ))
+
+def _range(query, column, granularity: str, start: Optional[datetime], end: Optional[datetime]):
+    if start is not None:
+        query = query.filter(column >= bucket_start(start, granularity))
+    if end is not None:
+        query = query.filter(column < _utc(end))
+    return query
+
+def route_revenue(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+    """Revenue per route name between start and end (all time when both are None)"""
+    granularity = granularity_for(start, end)
+    query = db.query(
+        Route.route_name, func.sum(RouteRevenueBucket.revenue)
+    ).join(
+        Route, Route.id == RouteRevenueBucket.route_id
+    ).filter(RouteRevenueBucket.granularity == granularity)
+    query = _range(query.filter(RouteRevenueBucket.revenue != 0), RouteRevenueBucket.bucket_start, granularity, start, end)
+    return [{"route_name": name, "revenue": revenue or 0.0} for name, revenue in query.group_by(Route.route_name).all()]
+
+def passenger_categories(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[dict]:
+    """Passengers per category between start and end (all time when both are None)"""
+    granularity = granularity_for(start, end)
+    query = db.query(
+        PassengerCategoryBucket.category, func.sum(PassengerCategoryBucket.passengers)
+    ).filter(PassengerCategoryBucket.granularity == granularity)
+    query = _range(query, PassengerCategoryBucket.bucket_start, granularity, start, end)
+    rows = query.group_by(PassengerCategoryBucket.category).all()
+    return [{"category": category, "count": count} for category, count in rows if count]
+
+def revenue_series(
+    db: Session, granularity: str, start: datetime, end: datetime, route_id: Optional[int] = None
+) -> List[dict]:
+    """Revenue per route per bucket, oldest bucket first"""
+    query = db.query(
+        RouteRevenueBucket.bucket_start, RouteRevenueBucket.route_id, Route.route_name, RouteRevenueBucket.revenue
+    ).join(
+        Route, Route.id == RouteRevenueBucket.route_id
+    ).filter(RouteRevenueBucket.granularity == granularity, RouteRevenueBucket.revenue != 0)
+    if route_id is not None:
+        query = query.filter(RouteRevenueBucket.route_id == route_id)
+    query = _range(query, RouteRevenueBucket.bucket_start, granularity, start, end)
+    return [
+        {"bucket_start": _utc(bucket), "route_id": rid, "route_name": name, "revenue": revenue}
+        for bucket, rid, name, revenue in query.order_by(RouteRevenueBucket.bucket_start, RouteRevenueBucket.route_id)
+    ]
+
+def passenger_series(
+    db: Session, granularity: str, start: datetime, end: datetime, category: Optional[str] = None
+) -> List[dict]:
+    """Passengers per category per bucket, oldest bucket first"""
+    query = db.query(
+        PassengerCategoryBucket.bucket_start, PassengerCategoryBucket.category, PassengerCategoryBucket.passengers
+    ).filter(PassengerCategoryBucket.granularity == granularity, PassengerCategoryBucket.passengers != 0)
+    if category is not None:
+        query = query.filter(PassengerCategoryBucket.category == category)
+    query = _range(query, PassengerCategoryBucket.bucket_start, granularity, start, end)
+    return [
+        {"bucket_start": _utc(bucket), "category": cat, "count": count}
+        for bucket, cat, count in query.order_by(PassengerCategoryBucket.bucket_start, PassengerCategoryBucket.category)
+    ]
+
+def _truncate(db: Session, column, granularity: str):
+    """SQL expression for bucket_start() of a timestamp column"""
+    if db.get_bind().dialect.name == "sqlite":
+        modifiers = {
+            "hour": ("'%Y-%m-%d %H:00:00.000000'",),
+            "day": ("'%Y-%m-%d 00:00:00.000000'",),
+            "week": ("'%Y-%m-%d 00:00:00.000000'", "'weekday 0'", "'-6 days'"),
+        }[granularity]
+        return func.strftime(literal_column(modifiers[0]), column, *(literal_column(m) for m in modifiers[1:]))
+    utc = literal_column("'UTC'")
+    return func.timezone(utc, func.date_trunc(literal_column(f"'{granularity}'"), func.timezone(utc, column)))
+
+def _correct(db: Session, model, key, value, expected, granularity: str, tolerance: float = 0) -> int:
+    """
+    Add the difference to every bucket of one granularity whose value
+    differs from expected, a select of (bucket_start, key, value) rows, and
+    return how many were corrected.
+
+    Expected and stored values are compared in a single statement, so both
+    come from one snapshot, in which the write paths have updated the
+    source rows and their buckets together. Corrections are increments, so
+    writes to the same buckets after that snapshot are kept.
+    """
+    expected = expected.subquery()
+    at, expected_key, expected_value = expected.c
+    both = union_all(
+        select(
+            # Parsed as a datetime, like the stored column, on SQLite as well
+            type_coerce(at, model.bucket_start.type).label("bucket_start"),
+            expected_key.label("bucket_key"),
+            expected_value.label("expected"),
+            literal_column("0").label("stored"),
+        ),
+        select(model.bucket_start, key, literal_column("0"), value).where(model.granularity == granularity),
+    ).subquery()
+    bucket, bucket_key, expected_value, stored_value = both.c
+    difference = func.sum(expected_value) - func.sum(stored_value)
+    drifted = db.execute(
+        select(bucket, bucket_key, difference).group_by(bucket, bucket_key).having(func.abs(difference) > tolerance)
+    ).all()
+
+    insert = dialect_insert(db)
+    for start in range(0, len(drifted), CORRECTION_CHUNK_SIZE):
+        stmt = insert(model).values([
+            {"granularity": granularity, "bucket_start": at, key.key: bucket_id, value.key: correction}
+            for at, bucket_id, correction in drifted[start:start + CORRECTION_CHUNK_SIZE]
+        ])
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[model.granularity, model.bucket_start, key],
+            set_={value.key: value + stmt.excluded[value.key]},
+        ))
+    return len(drifted)
+
+def rebuild(db: Session) -> bool:
+    """
+    Recompute every bucket from bookings and payments and correct the ones
+    that drifted, in one transaction; returns False without changes when
+    another worker is already rebuilding. Buckets that match are not
+    written, so only the corrected rows are locked until the commit.
+    """
+    if not try_advisory_xact_lock(db, "analytics_buckets.rebuild"):
+        db.rollback()
+        return False
+    for granularity in GRANULARITIES:
+        paid_at = _truncate(db, Payment.payment_date, granularity)
+        revenue = select(
+            paid_at, Booking.route_id, func.sum(Payment.amount)
+        ).select_from(Payment).join(
+            Booking, Booking.id == Payment.booking_id
+        ).where(Payment.status == PaymentStatus.SUCCESS).group_by(paid_at, Booking.route_id)
+        _correct(db, RouteRevenueBucket, RouteRevenueBucket.route_id, RouteRevenueBucket.revenue, revenue,
+                 granularity, REVENUE_TOLERANCE)
+
+        travelled_at = _truncate(db, Booking.journey_date, granularity)
+        category = func.coalesce(Booking.passenger_category, literal_column(f"'{DEFAULT_CATEGORY}'"))
+        passengers = select(
+            travelled_at, category, func.count(Booking.id)
+        ).where(Booking.status.in_(COUNTED_BOOKING_STATUSES)).group_by(travelled_at, category)
+        _correct(db, PassengerCategoryBucket, PassengerCategoryBucket.category, PassengerCategoryBucket.passengers,
+                 passengers, granularity)
+    db.commit()
+    return True
+
+def rebuild_buckets() -> bool:
+    """Rebuild using a short-lived session"""
+    db = SessionLocal()
+    try:
+        return rebuild(db)
+    finally:
+        db.close()
+
+async def run_rebuild_loop(interval_seconds: float):
+    """Rebuild the buckets now and then periodically, correcting drift from writes outside the API"""
+    while True:
+        try:
+            await run_in_threadpool(rebuild_buckets)
+        except Exception:
+            logger.exception("Failed to rebuild analytics buckets")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,44 @@
+"""
+Analytics bookkeeping for the bus, booking and payment write paths
+
+Routers call these hooks after changing a row and before committing, so
+the KPI rollup, the time buckets and trip occupancy change in the same
+transaction as the data they summarise.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models import Booking, BookingStatus, Payment
+from services import analytics_buckets, kpi_rollup, occupancy
+
+def bus_saved(db: Session, was_active: bool, is_active: bool):
+    """A bus was created (was_active False), updated or deleted (is_active False)"""
+    kpi_rollup.adjust(db, active_buses=int(bool(is_active)) - int(bool(was_active)))
+
+def bus_capacity_changed(db: Session, bus_id: int, capacity: Optional[int]):
+    """A bus's capacity was changed"""
+    occupancy.bus_capacity_changed(db, bus_id, capacity)
+
+def route_reassigned(db: Session, route_id: int, bus_id: Optional[int]):
+    """A route was assigned to another bus (or none)"""
+    occupancy.route_reassigned(db, route_id, bus_id)
+
+def booking_status_changed(db: Session, booking: Booking, previous: Optional[BookingStatus]):
+    """A booking was created (previous None) or its status changed"""
+    delta = kpi_rollup.booking_counted(booking.status) - kpi_rollup.booking_counted(previous)
+    if delta:
+        kpi_rollup.adjust(db, passenger_count=delta)
+        analytics_buckets.add_passengers(db, booking.passenger_category, booking.journey_date, delta)
+    # New bookings get the column default when flushed
+    status = booking.status or BookingStatus.PENDING
+    seats = occupancy.occupies_seat(status) - occupancy.occupies_seat(previous)
+    if seats:
+        occupancy.add_passengers(db, booking.route_id, booking.journey_date, seats)
+
+def payment_succeeded(db: Session, payment: Payment, booking: Booking):
+    """A successful payment was recorded for a booking"""
+    kpi_rollup.adjust(db, total_revenue=payment.amount)
+    paid_at = payment.payment_date or datetime.now(timezone.utc)
+    analytics_buckets.add_revenue(db, booking.route_id, paid_at, payment.amount)
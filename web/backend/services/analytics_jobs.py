@@ -0,0 +1,183 @@
+"""
+Background execution of expensive analytics queries
+
+POST /api/analytics/jobs stores a job row and hands it to a bounded
+thread pool, so a wide date range does not hold a request thread and its
+database connection while it runs. Clients poll the job by id. Finished
+results are kept in the analytics_jobs table, and a new job identical to
+one that succeeded less than ANALYTICS_JOB_CACHE_SECONDS ago (or that is
+still queued or running) returns that job instead of computing again.
+
+A queued or running job that no live worker holds any more (its worker
+stopped) is failed after ANALYTICS_JOB_TIMEOUT_SECONDS, counted from when
+it started running, or from its creation while it is still queued. Status
+changes are conditional on the status the change expects, so a job failed
+this way is never flipped back by its original worker.
+"""
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import AnalyticsJob
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+class JobQueueFull(Exception):
+    """Raised when the pool already has its maximum of queued jobs"""
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def params_hash(job_type: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps({"job_type": job_type, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AnalyticsJobRunner:
+    """Runs analytics jobs on a bounded pool and records their results"""
+
+    def __init__(self, max_workers: int, queue_size: int, cache_seconds: float, timeout_seconds: float,
+                 retention_hours: float):
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.cache_seconds = cache_seconds
+        self.timeout_seconds = timeout_seconds
+        self.retention_hours = retention_hours
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # Ids of the jobs queued or running in this worker
+        self._jobs: Set[str] = set()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="analytics-job")
+        return self._executor
+
+    def submit(self, db: Session, job_type: str, params: Dict[str, Any], run: Callable[[Session], Any]) -> AnalyticsJob:
+        """
+        Queue run(db) as a job, or return an identical job that is pending
+        or succeeded recently. Raises JobQueueFull when the pool is busy.
+        """
+        params = jsonable_encoder(params)
+        digest = params_hash(job_type, params)
+        fresh_after = _now() - timedelta(seconds=self.cache_seconds)
+        existing = db.query(AnalyticsJob).filter(
+            AnalyticsJob.params_hash == digest,
+            AnalyticsJob.status.in_((QUEUED, RUNNING, SUCCEEDED))
+        ).order_by(AnalyticsJob.created_at.desc()).first()
+        if existing is not None:
+            self._expire_if_stuck(db, existing)
+            if existing.status in (QUEUED, RUNNING) or _utc(existing.finished_at) >= fresh_after:
+                return existing
+
+        with self._lock:
+            if self._in_flight >= self.queue_size:
+                raise JobQueueFull()
+            self._in_flight += 1
+        job_id = str(uuid.uuid4())
+        try:
+            job = AnalyticsJob(
+                id=job_id, job_type=job_type, params=json.dumps(params),
+                params_hash=digest, status=QUEUED, created_at=_now()
+            )
+            db.add(job)
+            db.commit()
+            db.refresh(job)
+            with self._lock:
+                self._jobs.add(job_id)
+            self._pool().submit(self._run, job_id, run)
+        except Exception:
+            with self._lock:
+                self._in_flight -= 1
+                self._jobs.discard(job_id)
+            raise
+        self.prune(db)
+        return job
+
+    @staticmethod
+    def _transition(db: Session, job_id: str, expected: str, **values) -> bool:
+        """Change a job that still has the expected status; False when it has another"""
+        changed = db.query(AnalyticsJob).filter(
+            AnalyticsJob.id == job_id, AnalyticsJob.status == expected
+        ).update(values, synchronize_session=False)
+        db.commit()
+        return bool(changed)
+
+    def _run(self, job_id: str, run: Callable[[Session], Any]):
+        db = SessionLocal()
+        try:
+            if not self._transition(db, job_id, QUEUED, status=RUNNING, started_at=_now()):
+                # Deleted or failed while it waited in the queue
+                return
+            try:
+                values = {"result": json.dumps(jsonable_encoder(run(db))), "status": SUCCEEDED}
+            except Exception as e:
+                db.rollback()
+                logger.exception("Analytics job %s failed", job_id)
+                values = {"error": str(getattr(e, "detail", e)), "status": FAILED}
+            if not self._transition(db, job_id, RUNNING, finished_at=_now(), **values):
+                logger.warning("Analytics job %s was failed as timed out before it finished", job_id)
+        finally:
+            db.close()
+            with self._lock:
+                self._in_flight -= 1
+                self._jobs.discard(job_id)
+
+    def _expire_if_stuck(self, db: Session, job: AnalyticsJob):
+        """Fail jobs lost with a worker that stopped before finishing them"""
+        if job.status not in (QUEUED, RUNNING):
+            return
+        with self._lock:
+            if job.id in self._jobs:
+                return
+        since = job.started_at if job.status == RUNNING and job.started_at is not None else job.created_at
+        if _utc(since) < _now() - timedelta(seconds=self.timeout_seconds):
+            self._transition(db, job.id, job.status, status=FAILED, error="Job timed out", finished_at=_now())
+            db.refresh(job)
+
+    def get(self, db: Session, job_id: str) -> Optional[AnalyticsJob]:
+        job = db.query(AnalyticsJob).filter(AnalyticsJob.id == job_id).first()
+        if job is not None:
+            self._expire_if_stuck(db, job)
+        return job
+
+    def prune(self, db: Session):
+        """Delete finished jobs older than the retention period"""
+        cutoff = _now() - timedelta(hours=self.retention_hours)
+        db.query(AnalyticsJob).filter(
+            AnalyticsJob.status.in_((SUCCEEDED, FAILED)), AnalyticsJob.created_at < cutoff
+        ).delete(synchronize_session=False)
+        db.commit()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+job_runner = AnalyticsJobRunner(
+    settings.ANALYTICS_JOB_WORKERS,
+    queue_size=settings.ANALYTICS_JOB_QUEUE_SIZE,
+    cache_seconds=settings.ANALYTICS_JOB_CACHE_SECONDS,
+    timeout_seconds=settings.ANALYTICS_JOB_TIMEOUT_SECONDS,
+    retention_hours=settings.ANALYTICS_JOB_RETENTION_HOURS,
+)
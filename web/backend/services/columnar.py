@@ -0,0 +1,273 @@
+"""
+Columnar snapshots of bookings, payments and routes for offline analytics
+
+A snapshot is a directory with one .npy file per column plus a
+manifest.json:
+
+    <COLUMNAR_DIR>/<snapshot>/<table>/<column>.npy
+    <COLUMNAR_DIR>/<snapshot>/manifest.json
+    <COLUMNAR_DIR>/LATEST                  name of the newest snapshot
+
+Numbers are stored as fixed-width NumPy arrays (missing integers as -1,
+missing floats as NaN), timestamps as datetime64[s] in UTC and strings
+dictionary-encoded as int32 codes with the distinct values kept in the
+manifest. Arrays are opened memory-mapped, so scans only page in the
+columns they touch, and group_by() aggregates with np.unique/np.bincount
+instead of looping over rows in Python.
+"""
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import Booking, Payment, Route
+
+FORMAT_VERSION = 1
+EXPORT_CHUNK_ROWS = 50000
+LATEST = "LATEST"
+
+# table -> (model, [(column, kind)]); kind is int, float, time or str
+TABLES = {
+    "routes": (Route, [
+        ("id", "int"), ("route_number", "str"), ("route_name", "str"), ("bus_id", "int"),
+        ("distance_km", "float"), ("estimated_duration_minutes", "int"), ("fare", "float"),
+    ]),
+    "bookings": (Booking, [
+        ("id", "int"), ("user_id", "int"), ("route_id", "int"), ("passenger_category", "str"),
+        ("journey_date", "time"), ("fare_amount", "float"), ("status", "str"), ("created_at", "time"),
+    ]),
+    "payments": (Payment, [
+        ("id", "int"), ("booking_id", "int"), ("payment_method", "str"), ("amount", "float"),
+        ("status", "str"), ("payment_date", "time"),
+    ]),
+}
+DTYPES = {"int": np.int64, "float": np.float64, "time": "datetime64[s]", "str": np.int32}
+MISSING = {"int": -1, "float": np.nan, "time": np.datetime64("NaT"), "str": -1}
+
+def _convert(value, kind: str, categories: Dict[str, int]):
+    if value is None:
+        return MISSING[kind]
+    if kind == "time":
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return np.datetime64(value, "s")
+    if kind == "str":
+        value = getattr(value, "value", value)
+        return categories.setdefault(value, len(categories))
+    return value
+
+def _export_table(db: Session, model, columns, directory: str) -> dict:
+    os.makedirs(directory)
+    # Rows inserted while exporting are left for the next snapshot
+    max_id = db.query(model.id).order_by(model.id.desc()).limit(1).scalar() or 0
+    query = db.query(*(getattr(model, name) for name, _ in columns)).filter(model.id <= max_id)
+    capacity = query.count()
+    arrays = {
+        name: np.lib.format.open_memmap(os.path.join(directory, f"{name}.npy"), mode="w+",
+                                        dtype=DTYPES[kind], shape=(capacity,))
+        for name, kind in columns
+    }
+    categories = {name: {} for name, kind in columns if kind == "str"}
+
+    rows = 0
+    chunk: List[tuple] = []
+    def write_chunk():
+        for index, (name, kind) in enumerate(columns):
+            values = [_convert(row[index], kind, categories.get(name)) for row in chunk]
+            arrays[name][rows:rows + len(chunk)] = np.array(values, dtype=DTYPES[kind])
+
+    for row in query.order_by(model.id).yield_per(EXPORT_CHUNK_ROWS):
+        if rows + len(chunk) >= capacity:
+            break
+        chunk.append(row)
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            write_chunk()
+            rows += len(chunk)
+            chunk = []
+    if chunk:
+        write_chunk()
+        rows += len(chunk)
+    for array in arrays.values():
+        array.flush()
+    return {
+        "rows": rows,
+        "columns": {name: kind for name, kind in columns},
+        "categories": {name: list(values) for name, values in categories.items()},
+    }
+
+def export_snapshot(db: Session, output_dir: str, keep: int = 3) -> str:
+    """Write a new snapshot, point LATEST at it and prune all but the newest keep snapshots"""
+    name = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    staging = os.path.join(output_dir, f".{name}.tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    manifest = {"version": FORMAT_VERSION, "created_at": name, "tables": {}}
+    for table, (model, columns) in TABLES.items():
+        manifest["tables"][table] = _export_table(db, model, columns, os.path.join(staging, table))
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    final = os.path.join(output_dir, name)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(staging, final)
+    with open(os.path.join(output_dir, LATEST + ".tmp"), "w") as f:
+        f.write(name)
+    os.replace(os.path.join(output_dir, LATEST + ".tmp"), os.path.join(output_dir, LATEST))
+
+    snapshots = sorted(entry for entry in os.listdir(output_dir) if entry[:1].isdigit())
+    for old in snapshots[:-keep]:
+        shutil.rmtree(os.path.join(output_dir, old), ignore_errors=True)
+    return final
+
+def date_bucket(values: np.ndarray, unit: str) -> np.ndarray:
+    """Truncate datetime64 values to hour, day or week (weeks start on Monday)"""
+    if unit == "hour":
+        return values.astype("datetime64[h]")
+    days = values.astype("datetime64[D]")
+    if unit == "day":
+        return days
+    if unit == "week":
+        # 1970-01-01 was a Thursday, three days after a Monday
+        offsets = (days.astype(np.int64) + 3) % 7
+        return days - offsets.astype("timedelta64[D]")
+    raise ValueError(f"Unknown date unit: {unit}")
+
+KeySpec = Union[str, Tuple[str, str], Tuple[str, np.ndarray]]
+
+class Table:
+    """Memory-mapped columns of one exported table"""
+
+    def __init__(self, directory: str, meta: dict):
+        self.directory = directory
+        self.rows = meta["rows"]
+        self.kinds: Dict[str, str] = meta["columns"]
+        self.categories: Dict[str, List[str]] = meta["categories"]
+        self._columns: Dict[str, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._columns:
+            if name not in self.kinds:
+                raise KeyError(name)
+            array = np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode="r")
+            self._columns[name] = array[:self.rows]
+        return self._columns[name]
+
+    def isin(self, name: str, values: Iterable[str]) -> np.ndarray:
+        """Row mask for a dictionary-encoded column equal to any of values"""
+        lookup = {value: code for code, value in enumerate(self.categories[name])}
+        codes = [lookup[value] for value in values if value in lookup]
+        return np.isin(self[name], codes)
+
+    def lookup(self, key: str, keys: np.ndarray, column: str) -> np.ndarray:
+        """Vectorised join: column values of the rows whose key equals each of keys (key must be sorted)"""
+        index = np.searchsorted(self[key], keys)
+        index = np.minimum(index, max(self.rows - 1, 0))
+        values = self[column][index] if self.rows else np.full(len(keys), -1)
+        found = self[key][index] == keys if self.rows else np.zeros(len(keys), dtype=bool)
+        return np.where(found, values, -1)
+
+    def group_by(
+        self,
+        keys: Sequence[KeySpec],
+        value: Optional[Union[str, np.ndarray]] = None,
+        agg: str = "count",
+        where: Optional[np.ndarray] = None
+    ) -> List[dict]:
+        """
+        Aggregate rows grouped by keys.
+
+        A key is a column name, a (time column, "hour"|"day"|"week")
+        pair, or a (name, array) pair for a derived column such as a
+        lookup() result. agg is count, sum or mean of value. Dictionary
+        encoded keys come back as their strings.
+        """
+        names, arrays, decoders = [], [], []
+        for spec in keys:
+            if isinstance(spec, str):
+                names.append(spec)
+                arrays.append(self[spec])
+                decoders.append(self.categories.get(spec))
+            elif isinstance(spec[1], str):
+                names.append(spec[0])
+                arrays.append(date_bucket(self[spec[0]], spec[1]))
+                decoders.append(None)
+            else:
+                names.append(spec[0])
+                arrays.append(spec[1])
+                decoders.append(None)
+        values = self[value] if isinstance(value, str) else value
+        if where is not None:
+            arrays = [array[where] for array in arrays]
+            values = values[where] if values is not None else None
+        return group_by(names, arrays, values, agg, decoders)
+
+def group_by(
+    names: Sequence[str],
+    arrays: Sequence[np.ndarray],
+    values: Optional[np.ndarray] = None,
+    agg: str = "count",
+    decoders: Optional[Sequence[Optional[List[str]]]] = None
+) -> List[dict]:
+    """Group equal-length key arrays and aggregate values per group"""
+    if agg not in ("count", "sum", "mean"):
+        raise ValueError(f"Unknown aggregate: {agg}")
+    if agg != "count" and values is None:
+        raise ValueError(f"{agg} needs a value column")
+    if not len(arrays) or not len(arrays[0]):
+        return []
+    uniques, inverses = zip(*(np.unique(array, return_inverse=True) for array in arrays))
+    # Combine the per-key group numbers into a single group id
+    group = np.zeros(len(arrays[0]), dtype=np.int64)
+    for unique, inverse in zip(uniques, inverses):
+        group = group * len(unique) + inverse.reshape(-1)
+    groups, first, group_index = np.unique(group, return_index=True, return_inverse=True)
+    counts = np.bincount(group_index.reshape(-1))
+    if agg == "count":
+        result = counts
+    else:
+        sums = np.bincount(group_index.reshape(-1), weights=np.asarray(values, dtype=np.float64))
+        result = sums if agg == "sum" else sums / counts
+
+    decoders = decoders or [None] * len(names)
+    rows = []
+    for position, row_index in enumerate(first):
+        row = {}
+        for name, array, decoder in zip(names, arrays, decoders):
+            key = array[row_index]
+            if decoder is not None:
+                key = decoder[key] if key >= 0 else None
+            elif isinstance(key, np.datetime64):
+                key = key.astype("datetime64[s]").astype(datetime).replace(tzinfo=timezone.utc)
+            else:
+                key = key.item()
+            row[name] = key
+        row[agg] = result[position].item()
+        rows.append(row)
+    return rows
+
+class ColumnarSnapshot:
+    """An exported snapshot opened for reading"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        if self.manifest["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot version: {self.manifest['version']}")
+        self._tables: Dict[str, Table] = {}
+
+    @classmethod
+    def latest(cls, output_dir: str) -> "ColumnarSnapshot":
+        with open(os.path.join(output_dir, LATEST)) as f:
+            return cls(os.path.join(output_dir, f.read().strip()))
+
+    def __getitem__(self, table: str) -> Table:
+        if table not in self._tables:
+            self._tables[table] = Table(os.path.join(self.path, table), self.manifest["tables"][table])
+        return self._tables[table]
@@ -0,0 +1,107 @@
+"""
+Stop arrival predictions from live bus positions
+
+The map matcher keeps each bus's distance along its routes current; the
+remaining distance to every downstream stop of the route is turned into
+an ETA. Predictions are recomputed on the live tracking tick for the
+buses that moved, so reads are a dictionary lookup.
+"""
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List
+
+from sqlalchemy.orm import Session
+
+from services.location_store import live_locations
+from services.map_matching import MapMatcher, RouteGeometry, map_matcher
+
+# Positions further than this from the route polyline get no predictions
+MAX_OFF_ROUTE_M = 500.0
+# Below this reported speed (km/h) the bus is treated as dwelling and the route average is used
+MIN_MOVING_SPEED_KMH = 5.0
+
+class EtaEngine:
+    """Per-stop arrival predictions kept current from the live location store"""
+
+    def __init__(self, store, matcher: MapMatcher):
+        self.store = store
+        self.matcher = matcher
+        self._lock = threading.Lock()
+        # stop_id -> bus_id -> prediction
+        self._arrivals: Dict[int, Dict[int, dict]] = {}
+        # bus_id -> stop ids it currently has predictions for
+        self._bus_stops: Dict[int, List[int]] = {}
+
+    def load(self, db: Session):
+        """Build route geometry, match every bus and predict its arrivals"""
+        self.matcher.load(db)
+        with self._lock:
+            self._arrivals.clear()
+            self._bus_stops.clear()
+        self.update([row["id"] for row in self.store.snapshot()])
+
+    def rebuild_route(self, db: Session, route_id: int):
+        """Refresh one route after its stops, timing or bus changed"""
+        previous = self.matcher.geometry(route_id)
+        with self._lock:
+            # Buses predicted on the old geometry, which may no longer serve the route
+            affected = {
+                bus_id
+                for stop_id in (previous.stop_ids if previous else ())
+                for bus_id in self._arrivals.get(stop_id, ())
+            }
+        affected |= self.matcher.rebuild_route(db, route_id)
+        self.update(affected)
+
+    def update(self, bus_ids: Iterable[int]):
+        """Recompute the predictions of buses whose matched progress changed"""
+        for bus_id in bus_ids:
+            row = self.store.get(bus_id)
+            predictions = []
+            if row is not None and row["is_active"]:
+                for route_id, (progress, offset) in self.store.progress(bus_id).items():
+                    geometry = self.matcher.geometry(route_id)
+                    if geometry is not None and offset <= MAX_OFF_ROUTE_M:
+                        predictions.extend(self._predict(geometry, row, progress))
+            with self._lock:
+                for stop_id in self._bus_stops.pop(bus_id, ()):
+                    buses = self._arrivals.get(stop_id)
+                    if buses is not None:
+                        buses.pop(bus_id, None)
+                        if not buses:
+                            del self._arrivals[stop_id]
+                if predictions:
+                    for prediction in predictions:
+                        self._arrivals.setdefault(prediction["stop_id"], {})[bus_id] = prediction
+                    self._bus_stops[bus_id] = [prediction["stop_id"] for prediction in predictions]
+
+    def arrivals(self, stop_id: int) -> List[dict]:
+        """Predicted arrivals at a stop, soonest first"""
+        with self._lock:
+            predictions = list(self._arrivals.get(stop_id, {}).values())
+        return sorted(predictions, key=lambda prediction: prediction["eta_seconds"])
+
+    @staticmethod
+    def _predict(geometry: RouteGeometry, row: dict, progress: float) -> List[dict]:
+        speed_kmh = row["speed"] if row["speed"] and row["speed"] >= MIN_MOVING_SPEED_KMH else geometry.average_speed_kmh
+        speed_mps = speed_kmh / 3.6
+        fix_time: datetime = row["last_updated"]
+        predictions = []
+        for stop_id, distance in zip(geometry.stop_ids, geometry.cumulative):
+            remaining = distance - progress
+            if remaining <= 0:
+                continue
+            eta_seconds = remaining / speed_mps
+            predictions.append({
+                "stop_id": stop_id,
+                "route_id": geometry.route_id,
+                "bus_id": row["id"],
+                "bus_number": row["bus_number"],
+                "distance_m": round(remaining, 1),
+                "eta_seconds": round(eta_seconds),
+                "expected_arrival": fix_time + timedelta(seconds=eta_seconds),
+                "position_updated": fix_time,
+            })
+        return predictions
+
+eta_engine = EtaEngine(live_locations, map_matcher)
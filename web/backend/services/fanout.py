@@ -0,0 +1,239 @@
+"""
+Pub/sub backends that deliver live location updates to every worker
+
+With several uvicorn workers each process has its own live location
+store and websocket clients. Publishing through a fan-out backend runs
+the handler in every worker, so a fix ingested or broadcast by one
+worker updates the store and reaches the clients of all of them.
+
+Buses, route assignments and stops are cached per worker as well. The
+worker that writes one of them updates its own caches and then sends a
+(kind, id) change to the others, which reload that row from the database.
+"""
+import asyncio
+import logging
+import math
+import os
+import socket
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[List[dict]], Awaitable[None]]
+# ("bus" | "route" | "stop", id) of a row written by another worker
+Change = Tuple[str, int]
+ChangeHandler = Callable[[List[Change]], Awaitable[None]]
+
+# Datagram layout: version:u8 count:u32, then per row
+# bus_id:u32 latitude:f64 longitude:f64 speed:f32 heading:f32 (NaN = unknown) last_updated:f64
+HEADER = struct.Struct("<BI")
+ROW = struct.Struct("<Iddffd")
+FORMAT_VERSION = 1
+# Change datagrams share the header with their own version, then per change kind:u8 id:u32
+CHANGE = struct.Struct("<BI")
+CHANGES_VERSION = 2
+CHANGE_KINDS = ("bus", "route", "stop")
+# Keeps datagrams around 54 KB, well under the default AF_UNIX send buffer
+ROWS_PER_DATAGRAM = 1500
+PEER_REFRESH_SECONDS = 1.0
+
+def encode_rows(rows: List[dict]) -> bytes:
+    buffer = bytearray(HEADER.size + ROW.size * len(rows))
+    HEADER.pack_into(buffer, 0, FORMAT_VERSION, len(rows))
+    offset = HEADER.size
+    for row in rows:
+        ROW.pack_into(
+            buffer,
+            offset,
+            row["bus_id"],
+            row["latitude"],
+            row["longitude"],
+            row["speed"] or 0.0,
+            math.nan if row["heading"] is None else row["heading"],
+            row["last_updated"].timestamp(),
+        )
+        offset += ROW.size
+    return bytes(buffer)
+
+def decode_rows(data: bytes) -> List[dict]:
+    version, count = HEADER.unpack_from(data, 0)
+    if version != FORMAT_VERSION or len(data) != HEADER.size + ROW.size * count:
+        raise ValueError("Malformed fan-out datagram")
+    return [
+        {
+            "bus_id": bus_id,
+            "latitude": latitude,
+            "longitude": longitude,
+            "speed": speed,
+            "heading": None if math.isnan(heading) else heading,
+            "last_updated": datetime.fromtimestamp(updated, tz=timezone.utc),
+        }
+        for bus_id, latitude, longitude, speed, heading, updated in ROW.iter_unpack(data[HEADER.size:])
+    ]
+
+def encode_changes(changes: List[Change]) -> bytes:
+    buffer = bytearray(HEADER.size + CHANGE.size * len(changes))
+    HEADER.pack_into(buffer, 0, CHANGES_VERSION, len(changes))
+    for n, (kind, key) in enumerate(changes):
+        CHANGE.pack_into(buffer, HEADER.size + CHANGE.size * n, CHANGE_KINDS.index(kind), key)
+    return bytes(buffer)
+
+def decode_changes(data: bytes) -> List[Change]:
+    version, count = HEADER.unpack_from(data, 0)
+    if version != CHANGES_VERSION or len(data) != HEADER.size + CHANGE.size * count:
+        raise ValueError("Malformed fan-out datagram")
+    try:
+        return [(CHANGE_KINDS[kind], key) for kind, key in CHANGE.iter_unpack(data[HEADER.size:])]
+    except IndexError:
+        raise ValueError("Unknown change kind in fan-out datagram")
+
+class InProcessBackend:
+    """Single worker: publishing calls the handler directly"""
+
+    def __init__(self):
+        self.handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler, change_handler: Optional[ChangeHandler] = None):
+        self.handler = handler
+
+    async def publish(self, rows: List[dict]):
+        if rows and self.handler is not None:
+            await self.handler(rows)
+
+    def publish_changes(self, changes: List[Change]):
+        """No other workers; the writer has already updated its own caches"""
+
+    async def stop(self):
+        self.handler = None
+
+class UnixSocketBackend:
+    """
+    Several workers on one host, connected by AF_UNIX datagram sockets.
+
+    Every worker binds a socket in a shared directory. Publishing runs the
+    handler locally and sends the rows to every other socket found there;
+    sockets left behind by dead workers are removed on the first failed
+    send. A worker whose receive buffer is full misses the datagram and
+    catches up with the next keyframe. POSIX only.
+
+    Changes go only to the other workers; publish_changes() does not wait
+    on the event loop, so it can be called from request threads.
+    """
+
+    def __init__(self, directory: str, name: Optional[str] = None):
+        self.directory = directory
+        self.path = os.path.join(directory, f"worker-{name or os.getpid()}.sock")
+        self.handler: Optional[Handler] = None
+        self.change_handler: Optional[ChangeHandler] = None
+        self._receiver: Optional[socket.socket] = None
+        self._sender: Optional[socket.socket] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._peers: List[str] = []
+        self._peers_checked = 0.0
+        self._peers_lock = threading.Lock()
+
+    async def start(self, handler: Handler, change_handler: Optional[ChangeHandler] = None):
+        self.handler = handler
+        self.change_handler = change_handler
+        self._loop = asyncio.get_running_loop()
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._receiver.bind(self.path)
+        self._receiver.setblocking(False)
+        self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sender.setblocking(False)
+        self._loop.add_reader(self._receiver.fileno(), self._on_readable)
+
+    async def publish(self, rows: List[dict]):
+        if not rows:
+            return
+        for start in range(0, len(rows), ROWS_PER_DATAGRAM):
+            self._send(encode_rows(rows[start:start + ROWS_PER_DATAGRAM]))
+        if self.handler is not None:
+            await self.handler(rows)
+
+    def publish_changes(self, changes: List[Change]):
+        for start in range(0, len(changes), ROWS_PER_DATAGRAM):
+            self._send(encode_changes(changes[start:start + ROWS_PER_DATAGRAM]))
+
+    async def stop(self):
+        if self._receiver is not None:
+            self._loop.remove_reader(self._receiver.fileno())
+            self._receiver.close()
+            self._receiver = None
+        if self._sender is not None:
+            self._sender.close()
+            self._sender = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def _send(self, payload: bytes):
+        sender = self._sender
+        if sender is None:
+            return
+        for peer in self._current_peers():
+            try:
+                sender.sendto(payload, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                self._forget_peer(peer)
+            except BlockingIOError:
+                logger.warning("Fan-out peer %s is not keeping up; dropping update", peer)
+            except OSError as e:
+                # The socket was closed by stop() while a request thread was sending
+                logger.warning("Fan-out send to %s failed: %s", peer, e)
+
+    def _on_readable(self):
+        while True:
+            try:
+                data = self._receiver.recv(HEADER.size + ROW.size * ROWS_PER_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                return
+            try:
+                if data[:1] == bytes([CHANGES_VERSION]):
+                    if self.change_handler is None:
+                        continue
+                    coro = self.change_handler(decode_changes(data))
+                else:
+                    coro = self.handler(decode_rows(data))
+            except (ValueError, struct.error):
+                logger.warning("Ignoring malformed fan-out datagram")
+                continue
+            task = self._loop.create_task(coro)
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def _current_peers(self) -> List[str]:
+        """Snapshot of the other workers' sockets, rescanned at most every PEER_REFRESH_SECONDS"""
+        with self._peers_lock:
+            now = time.monotonic()
+            if now - self._peers_checked >= PEER_REFRESH_SECONDS:
+                self._peers = [
+                    entry.path for entry in os.scandir(self.directory)
+                    if entry.name.endswith(".sock") and entry.path != self.path
+                ]
+                self._peers_checked = now
+            return list(self._peers)
+
+    def _forget_peer(self, peer: str):
+        with self._peers_lock:
+            if peer in self._peers:
+                self._peers.remove(peer)
+        try:
+            os.unlink(peer)
+        except FileNotFoundError:
+            pass
+
+def create_fanout_backend(name: str, socket_dir: str):
+    """Build the backend selected by WS_FANOUT_BACKEND"""
+    if name == "inprocess":
+        return InProcessBackend()
+    if name == "unix":
+        return UnixSocketBackend(socket_dir)
+    raise ValueError(f"Unknown fan-out backend: {name}")
@@ -0,0 +1,119 @@
+"""
+Incrementally maintained totals for /api/analytics/kpis
+
+The bus, booking and payment write paths add their deltas to the
+kpi_rollup table in the same transaction as the change itself, so
+reading the KPIs sums a few rows instead of running three full-table
+aggregates. Each metric has KPI_ROLLUP_SHARDS rows and a write adds to
+one picked at random, so concurrent write transactions do not all queue
+on one row lock until they commit. Writes made outside the API (seed and
+import scripts) and lost races are corrected by a periodic
+reconciliation that recomputes the totals from the source tables.
+"""
+import asyncio
+import logging
+import random
+from typing import Dict, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal, dialect_insert, lock_table_exclusive, try_advisory_xact_lock
+from models import Booking, BookingStatus, Bus, KPIRollup, Payment, PaymentStatus
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("active_buses", "total_revenue", "passenger_count")
+# Bookings in these states count as passengers
+COUNTED_BOOKING_STATUSES = (BookingStatus.CONFIRMED, BookingStatus.COMPLETED)
+
+def booking_counted(status: Optional[BookingStatus]) -> int:
+    return 1 if status in COUNTED_BOOKING_STATUSES else 0
+
+def adjust(db: Session, **deltas: float):
+    """Add deltas to metrics within the caller's transaction; the caller commits"""
+    insert = dialect_insert(db)
+    for name, delta in deltas.items():
+        if not delta:
+            continue
+        stmt = insert(KPIRollup).values(name=name, shard=random.randrange(settings.KPI_ROLLUP_SHARDS), value=delta)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[KPIRollup.name, KPIRollup.shard],
+            set_={"value": KPIRollup.value + stmt.excluded.value, "updated_at": func.now()},
+        ))
+
+def compute(db: Session) -> Dict[str, float]:
+    """Totals aggregated from the source tables"""
+    return {
+        "active_buses": db.query(func.count(Bus.id)).filter(Bus.is_active == True).scalar(),
+        "total_revenue": db.query(func.sum(Payment.amount)).filter(
+            Payment.status == PaymentStatus.SUCCESS
+        ).scalar() or 0.0,
+        "passenger_count": db.query(func.count(Booking.id)).filter(
+            Booking.status.in_(COUNTED_BOOKING_STATUSES)
+        ).scalar(),
+    }
+
+def reconcile(db: Session) -> Dict[str, float]:
+    """
+    Overwrite the rollup with freshly computed totals; returns the drift
+    per metric, or nothing when another worker is already reconciling.
+
+    The rollup is locked against writes before the totals are computed, so
+    every adjust() is either counted in them or waits and is added on top.
+    """
+    if not try_advisory_xact_lock(db, "kpi_rollup.reconcile"):
+        db.rollback()
+        return {}
+    lock_table_exclusive(db, KPIRollup.__tablename__)
+    current = read_rows(db)
+    totals = compute(db)
+    # The totals go to shard 0 and the other shards start again from zero
+    db.query(KPIRollup).filter(KPIRollup.shard != 0).update({"value": 0.0}, synchronize_session=False)
+    insert = dialect_insert(db)
+    stmt = insert(KPIRollup).values([{"name": name, "shard": 0, "value": value} for name, value in totals.items()])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[KPIRollup.name, KPIRollup.shard],
+        set_={"value": stmt.excluded.value, "updated_at": func.now()},
+    ))
+    db.commit()
+    return {name: totals[name] - current.get(name, 0.0) for name in METRICS}
+
+def read_rows(db: Session) -> Dict[str, float]:
+    return dict(db.query(KPIRollup.name, func.sum(KPIRollup.value)).group_by(KPIRollup.name).all())
+
+def read(db: Session) -> Dict[str, float]:
+    """Current totals, reconciling first if the rollup has never been filled"""
+    values = read_rows(db)
+    if any(name not in values for name in METRICS):
+        reconcile(db)
+        values = read_rows(db)
+    if any(name not in values for name in METRICS):
+        # Another worker is filling the rollup right now
+        values = compute(db)
+    return {
+        "active_buses": int(values["active_buses"]),
+        "total_revenue": values["total_revenue"],
+        "passenger_count": int(values["passenger_count"]),
+    }
+
+def reconcile_kpis() -> Dict[str, float]:
+    """Reconcile using a short-lived session"""
+    db = SessionLocal()
+    try:
+        return reconcile(db)
+    finally:
+        db.close()
+
+async def run_reconcile_loop(interval_seconds: float):
+    """Periodically correct drift between the rollup and the source tables"""
+    while True:
+        try:
+            drift = await run_in_threadpool(reconcile_kpis)
+            if any(abs(value) > 1e-6 for value in drift.values()):
+                logger.info("Corrected KPI rollup drift: %s", drift)
+        except Exception:
+            logger.exception("Failed to reconcile KPI rollup")
+        await asyncio.sleep(interval_seconds)
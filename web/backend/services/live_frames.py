@@ -0,0 +1,142 @@
+"""
+Keyframe and delta framing for the live tracking stream
+"""
+import asyncio
+import logging
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Changes smaller than these are not worth a frame (1e-5 degrees is ~1 m)
+POSITION_EPSILON = 1e-5
+SPEED_EPSILON = 0.5
+HEADING_EPSILON = 1.0
+
+def location_entry(row: dict) -> dict:
+    """Wire representation of a live location store row"""
+    return {
+        "bus_id": row["id"],
+        "latitude": row["latitude"],
+        "longitude": row["longitude"],
+        "speed": row["speed"],
+        "heading": row["heading"],
+    }
+
+def _differs(a: Optional[float], b: Optional[float], epsilon: float) -> bool:
+    if a is None or b is None:
+        return a is not b
+    return math.fabs(a - b) >= epsilon
+
+class DeltaEncoder:
+    """Remembers what was last sent per bus and keeps only the buses that moved"""
+
+    def __init__(self):
+        self._sent: Dict[int, Tuple[float, float, float, Optional[float]]] = {}
+
+    def changed(self, entries: Iterable[dict]) -> List[dict]:
+        """Entries whose position, speed or heading differ from the last sent values"""
+        changed = []
+        for entry in entries:
+            previous = self._sent.get(entry["bus_id"])
+            if previous is not None and not (
+                _differs(previous[0], entry["latitude"], POSITION_EPSILON)
+                or _differs(previous[1], entry["longitude"], POSITION_EPSILON)
+                or _differs(previous[2], entry["speed"], SPEED_EPSILON)
+                or _differs(previous[3], entry["heading"], HEADING_EPSILON)
+            ):
+                continue
+            self._sent[entry["bus_id"]] = (entry["latitude"], entry["longitude"], entry["speed"], entry["heading"])
+            changed.append(entry)
+        return changed
+
+    def reset(self, entries: Iterable[dict]):
+        """Make a full keyframe the new baseline"""
+        self._sent = {
+            entry["bus_id"]: (entry["latitude"], entry["longitude"], entry["speed"], entry["heading"])
+            for entry in entries
+        }
+
+class LiveTrackingStream:
+    """
+    Publishes the live location store as frames through a ConnectionManager.
+
+    Clients get a keyframe with every bus when they connect, then delta
+    frames holding only buses whose position, speed or heading changed.
+    Updates marked with mark_changed() are coalesced and sent as a single
+    delta frame per tick (tick_hz times a second), however many fixes
+    arrive in between; tick listeners get the same set of changed buses.
+    A keyframe goes out to everyone every keyframe_seconds so clients that
+    missed frames resynchronise.
+    """
+
+    def __init__(self, manager, store, keyframe_seconds: float, tick_hz: float = 2.0):
+        self.manager = manager
+        self.store = store
+        self.keyframe_seconds = keyframe_seconds
+        self.tick_seconds = 1.0 / tick_hz
+        self.encoder = DeltaEncoder()
+        self._changed: Set[int] = set()
+        self._tick_listeners: List[Callable[[Set[int]], None]] = []
+
+    def entries(self) -> List[dict]:
+        """Current position of every active bus in wire format"""
+        return [location_entry(row) for row in self.store.snapshot()]
+
+    async def publish_changes(self, bus_ids: Iterable[int]) -> int:
+        """Send a delta frame for the given buses; returns how many had changed"""
+        rows = (self.store.get(bus_id) for bus_id in bus_ids)
+        changed = self.encoder.changed(location_entry(row) for row in rows if row is not None)
+        if changed:
+            await self.manager.publish_frame("delta", changed)
+        return len(changed)
+
+    def add_tick_listener(self, listener: Callable[[Set[int]], None]):
+        """Call listener with the ids of the buses changed since the previous tick"""
+        self._tick_listeners.append(listener)
+
+    def mark_changed(self, bus_ids: Iterable[int]):
+        """Queue buses for the delta frame of the next tick"""
+        self._changed.update(bus_ids)
+
+    async def tick(self) -> int:
+        """Publish one delta frame with every bus changed since the previous tick"""
+        if not self._changed:
+            return 0
+        changed, self._changed = self._changed, set()
+        for listener in self._tick_listeners:
+            try:
+                listener(changed)
+            except Exception:
+                logger.exception("Live tracking tick listener failed")
+        return await self.publish_changes(changed)
+
+    async def run_ticks(self):
+        """Fixed-rate tick loop; a slow tick delays the next one rather than bunching them up"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.tick_seconds
+            delay = next_tick - loop.time()
+            if delay < 0:
+                next_tick -= delay
+                delay = 0
+            await asyncio.sleep(delay)
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Failed to publish live tracking tick")
+
+    async def publish_keyframe(self):
+        entries = self.entries()
+        self.encoder.reset(entries)
+        await self.manager.publish_frame("keyframe", entries)
+
+    async def run_keyframes(self):
+        """Periodic keyframe loop"""
+        while True:
+            await asyncio.sleep(self.keyframe_seconds)
+            try:
+                await self.publish_keyframe()
+            except Exception:
+                logger.exception("Failed to publish live tracking keyframe")
@@ -0,0 +1,72 @@
+"""
+Compact binary encoding of live tracking frames
+
+A frame is a 10-byte header followed by one 16-byte record per bus, all
+little-endian:
+
+    header  version:u8  frame_type:u8  seq:u32  count:u32
+    record  bus_id:u32  latitude:i32  longitude:i32  speed:u16  heading:u16
+
+Coordinates are stored in microdegrees (~0.1 m), speed in 0.1 km/h and
+heading in 0.1 degree units. A heading of 0xFFFF means unknown.
+"""
+import struct
+from typing import Iterable, List
+
+BINARY_SUBPROTOCOL = "dtms.location.v1.binary"
+JSON_SUBPROTOCOL = "dtms.location.v1.json"
+
+FORMAT_VERSION = 1
+FRAME_TYPES = {"keyframe": 0, "delta": 1}
+FRAME_NAMES = {code: name for name, code in FRAME_TYPES.items()}
+
+HEADER = struct.Struct("<BBII")
+RECORD = struct.Struct("<IiiHH")
+NO_HEADING = 0xFFFF
+
+def encode_frame(frame_type: str, seq: int, entries: Iterable[dict]) -> bytes:
+    """Pack a keyframe or delta frame of location entries"""
+    entries = list(entries)
+    buffer = bytearray(HEADER.size + RECORD.size * len(entries))
+    HEADER.pack_into(buffer, 0, FORMAT_VERSION, FRAME_TYPES[frame_type], seq & 0xFFFFFFFF, len(entries))
+    offset = HEADER.size
+    for entry in entries:
+        heading = entry.get("heading")
+        RECORD.pack_into(
+            buffer,
+            offset,
+            entry["bus_id"],
+            round(entry["latitude"] * 1e6),
+            round(entry["longitude"] * 1e6),
+            min(max(round((entry.get("speed") or 0.0) * 10), 0), 0xFFFE),
+            NO_HEADING if heading is None else round((heading % 360) * 10) % 3600,
+        )
+        offset += RECORD.size
+    return bytes(buffer)
+
+def decode_frame(data: bytes) -> dict:
+    """Reference decoder: unpack a binary frame into its JSON form"""
+    version, frame_type, seq, count = HEADER.unpack_from(data, 0)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported frame version: {version}")
+    if len(data) != HEADER.size + RECORD.size * count:
+        raise ValueError("Frame length does not match record count")
+    buses: List[dict] = []
+    for bus_id, lat, lon, speed, heading in RECORD.iter_unpack(data[HEADER.size:]):
+        buses.append({
+            "bus_id": bus_id,
+            "latitude": lat / 1e6,
+            "longitude": lon / 1e6,
+            "speed": speed / 10,
+            "heading": None if heading == NO_HEADING else heading / 10,
+        })
+    return {"type": FRAME_NAMES[frame_type], "seq": seq, "buses": buses}
+
+def choose_subprotocol(offered: Iterable[str]):
+    """Pick the wire format from the client's Sec-WebSocket-Protocol list"""
+    offered = list(offered)
+    if BINARY_SUBPROTOCOL in offered:
+        return BINARY_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in offered:
+        return JSON_SUBPROTOCOL
+    return None
@@ -0,0 +1,309 @@
+"""
+Append-only file store of every accepted bus position
+
+Fixes are appended to one file per bus per UTC day:
+
+    <HISTORY_DIR>/<resolution>/<YYYY-MM-DD>/<bus_id>.bin
+
+Each file is a run of fixed-width little-endian records
+
+    recorded_at:f64 (epoch seconds)  latitude:f64  longitude:f64  speed:f32  heading:f32 (NaN = unknown)
+
+in time order, so a time range inside a day is found by binary search
+over the records without reading the whole file. Once a day is over it
+is downsampled into the 1m and 10m resolutions (last fix per bucket) and
+the raw files are deleted after HISTORY_RAW_RETENTION_DAYS.
+
+Several workers may append to the same files: each raw file is locked
+with flock while it is written, read or downsampled, and a batch older
+than the end of the file is merged in so the file stays in time order.
+Fixes arriving after their bus's day was downsampled are merged into the
+downsampled buckets as well.
+"""
+import asyncio
+import logging
+import math
+import os
+import shutil
+import struct
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; there the files are only safe with one worker
+    fcntl = None
+
+from fastapi.concurrency import run_in_threadpool
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+RECORD = struct.Struct("<dddff")
+TIMESTAMP = struct.Struct("<d")
+
+RAW = "raw"
+# Resolution name -> bucket size in seconds
+DOWNSAMPLED = {"1m": 60, "10m": 600}
+RESOLUTIONS = (RAW,) + tuple(DOWNSAMPLED)
+# Late fixes for a day are still appended this long after it ends
+DAY_CLOSE_GRACE = timedelta(hours=1)
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def _days(start: datetime, end: datetime) -> List[date]:
+    day, last = start.date(), end.date()
+    days = []
+    while day <= last:
+        days.append(day)
+        day += timedelta(days=1)
+    return days
+
+def _bisect(f, count: int, timestamp: float) -> int:
+    """Index of the first record at or after timestamp"""
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        f.seek(mid * RECORD.size)
+        if TIMESTAMP.unpack(f.read(TIMESTAMP.size))[0] < timestamp:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+@contextmanager
+def _locked(f, exclusive: bool):
+    """Hold an flock on an open file, excluding other processes as well as other threads"""
+    if fcntl is None:
+        yield
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+    try:
+        yield
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _records(data: bytes) -> List[tuple]:
+    """Whole records of a file's contents, ignoring a partly written last one"""
+    return list(RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size]))
+
+def _pack(records: Iterable[tuple]) -> bytes:
+    return b"".join(RECORD.pack(*record) for record in records)
+
+def _bucket(records: Iterable[tuple], seconds: int) -> List[tuple]:
+    """Keep the last record of every time bucket"""
+    buckets = {}
+    for record in records:
+        buckets[int(record[0] // seconds)] = record
+    return [buckets[key] for key in sorted(buckets)]
+
+def _point(record) -> dict:
+    recorded_at, latitude, longitude, speed, heading = record
+    return {
+        "recorded_at": datetime.fromtimestamp(recorded_at, tz=timezone.utc),
+        "latitude": latitude,
+        "longitude": longitude,
+        "speed": speed,
+        "heading": None if math.isnan(heading) else heading,
+    }
+
+class LocationHistory:
+    """Day-partitioned position history with background downsampling"""
+
+    def __init__(self, directory: str, raw_retention_days: int = 7, minute_retention_days: int = 90):
+        self.directory = directory
+        self.raw_retention_days = raw_retention_days
+        self.minute_retention_days = minute_retention_days
+        self._lock = threading.Lock()
+        self._pending: List[dict] = []
+        self._write_lock = threading.Lock()
+
+    def record(self, rows: Iterable[dict]):
+        """Queue accepted fixes (rows as produced by LiveLocationStore.fix_rows) for the next flush"""
+        rows = list(rows)
+        if rows:
+            with self._lock:
+                self._pending.extend(rows)
+
+    def flush(self) -> int:
+        """Append queued fixes to their day files; returns the number written"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        files: Dict[Tuple[date, int], List[tuple]] = {}
+        for row in sorted(rows, key=lambda r: (r["bus_id"], r["last_updated"])):
+            recorded_at = _utc(row["last_updated"])
+            files.setdefault((recorded_at.date(), row["bus_id"]), []).append((
+                recorded_at.timestamp(),
+                row["latitude"],
+                row["longitude"],
+                row["speed"] or 0.0,
+                math.nan if row["heading"] is None else row["heading"],
+            ))
+        try:
+            with self._write_lock:
+                for (day, bus_id), records in files.items():
+                    self._append(day, bus_id, records)
+        except Exception:
+            with self._lock:
+                self._pending[:0] = rows
+            raise
+        return len(rows)
+
+    def _append(self, day: date, bus_id: int, records: List[tuple]):
+        """Add time-ordered records to a raw file, and to its downsampled files when the day is compacted"""
+        path = self._path(RAW, day, bus_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "a+b") as f, _locked(f, exclusive=True):
+            size = os.fstat(f.fileno()).st_size
+            size -= size % RECORD.size
+            last = None
+            if size:
+                f.seek(size - RECORD.size)
+                last = TIMESTAMP.unpack(f.read(TIMESTAMP.size))[0]
+            if last is not None and records[0][0] < last:
+                # Another worker appended later fixes first: rewrite the file in time order
+                f.seek(0)
+                merged = sorted(_records(f.read(size)) + records, key=lambda record: record[0])
+                f.truncate(0)
+                f.write(_pack(merged))
+            else:
+                f.write(_pack(records))
+            for resolution, seconds in DOWNSAMPLED.items():
+                target = self._path(resolution, day, bus_id)
+                if os.path.exists(target):
+                    with open(target, "rb") as downsampled:
+                        existing = _records(downsampled.read())
+                    merged = sorted(existing + records, key=lambda record: record[0])
+                    self._write_downsampled(target, _bucket(merged, seconds))
+
+    def query(self, bus_id: int, start: datetime, end: datetime, resolution: str = RAW) -> List[dict]:
+        """Positions of a bus with start <= recorded_at < end, oldest first"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution: {resolution}")
+        start, end = _utc(start), _utc(end)
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        points = []
+        for day in _days(start, end):
+            records = self._read_range(self._path(resolution, day, bus_id), start_ts, end_ts)
+            if records is None and resolution != RAW:
+                # Days not downsampled yet are bucketed from the raw records
+                raw = self._read_range(self._path(RAW, day, bus_id), start_ts, end_ts)
+                records = _bucket(raw or [], DOWNSAMPLED[resolution])
+            points.extend(_point(record) for record in records or ())
+        return points
+
+    def compact(self, now: Optional[datetime] = None) -> int:
+        """
+        Downsample the files of closed days that have no downsampled files
+        yet and drop partitions past their retention. Returns the number of
+        days downsampled.
+        """
+        now = _utc(now or datetime.now(timezone.utc))
+        compacted = 0
+        for day in self._partitions(RAW):
+            day_end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=timezone.utc)
+            if now - day_end < DAY_CLOSE_GRACE:
+                continue
+            if self._downsample(day):
+                compacted += 1
+        self._expire(RAW, now.date() - timedelta(days=self.raw_retention_days))
+        self._expire("1m", now.date() - timedelta(days=self.minute_retention_days))
+        return compacted
+
+    def _bus_ids(self, day: date) -> List[str]:
+        return sorted(name[:-4] for name in os.listdir(self._day_dir(RAW, day)) if name.endswith(".bin"))
+
+    def _downsample(self, day: date) -> bool:
+        """Downsample the raw files of a day not downsampled yet; True when there were any"""
+        downsampled = False
+        for bus_id in self._bus_ids(day):
+            with open(self._path(RAW, day, bus_id), "rb") as f, _locked(f, exclusive=True):
+                # Checked under the lock: another worker may have just done it
+                if os.path.exists(self._path("10m", day, bus_id)):
+                    continue
+                records = _records(f.read())
+                # Each coarser resolution is built from the previous one; 10m is written last
+                for resolution, seconds in DOWNSAMPLED.items():
+                    records = _bucket(records, seconds)
+                    self._write_downsampled(self._path(resolution, day, bus_id), records)
+            downsampled = True
+        return downsampled
+
+    @staticmethod
+    def _write_downsampled(path: str, records: List[tuple]):
+        """Replace a downsampled file at once, so readers see the old or the new buckets"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        staging = f"{path}.{os.getpid()}.tmp"
+        with open(staging, "wb") as f:
+            f.write(_pack(records))
+        os.replace(staging, path)
+
+    @staticmethod
+    def _read_range(path: str, start_ts: float, end_ts: float):
+        """Records of one file inside [start_ts, end_ts), or None when the file does not exist"""
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            return None
+        with f, _locked(f, exclusive=False):
+            count = os.fstat(f.fileno()).st_size // RECORD.size
+            first = _bisect(f, count, start_ts)
+            last = _bisect(f, count, end_ts)
+            f.seek(first * RECORD.size)
+            data = f.read((last - first) * RECORD.size)
+        return list(RECORD.iter_unpack(data))
+
+    def _expire(self, resolution: str, cutoff: date):
+        for day in self._partitions(resolution):
+            if day < cutoff and (resolution != RAW or self._is_downsampled(day)):
+                shutil.rmtree(self._day_dir(resolution, day), ignore_errors=True)
+
+    def _is_downsampled(self, day: date) -> bool:
+        return all(os.path.exists(self._path("10m", day, bus_id)) for bus_id in self._bus_ids(day))
+
+    def _partitions(self, resolution: str) -> List[date]:
+        base = os.path.join(self.directory, resolution)
+        if not os.path.isdir(base):
+            return []
+        days = []
+        for name in os.listdir(base):
+            try:
+                days.append(date.fromisoformat(name))
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def _day_dir(self, resolution: str, day: date) -> str:
+        return os.path.join(self.directory, resolution, day.isoformat())
+
+    def _path(self, resolution: str, day: date, bus_id) -> str:
+        return os.path.join(self._day_dir(resolution, day), f"{bus_id}.bin")
+
+location_history = LocationHistory(
+    settings.HISTORY_DIR,
+    raw_retention_days=settings.HISTORY_RAW_RETENTION_DAYS,
+    minute_retention_days=settings.HISTORY_1M_RETENTION_DAYS,
+)
+
+async def run_history_loop(history: LocationHistory, flush_seconds: float, compact_seconds: float):
+    """Append queued fixes every flush_seconds and compact every compact_seconds"""
+    since_compact = compact_seconds
+    while True:
+        try:
+            await run_in_threadpool(history.flush)
+            if since_compact >= compact_seconds:
+                since_compact = 0.0
+                await run_in_threadpool(history.compact)
+        except Exception:
+            logger.exception("Failed to write bus location history")
+        await asyncio.sleep(flush_seconds)
+        since_compact += flush_seconds
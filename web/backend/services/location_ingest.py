@@ -0,0 +1,79 @@
+"""
+Bulk ingest of vehicle GPS fixes into live_bus_locations
+"""
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from database import dialect_insert
+from models import Bus, LiveBusLocation
+
+# Columns of each upserted row; bus_id is the conflict target, the rest are updated
+UPSERT_COLUMNS = ("bus_id", "latitude", "longitude", "speed", "heading", "last_updated")
+# Bind parameters per statement, the lower of the PostgreSQL (65535) and SQLite (32766) limits
+MAX_BIND_PARAMS = 32766
+# Rows per INSERT statement, one bind parameter per column
+UPSERT_CHUNK_SIZE = MAX_BIND_PARAMS // len(UPSERT_COLUMNS)
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+def latest_fix_per_bus(fixes: Iterable) -> Dict[int, dict]:
+    """Collapse a batch to the newest fix per bus, stamping missing times with now"""
+    now = datetime.now(timezone.utc)
+    latest: Dict[int, dict] = {}
+    for fix in fixes:
+        recorded_at = _as_utc(fix.recorded_at) if fix.recorded_at else now
+        current = latest.get(fix.bus_id)
+        if current is not None and current["last_updated"] >= recorded_at:
+            continue
+        latest[fix.bus_id] = {
+            "bus_id": fix.bus_id,
+            "latitude": fix.latitude,
+            "longitude": fix.longitude,
+            "speed": fix.speed if fix.speed is not None else 0.0,
+            "heading": fix.heading,
+            "last_updated": recorded_at,
+        }
+    return latest
+
+def upsert_live_locations(db: Session, fixes: Iterable) -> Tuple[List[int], List[int], List[int]]:
+    """
+    Write a batch of fixes with one set-based upsert keyed on bus_id.
+
+    A fix only replaces the stored row when it is newer than last_updated,
+    so out-of-order fixes are rejected by the database itself. Returns the
+    accepted, stale and unknown bus ids. The caller owns the commit.
+    """
+    return upsert_location_rows(db, list(latest_fix_per_bus(fixes).values()))
+
+def upsert_location_rows(db: Session, rows: List[dict]) -> Tuple[List[int], List[int], List[int]]:
+    """Upsert rows already collapsed to one per bus (see latest_fix_per_bus)"""
+    if not rows:
+        return [], [], []
+
+    bus_ids = [row["bus_id"] for row in rows]
+    known = set(db.execute(select(Bus.id).where(Bus.id.in_(bus_ids))).scalars())
+    unknown = sorted(bus_id for bus_id in bus_ids if bus_id not in known)
+    rows = [row for row in rows if row["bus_id"] in known]
+
+    insert = dialect_insert(db)
+    accepted = set()
+    for start in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        stmt = insert(LiveBusLocation).values(rows[start:start + UPSERT_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LiveBusLocation.bus_id],
+            set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS[1:]},
+            where=or_(
+                LiveBusLocation.last_updated.is_(None),
+                LiveBusLocation.last_updated < stmt.excluded.last_updated,
+            ),
+        ).returning(LiveBusLocation.bus_id)
+        accepted.update(db.execute(stmt).scalars())
+
+    stale = sorted(row["bus_id"] for row in rows if row["bus_id"] not in accepted)
+    return sorted(accepted), stale, unknown
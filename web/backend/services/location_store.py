@@ -0,0 +1,351 @@
+"""
+In-process store of the latest position per bus with write-behind persistence
+"""
+import asyncio
+import logging
+import math
+import threading
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Bus, LiveBusLocation, Route
+from services.location_ingest import latest_fix_per_bus, upsert_location_rows
+from services.spatial_index import GridIndex
+
+logger = logging.getLogger(__name__)
+
+def _epoch(value: Optional[datetime]) -> float:
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class LiveLocationStore:
+    """
+    Latest fix per bus held in parallel typed arrays.
+
+    A bus id maps to a slot; each column (latitude, longitude, speed,
+    heading, last update time) is an array of doubles indexed by slot, so
+    the whole fleet fits in a few contiguous buffers. Reads never touch the
+    database; positions written through apply() are marked dirty and
+    persisted by flush().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots: Dict[int, int] = {}
+        self._bus_ids = array("q")
+        self._lat = array("d")
+        self._lon = array("d")
+        self._speed = array("d")
+        self._heading = array("d")
+        self._updated = array("d")
+        # bus_id -> (bus_number, registration_number, bus_type, is_active)
+        self._buses: Dict[int, Tuple[str, str, Optional[str], bool]] = {}
+        # Route assignments, used to match positions to route subscriptions
+        self._route_bus: Dict[int, int] = {}
+        self._bus_routes: Dict[int, Set[int]] = {}
+        # Map-matched (distance along route, distance from route) per bus and route
+        self._progress: Dict[int, Dict[int, Tuple[float, float]]] = {}
+        self._dirty: Set[int] = set()
+        # Positions bucketed by grid cell for nearby queries
+        self._grid = GridIndex()
+        self._version = 0
+        self._snapshot_version = -1
+        self._snapshot: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def load(self, db: Session):
+        """Replace the store contents with buses and positions from the database"""
+        buses = db.query(
+            Bus.id, Bus.bus_number, Bus.registration_number, Bus.bus_type, Bus.is_active
+        ).all()
+        locations = db.query(LiveBusLocation).all()
+        assignments = db.query(Route.id, Route.bus_id).filter(Route.bus_id.isnot(None)).all()
+        with self._lock:
+            self._reset()
+            for bus in buses:
+                self._buses[bus.id] = (bus.bus_number, bus.registration_number, bus.bus_type, bool(bus.is_active))
+            for route_id, bus_id in assignments:
+                self._assign(route_id, bus_id)
+            for loc in locations:
+                self._write(loc.bus_id, loc.latitude, loc.longitude, loc.speed, loc.heading, _epoch(loc.last_updated))
+            self._version += 1
+
+    def load_buses(self, db: Session, bus_ids: Iterable[int]):
+        """Register buses created outside the API since the last load"""
+        buses = db.query(Bus).filter(Bus.id.in_(list(bus_ids))).all()
+        for bus in buses:
+            self.register_bus(bus)
+
+    def register_bus(self, bus: Bus):
+        """Add or refresh the descriptive fields of a bus"""
+        with self._lock:
+            self._buses[bus.id] = (bus.bus_number, bus.registration_number, bus.bus_type, bool(bus.is_active))
+            self._version += 1
+
+    def remove_bus(self, bus_id: int):
+        """Drop a bus and its position, moving the last slot into the freed one"""
+        with self._lock:
+            self._buses.pop(bus_id, None)
+            self._dirty.discard(bus_id)
+            self._progress.pop(bus_id, None)
+            self._grid.remove(bus_id)
+            slot = self._slots.pop(bus_id, None)
+            if slot is not None:
+                last = len(self._bus_ids) - 1
+                if slot != last:
+                    moved = self._bus_ids[last]
+                    for column in self._columns():
+                        column[slot] = column[last]
+                    self._slots[moved] = slot
+                for column in self._columns():
+                    column.pop()
+            self._version += 1
+
+    def assign_route(self, route_id: int, bus_id: Optional[int]):
+        """Record the bus serving a route (None to unassign)"""
+        with self._lock:
+            self._unassign(route_id)
+            if bus_id is not None:
+                self._assign(route_id, bus_id)
+
+    def route_ids(self, bus_id: int) -> Tuple[int, ...]:
+        """Routes currently assigned to a bus"""
+        return tuple(self._bus_routes.get(bus_id, ()))
+
+    def route_positions(self, bus_ids: Iterable[int]) -> List[Tuple[int, int, float, float]]:
+        """(bus_id, route_id, latitude, longitude) for every route of the given buses that have a position"""
+        with self._lock:
+            pairs = []
+            for bus_id in bus_ids:
+                slot = self._slots.get(bus_id)
+                if slot is None:
+                    continue
+                for route_id in self._bus_routes.get(bus_id, ()):
+                    pairs.append((bus_id, route_id, self._lat[slot], self._lon[slot]))
+            return pairs
+
+    def set_progress(self, matches: Iterable[Tuple[int, int, float, float]]):
+        """Record map-matched (bus_id, route_id, distance_along, offset); NaN clears the entry"""
+        with self._lock:
+            for bus_id, route_id, progress, offset in matches:
+                if math.isnan(progress) or route_id not in self._bus_routes.get(bus_id, ()):
+                    self._progress.get(bus_id, {}).pop(route_id, None)
+                else:
+                    self._progress.setdefault(bus_id, {})[route_id] = (progress, offset)
+
+    def progress(self, bus_id: int) -> Dict[int, Tuple[float, float]]:
+        """Map-matched (distance along route, distance from route) in meters, by route id"""
+        with self._lock:
+            return dict(self._progress.get(bus_id, {}))
+
+    def apply(self, rows: Iterable[dict], mark_dirty: bool = True) -> Tuple[List[int], List[int], List[int]]:
+        """
+        Apply fixes collapsed to one row per bus (see latest_fix_per_bus).
+
+        A fix older than the held position is rejected, matching the
+        database upsert. Returns the accepted, stale and unknown bus ids.
+        """
+        accepted, stale, unknown = [], [], []
+        with self._lock:
+            for row in rows:
+                bus_id = row["bus_id"]
+                if bus_id not in self._buses:
+                    unknown.append(bus_id)
+                    continue
+                updated = _epoch(row["last_updated"])
+                slot = self._slots.get(bus_id)
+                if slot is not None and self._updated[slot] >= updated:
+                    stale.append(bus_id)
+                    continue
+                self._write(bus_id, row["latitude"], row["longitude"], row["speed"], row["heading"], updated)
+                accepted.append(bus_id)
+            if accepted:
+                if mark_dirty:
+                    self._dirty.update(accepted)
+                self._version += 1
+        return accepted, stale, unknown
+
+    def ingest(self, db: Session, fixes: Iterable) -> Tuple[List[int], List[int], List[int]]:
+        """Apply a batch of fixes, looking up buses the store has not seen yet"""
+        rows = latest_fix_per_bus(fixes)
+        accepted, stale, unknown = self.apply(rows.values())
+        if unknown:
+            self.load_buses(db, unknown)
+            retried, retried_stale, unknown = self.apply([rows[bus_id] for bus_id in unknown])
+            accepted += retried
+            stale += retried_stale
+        return accepted, stale, unknown
+
+    def get(self, bus_id: int) -> Optional[dict]:
+        """Latest position of one bus, or None when it has not reported"""
+        with self._lock:
+            slot = self._slots.get(bus_id)
+            if slot is None:
+                return None
+            return self._row(slot)
+
+    def snapshot(self) -> List[dict]:
+        """
+        Latest position of every active bus.
+
+        The list is rebuilt only when the store has changed since the
+        previous call and is shared between callers, so treat it as
+        read-only.
+        """
+        with self._lock:
+            if self._snapshot_version != self._version:
+                self._snapshot = [
+                    self._row(slot)
+                    for slot, bus_id in enumerate(self._bus_ids)
+                    if bus_id in self._buses and self._buses[bus_id][3]
+                ]
+                self._snapshot_version = self._version
+            return self._snapshot
+
+    def nearby(self, lat: float, lon: float, radius_m: float, limit: int) -> List[dict]:
+        """Active buses within radius_m of a point, nearest first, with distance_m"""
+        with self._lock:
+            found = self._grid.nearby(lat, lon, radius_m, limit, accept=self._is_active)
+            return [
+                {**self._row(self._slots[bus_id]), "distance_m": round(distance, 1)}
+                for bus_id, distance in found
+            ]
+
+    def fix_rows(self, bus_ids: Iterable[int]) -> List[dict]:
+        """Held positions of the given buses in the row format accepted by apply()"""
+        with self._lock:
+            return self._fix_rows(bus_ids)
+
+    def drain_dirty(self) -> List[dict]:
+        """Take the positions changed since the last drain as upsert rows"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            return self._fix_rows(dirty)
+
+    def flush(self, db: Session) -> int:
+        """Persist dirty positions with one upsert; re-queue them if the write fails"""
+        rows = self.drain_dirty()
+        if not rows:
+            return 0
+        try:
+            accepted, _, _ = upsert_location_rows(db, rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                self._dirty.update(row["bus_id"] for row in rows if row["bus_id"] in self._slots)
+            raise
+        return len(accepted)
+
+    def _reset(self):
+        self._slots.clear()
+        for column in self._columns():
+            del column[:]
+        self._buses.clear()
+        self._route_bus.clear()
+        self._bus_routes.clear()
+        self._progress.clear()
+        self._dirty.clear()
+        self._grid.clear()
+
+    def _is_active(self, bus_id: int) -> bool:
+        bus = self._buses.get(bus_id)
+        return bus is not None and bus[3]
+
+    def _assign(self, route_id: int, bus_id: int):
+        self._route_bus[route_id] = bus_id
+        self._bus_routes.setdefault(bus_id, set()).add(route_id)
+
+    def _unassign(self, route_id: int):
+        bus_id = self._route_bus.pop(route_id, None)
+        if bus_id is not None:
+            routes = self._bus_routes.get(bus_id, set())
+            routes.discard(route_id)
+            if not routes:
+                self._bus_routes.pop(bus_id, None)
+            self._progress.get(bus_id, {}).pop(route_id, None)
+
+    def _columns(self):
+        return (self._bus_ids, self._lat, self._lon, self._speed, self._heading, self._updated)
+
+    def _write(self, bus_id, latitude, longitude, speed, heading, updated):
+        slot = self._slots.get(bus_id)
+        values = (
+            bus_id,
+            latitude,
+            longitude,
+            speed if speed is not None else 0.0,
+            heading if heading is not None else math.nan,
+            updated,
+        )
+        if slot is None:
+            self._slots[bus_id] = len(self._bus_ids)
+            for column, value in zip(self._columns(), values):
+                column.append(value)
+        else:
+            for column, value in zip(self._columns(), values):
+                column[slot] = value
+        self._grid.update(bus_id, latitude, longitude)
+
+    def _fix_rows(self, bus_ids: Iterable[int]) -> List[dict]:
+        rows = []
+        for bus_id in bus_ids:
+            slot = self._slots.get(bus_id)
+            if slot is None:
+                continue
+            heading = self._heading[slot]
+            rows.append({
+                "bus_id": bus_id,
+                "latitude": self._lat[slot],
+                "longitude": self._lon[slot],
+                "speed": self._speed[slot],
+                "heading": None if math.isnan(heading) else heading,
+                "last_updated": datetime.fromtimestamp(self._updated[slot], tz=timezone.utc),
+            })
+        return rows
+
+    def _row(self, slot: int) -> dict:
+        bus_id = self._bus_ids[slot]
+        bus_number, registration_number, bus_type, is_active = self._buses.get(bus_id, (None, None, None, False))
+        heading = self._heading[slot]
+        return {
+            "id": bus_id,
+            "bus_number": bus_number,
+            "registration_number": registration_number,
+            "bus_type": bus_type,
+            "is_active": is_active,
+            "latitude": self._lat[slot],
+            "longitude": self._lon[slot],
+            "speed": self._speed[slot],
+            "heading": None if math.isnan(heading) else heading,
+            "last_updated": datetime.fromtimestamp(self._updated[slot], tz=timezone.utc),
+        }
+
+live_locations = LiveLocationStore()
+
+def flush_live_locations() -> int:
+    """Flush the shared store using a short-lived session"""
+    db = SessionLocal()
+    try:
+        return live_locations.flush(db)
+    finally:
+        db.close()
+
+async def run_flush_loop(interval_seconds: float):
+    """Write-behind loop persisting the shared store every interval"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(flush_live_locations)
+        except Exception:
+            logger.exception("Failed to flush live bus locations")
@@ -0,0 +1,176 @@
+"""
+Batch map-matching of live positions onto route polylines
+
+Every route's ordered stops form a polyline. The segments of all routes
+are concatenated into flat NumPy arrays, so snapping the positions of
+every (bus, route) pair that changed during a tick is a handful of array
+operations instead of a Python loop over buses and segments. The result,
+distance along the route and distance from it, is kept in the live
+location store for the ETA engine and other consumers.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from models import Route, Stop
+from services.location_store import live_locations
+from services.spatial_index import haversine_m
+
+METERS_PER_DEGREE = np.pi * 6371000.0 / 180
+DEFAULT_SPEED_KMH = 20.0
+
+class RouteGeometry:
+    """Ordered stops of one route with cumulative distances along them"""
+
+    def __init__(self, route_id: int, stops: List[Tuple[int, float, float]], average_speed_kmh: Optional[float] = None):
+        self.route_id = route_id
+        self.stop_ids = [stop_id for stop_id, _, _ in stops]
+        self.points = [(lat, lon) for _, lat, lon in stops]
+        self.cumulative = [0.0]
+        for (lat1, lon1), (lat2, lon2) in zip(self.points, self.points[1:]):
+            self.cumulative.append(self.cumulative[-1] + haversine_m(lat1, lon1, lat2, lon2))
+        self.average_speed_kmh = average_speed_kmh or DEFAULT_SPEED_KMH
+
+    @classmethod
+    def from_route(cls, route: Route, stops: List[Tuple[int, float, float]]) -> Optional["RouteGeometry"]:
+        """Geometry of a route, or None when fewer than two stops have coordinates"""
+        if len(stops) < 2:
+            return None
+        average = None
+        if route.distance_km and route.estimated_duration_minutes:
+            average = route.distance_km / (route.estimated_duration_minutes / 60)
+        return cls(route.id, stops, average)
+
+class SegmentArrays:
+    """Segments of all routes as parallel arrays, grouped by route in route id order"""
+
+    def __init__(self, geometries: Iterable[RouteGeometry]):
+        geometries = sorted(geometries, key=lambda g: g.route_id)
+        self.route_ids = np.array([g.route_id for g in geometries], dtype=np.int64)
+        counts = [len(g.points) - 1 for g in geometries]
+        self.counts = np.array(counts, dtype=np.int64)
+        self.starts = np.cumsum(self.counts) - self.counts
+
+        lat1, lon1, lat2, lon2, cumulative, length = [], [], [], [], [], []
+        for g in geometries:
+            for i, ((a_lat, a_lon), (b_lat, b_lon)) in enumerate(zip(g.points, g.points[1:])):
+                lat1.append(a_lat)
+                lon1.append(a_lon)
+                lat2.append(b_lat)
+                lon2.append(b_lon)
+                cumulative.append(g.cumulative[i])
+                length.append(g.cumulative[i + 1] - g.cumulative[i])
+        self.lat1 = np.array(lat1)
+        self.lon1 = np.array(lon1)
+        # Local flat projection around each segment start, in meters
+        self.scale = np.cos(np.radians(self.lat1)) * METERS_PER_DEGREE
+        self.sx = (np.array(lon2) - self.lon1) * self.scale
+        self.sy = (np.array(lat2) - self.lat1) * METERS_PER_DEGREE
+        self.length_sq = self.sx * self.sx + self.sy * self.sy
+        self.cumulative = np.array(cumulative)
+        self.length = np.array(length)
+
+    def match(self, route_ids: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Snap each (route, position) pair to the closest point of its route.
+
+        Returns the distance along the route and the distance from it, in
+        meters; both are NaN for routes without geometry.
+        """
+        progress = np.full(len(route_ids), np.nan)
+        offset = np.full(len(route_ids), np.nan)
+        if not len(route_ids) or not len(self.route_ids):
+            return progress, offset
+
+        index = np.minimum(np.searchsorted(self.route_ids, route_ids), len(self.route_ids) - 1)
+        pairs = np.nonzero(self.route_ids[index] == route_ids)[0]
+        if not len(pairs):
+            return progress, offset
+        index = index[pairs]
+
+        # One row per (pair, segment of its route)
+        counts = self.counts[index]
+        group_starts = np.cumsum(counts) - counts
+        pair_of_row = np.repeat(np.arange(len(pairs)), counts)
+        segment = np.repeat(self.starts[index] - group_starts, counts) + np.arange(counts.sum())
+
+        px = (lons[pairs][pair_of_row] - self.lon1[segment]) * self.scale[segment]
+        py = (lats[pairs][pair_of_row] - self.lat1[segment]) * METERS_PER_DEGREE
+        sx, sy, length_sq = self.sx[segment], self.sy[segment], self.length_sq[segment]
+        t = np.divide(px * sx + py * sy, length_sq, out=np.zeros_like(px), where=length_sq > 0)
+        np.clip(t, 0.0, 1.0, out=t)
+        distance = np.hypot(px - t * sx, py - t * sy)
+
+        # Rows are grouped by pair; sorting by distance within groups puts the closest segment first
+        best = np.lexsort((distance, pair_of_row))[group_starts]
+        progress[pairs] = self.cumulative[segment[best]] + t[best] * self.length[segment[best]]
+        offset[pairs] = distance[best]
+        return progress, offset
+
+class MapMatcher:
+    """Keeps each bus's distance along its routes current in the live location store"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._routes: Dict[int, RouteGeometry] = {}
+        self._segments = SegmentArrays([])
+
+    def geometry(self, route_id: int) -> Optional[RouteGeometry]:
+        return self._routes.get(route_id)
+
+    def load(self, db: Session):
+        """Build the geometry of every route from its ordered stops and match every bus"""
+        routes = db.query(Route).all()
+        stops = (
+            db.query(Stop.route_id, Stop.id, Stop.latitude, Stop.longitude)
+            .filter(Stop.latitude.isnot(None), Stop.longitude.isnot(None))
+            .order_by(Stop.route_id, Stop.stop_order)
+            .all()
+        )
+        by_route: Dict[int, List[Tuple[int, float, float]]] = {}
+        for route_id, stop_id, lat, lon in stops:
+            by_route.setdefault(route_id, []).append((stop_id, lat, lon))
+        geometries = {}
+        for route in routes:
+            geometry = RouteGeometry.from_route(route, by_route.get(route.id, []))
+            if geometry is not None:
+                geometries[route.id] = geometry
+        with self._lock:
+            self._routes = geometries
+            self._segments = SegmentArrays(geometries.values())
+        self.update([row["id"] for row in self.store.snapshot()])
+
+    def rebuild_route(self, db: Session, route_id: int) -> Set[int]:
+        """Refresh one route after its stops or timing changed; returns the re-matched buses"""
+        route = db.query(Route).filter(Route.id == route_id).first()
+        geometry = None
+        if route is not None:
+            stops = (
+                db.query(Stop.id, Stop.latitude, Stop.longitude)
+                .filter(Stop.route_id == route_id, Stop.latitude.isnot(None), Stop.longitude.isnot(None))
+                .order_by(Stop.stop_order)
+                .all()
+            )
+            geometry = RouteGeometry.from_route(route, [tuple(stop) for stop in stops])
+        with self._lock:
+            self._routes.pop(route_id, None)
+            if geometry is not None:
+                self._routes[route_id] = geometry
+            self._segments = SegmentArrays(self._routes.values())
+        affected = {route.bus_id} if route is not None and route.bus_id is not None else set()
+        self.update(affected)
+        return affected
+
+    def update(self, bus_ids: Iterable[int]):
+        """Match the current positions of the given buses onto all of their routes"""
+        pairs = self.store.route_positions(bus_ids)
+        if not pairs:
+            return
+        bus_ids, route_ids, lats, lons = (np.array(column) for column in zip(*pairs))
+        progress, offset = self._segments.match(route_ids, lats, lons)
+        self.store.set_progress(zip(bus_ids.tolist(), route_ids.tolist(), progress.tolist(), offset.tolist()))
+
+map_matcher = MapMatcher(live_locations)
@@ -0,0 +1,278 @@
+"""
+Per-trip occupancy and load factor
+
+A trip is one route on one journey date (UTC), operated by the bus
+assigned to the route. trip_occupancy keeps one row per trip with the
+assigned bus, its capacity and the number of booked passengers, so the
+load factor (passengers / capacity) of any set of trips is read without
+scanning bookings. Every booking that is not cancelled holds a seat; the
+booking write paths add or remove passengers in the same transaction as
+the status change.
+
+Reassigning a route or changing a bus's capacity updates the trips from
+today on; past trips keep the bus that was assigned when they were
+booked.
+
+Bookings written outside the API (seed, cleanup and import scripts) and
+lost races are corrected by rebuilding every trip from bookings at
+startup and periodically afterwards. The rebuild only writes the trips
+that drifted, so the booking write paths are not blocked behind it.
+"""
+import asyncio
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import and_, bindparam, func, literal_column, null, or_, select, type_coerce, union_all, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, dialect_insert, try_advisory_xact_lock
+from models import Booking, BookingStatus, Bus, Route, TripOccupancy
+
+logger = logging.getLogger(__name__)
+
+# Bookings in these states hold a seat
+OCCUPYING_BOOKING_STATUSES = (BookingStatus.PENDING, BookingStatus.CONFIRMED, BookingStatus.COMPLETED)
+GROUPINGS = {
+    "route": TripOccupancy.route_id,
+    "bus": TripOccupancy.bus_id,
+    "day": TripOccupancy.journey_date,
+}
+
+def occupies_seat(status: Optional[BookingStatus]) -> int:
+    return 1 if status in OCCUPYING_BOOKING_STATUSES else 0
+
+def journey_day(at: datetime) -> date:
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc)
+    return at.date()
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+def add_passengers(db: Session, route_id: int, at: datetime, count: int):
+    """Add (or with a negative count, remove) passengers of a trip within the caller's transaction"""
+    assignment = db.query(Route.bus_id, Bus.capacity).outerjoin(
+        Bus, Bus.id == Route.bus_id
+    ).filter(Route.id == route_id).first()
+    bus_id, capacity = assignment if assignment else (None, None)
+    insert = dialect_insert(db)
+    stmt = insert(TripOccupancy).values(
+        route_id=route_id, journey_date=journey_day(at), bus_id=bus_id, capacity=capacity, passengers=count
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[TripOccupancy.route_id, TripOccupancy.journey_date],
+        set_={"passengers": TripOccupancy.passengers + stmt.excluded.passengers},
+    ))
+
+def route_reassigned(db: Session, route_id: int, bus_id: Optional[int]):
+    """Move the route's trips from today on to a new bus"""
+    capacity = None
+    if bus_id is not None:
+        capacity = db.query(Bus.capacity).filter(Bus.id == bus_id).scalar()
+    db.query(TripOccupancy).filter(
+        TripOccupancy.route_id == route_id, TripOccupancy.journey_date >= _today()
+    ).update({"bus_id": bus_id, "capacity": capacity}, synchronize_session=False)
+
+def bus_capacity_changed(db: Session, bus_id: int, capacity: Optional[int]):
+    """Apply a new capacity to the bus's trips from today on"""
+    db.query(TripOccupancy).filter(
+        TripOccupancy.bus_id == bus_id, TripOccupancy.journey_date >= _today()
+    ).update({"capacity": capacity}, synchronize_session=False)
+
+def _load_factor():
+    return TripOccupancy.passengers * 1.0 / TripOccupancy.capacity
+
+def trips(
+    db: Session,
+    start: date,
+    end: date,
+    sort: str = "overcrowded",
+    limit: int = 20,
+    route_id: Optional[int] = None,
+    bus_id: Optional[int] = None
+) -> List[dict]:
+    """Trips between start and end (inclusive) by load factor, fullest first for overcrowded"""
+    load_factor = _load_factor()
+    query = db.query(
+        TripOccupancy, Route.route_name, Bus.bus_number, load_factor
+    ).join(
+        Route, Route.id == TripOccupancy.route_id
+    ).outerjoin(
+        Bus, Bus.id == TripOccupancy.bus_id
+    ).filter(
+        TripOccupancy.journey_date >= start,
+        TripOccupancy.journey_date <= end,
+        TripOccupancy.capacity > 0,
+        TripOccupancy.passengers > 0
+    )
+    if route_id is not None:
+        query = query.filter(TripOccupancy.route_id == route_id)
+    if bus_id is not None:
+        query = query.filter(TripOccupancy.bus_id == bus_id)
+    order = load_factor.desc() if sort == "overcrowded" else load_factor.asc()
+    rows = query.order_by(order, TripOccupancy.journey_date, TripOccupancy.route_id).limit(limit).all()
+    return [
+        {
+            "route_id": trip.route_id,
+            "route_name": route_name,
+            "journey_date": trip.journey_date,
+            "bus_id": trip.bus_id,
+            "bus_number": bus_number,
+            "capacity": trip.capacity,
+            "passengers": trip.passengers,
+            "load_factor": factor,
+        }
+        for trip, route_name, bus_number, factor in rows
+    ]
+
+def summary(db: Session, start: date, end: date, group_by: str) -> List[dict]:
+    """Load factor of all seats offered between start and end per route, bus or day"""
+    key = GROUPINGS[group_by]
+    rows = db.query(
+        key,
+        func.count(),
+        func.sum(TripOccupancy.passengers),
+        func.sum(TripOccupancy.capacity)
+    ).filter(
+        TripOccupancy.journey_date >= start,
+        TripOccupancy.journey_date <= end,
+        TripOccupancy.capacity > 0,
+        TripOccupancy.passengers > 0
+    ).group_by(key).order_by(key).all()
+    return [
+        {
+            key.key: value,
+            "trips": count,
+            "passengers": passengers,
+            "seats": seats,
+            "load_factor": passengers / seats,
+        }
+        for value, count, passengers, seats in rows
+    ]
+
+def _journey_day_sql(db: Session, column):
+    """SQL expression for journey_day() of a timestamp column"""
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column)
+    return func.date(func.timezone(literal_column("'UTC'"), column))
+
+def _drifted_trips(db: Session) -> list:
+    """
+    (route_id, journey_date, passengers, stored passengers, bus_id,
+    capacity, stored bus_id, stored capacity) of every trip whose stored
+    row differs from its bookings and the current assignment of its route.
+
+    Read in a single statement, so bookings and trips come from one
+    snapshot, in which the write paths have updated both together.
+    """
+    day = _journey_day_sql(db, Booking.journey_date)
+    expected = select(
+        Booking.route_id, day, Route.bus_id, Bus.capacity, func.count(Booking.id)
+    ).select_from(Booking).join(
+        Route, Route.id == Booking.route_id
+    ).outerjoin(
+        Bus, Bus.id == Route.bus_id
+    ).where(
+        Booking.status.in_(OCCUPYING_BOOKING_STATUSES)
+    ).group_by(Booking.route_id, day, Route.bus_id, Bus.capacity).subquery()
+    route_id, journey_date, bus_id, capacity, count = expected.c
+    both = union_all(
+        select(
+            route_id.label("route_id"),
+            # Parsed as a date, like the stored column, on SQLite as well
+            type_coerce(journey_date, TripOccupancy.journey_date.type).label("journey_date"),
+            count.label("expected"),
+            literal_column("0").label("stored"),
+            bus_id.label("bus_id"),
+            capacity.label("capacity"),
+            null().label("stored_bus_id"),
+            null().label("stored_capacity"),
+        ),
+        select(
+            TripOccupancy.route_id, TripOccupancy.journey_date, literal_column("0"), TripOccupancy.passengers,
+            null(), null(), TripOccupancy.bus_id, TripOccupancy.capacity,
+        ),
+    ).subquery()
+    c = both.c
+    passengers, stored = func.sum(c.expected), func.sum(c.stored)
+    bus_id, stored_bus_id = func.max(c.bus_id), func.max(c.stored_bus_id)
+    capacity, stored_capacity = func.max(c.capacity), func.max(c.stored_capacity)
+    return db.execute(
+        select(
+            c.route_id, c.journey_date, passengers, stored, bus_id, capacity, stored_bus_id, stored_capacity
+        ).group_by(c.route_id, c.journey_date).having(or_(
+            passengers != stored,
+            # Trips without bookings keep the bus they had
+            and_(passengers > 0, or_(
+                bus_id.is_distinct_from(stored_bus_id), capacity.is_distinct_from(stored_capacity)
+            )),
+        ))
+    ).all()
+
+def rebuild(db: Session) -> bool:
+    """
+    Recompute every trip from bookings, attributing all of them to the
+    current assignments, and correct the ones that drifted in one
+    transaction; returns False without changes when another worker is
+    already rebuilding. Trips that match are not written, so only the
+    corrected rows are locked until the commit.
+    """
+    if not try_advisory_xact_lock(db, "occupancy.rebuild"):
+        db.rollback()
+        return False
+    added, reassigned = [], []
+    for route_id, day, passengers, stored, bus_id, capacity, stored_bus_id, stored_capacity in _drifted_trips(db):
+        if passengers != stored:
+            # Added as a difference, keeping bookings written since the snapshot
+            added.append({
+                "route_id": route_id,
+                "journey_date": day,
+                "bus_id": bus_id if passengers else stored_bus_id,
+                "capacity": capacity if passengers else stored_capacity,
+                "passengers": passengers - stored,
+            })
+        if passengers and (bus_id, capacity) != (stored_bus_id, stored_capacity):
+            reassigned.append({
+                "trip_route_id": route_id,
+                "trip_date": day,
+                "seen_bus_id": stored_bus_id,
+                "seen_capacity": stored_capacity,
+                "new_bus_id": bus_id,
+                "new_capacity": capacity,
+            })
+    if added:
+        stmt = dialect_insert(db)(TripOccupancy).values(added)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[TripOccupancy.route_id, TripOccupancy.journey_date],
+            set_={"passengers": TripOccupancy.passengers + stmt.excluded.passengers},
+        ))
+    if reassigned:
+        # Only where the row still holds what the snapshot saw, so a reassignment made since is kept
+        trips = TripOccupancy.__table__
+        db.execute(update(trips).where(
+            trips.c.route_id == bindparam("trip_route_id"),
+            trips.c.journey_date == bindparam("trip_date"),
+            trips.c.bus_id.is_not_distinct_from(bindparam("seen_bus_id")),
+            trips.c.capacity.is_not_distinct_from(bindparam("seen_capacity")),
+        ).values(bus_id=bindparam("new_bus_id"), capacity=bindparam("new_capacity")), reassigned)
+    db.commit()
+    return True
+
+def rebuild_trips() -> bool:
+    """Rebuild using a short-lived session"""
+    db = SessionLocal()
+    try:
+        return rebuild(db)
+    finally:
+        db.close()
+
+async def run_rebuild_loop(interval_seconds: float):
+    """Rebuild the trips now and then periodically, correcting drift from writes outside the API"""
+    while True:
+        try:
+            await run_in_threadpool(rebuild_trips)
+        except Exception:
+            logger.exception("Failed to rebuild trip occupancy")
+        await asyncio.sleep(interval_seconds)
@@ -0,0 +1,319 @@
+"""
+Approximate streaming analytics over bookings
+
+Every booking created through the API updates, in constant memory:
+
+- a HyperLogLog per (route, journey day) estimating distinct passengers,
+  with a standard error of 1.04 / sqrt(2 ** HLL_PRECISION) (about 1.6%)
+  in 4 KiB;
+- a count-min sketch per journey day with a top-K candidate list
+  estimating the busiest routes. Estimates never undercount; they
+  overcount by at most e / CMS_WIDTH of the day's bookings (about 0.13%)
+  with probability 1 - e ** -CMS_DEPTH (about 99.3%), in 80 KiB.
+
+Sketches live in memory and are persisted to the analytics_sketches
+table periodically. Persisting merges with what other workers stored:
+HyperLogLog registers by maximum, count-min counters by adding this
+worker's increments since the last persist. Bookings are counted when
+created; later cancellations are not subtracted. Database reads and
+writes happen outside the lock guarding the in-memory sketches, so
+recording a booking never waits for a persist in progress.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import threading
+from array import array
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from config import settings
+from database import SessionLocal
+from models import AnalyticsSketch, Booking
+
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = 12
+CMS_WIDTH = 2048
+CMS_DEPTH = 5
+TOP_K_CAPACITY = 50
+
+HLL_STANDARD_ERROR = 1.04 / math.sqrt(2 ** HLL_PRECISION)
+CMS_EPSILON = math.e / CMS_WIDTH
+CMS_DELTA = math.exp(-CMS_DEPTH)
+
+def _hash(value: str, size: int = 8) -> bytes:
+    return hashlib.blake2b(value.encode("utf-8"), digest_size=size).digest()
+
+class HyperLogLog:
+    """Distinct count estimate in 2 ** precision one-byte registers"""
+
+    def __init__(self, precision: int = HLL_PRECISION, registers: Optional[bytes] = None):
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    def add(self, value: str):
+        h = int.from_bytes(_hash(value), "big")
+        bits = 64 - self.precision
+        index = h >> bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small cardinalities
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+class TopK:
+    """Count-min sketch of item counts plus the heaviest items seen so far"""
+
+    def __init__(self, width: int = CMS_WIDTH, depth: int = CMS_DEPTH, capacity: int = TOP_K_CAPACITY):
+        self.width = width
+        self.depth = depth
+        self.capacity = capacity
+        self.counts = array("q", bytes(8 * width * depth))
+        # Increments not yet added to the stored sketch
+        self.pending = array("q", bytes(8 * width * depth))
+        self.candidates: Dict[int, int] = {}
+
+    def _cells(self, item: int) -> List[int]:
+        digest = _hash(str(item), 16)
+        h1, h2 = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def estimate(self, item: int) -> int:
+        return min(self.counts[cell] for cell in self._cells(item))
+
+    def total(self) -> int:
+        return sum(self.counts[:self.width])
+
+    def add(self, item: int, count: int = 1):
+        for cell in self._cells(item):
+            self.counts[cell] += count
+            self.pending[cell] += count
+        self._offer(item, self.estimate(item))
+
+    def _offer(self, item: int, estimate: int):
+        if item in self.candidates or len(self.candidates) < self.capacity:
+            self.candidates[item] = estimate
+            return
+        lightest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[lightest]:
+            del self.candidates[lightest]
+            self.candidates[item] = estimate
+
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        return sorted(self.candidates.items(), key=lambda pair: (-pair[1], pair[0]))[:k]
+
+    def add_pending(self, other: "TopK"):
+        """Add the increments another sketch has not persisted to this one"""
+        for cell, count in enumerate(other.pending):
+            if count:
+                self.counts[cell] += count
+                self.pending[cell] += count
+        for item in other.candidates:
+            self._offer(item, self.estimate(item))
+
+    def merged_with(self, stored: Optional["TopK"]) -> "TopK":
+        """A stored sketch plus the pending increments of this one"""
+        merged = TopK(self.width, self.depth, self.capacity)
+        items = set(self.candidates)
+        if stored is not None:
+            merged.counts = array("q", (a + b for a, b in zip(stored.counts, self.pending)))
+            items |= set(stored.candidates)
+        else:
+            merged.counts = array("q", self.pending)
+        for item in sorted(items, key=merged.estimate, reverse=True)[:self.capacity]:
+            merged.candidates[item] = merged.estimate(item)
+        return merged
+
+    def to_bytes(self) -> bytes:
+        items = array("q", sorted(self.candidates))
+        return array("q", [len(items)]).tobytes() + items.tobytes() + self.counts.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "TopK":
+        sketch = cls()
+        header = array("q", data[:8])[0]
+        items = array("q", data[8:8 + 8 * header])
+        sketch.counts = array("q", data[8 + 8 * header:])
+        sketch.candidates = {item: sketch.estimate(item) for item in items}
+        return sketch
+
+# (kind, sketch key, day)
+SketchId = Tuple[str, str, date]
+HLL = "hll"
+CMS = "cms"
+ROUTES_KEY = "routes"
+
+def _journey_day(booking: Booking) -> date:
+    at = booking.journey_date
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc)
+    return at.date()
+
+class BookingSketches:
+    """Distinct passengers per route per day and busiest routes per day"""
+
+    def __init__(self, retention_days: int = 31):
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._sketches: Dict[SketchId, object] = {}
+        self._dirty = set()
+
+    def _read(self, db: Session, sketch_id: SketchId):
+        kind, key, day = sketch_id
+        row = db.query(AnalyticsSketch).filter(
+            AnalyticsSketch.kind == kind, AnalyticsSketch.sketch_key == key, AnalyticsSketch.day == day
+        ).first()
+        if kind == HLL:
+            return HyperLogLog(registers=row.data if row else None)
+        return TopK.from_bytes(row.data) if row else TopK()
+
+    def _sketch(self, db: Session, sketch_id: SketchId):
+        """The cached sketch, read from the database on first use since the last persist; call without the lock"""
+        with self._lock:
+            sketch = self._sketches.get(sketch_id)
+        if sketch is None:
+            loaded = self._read(db, sketch_id)
+            with self._lock:
+                sketch = self._sketches.setdefault(sketch_id, loaded)
+        return sketch
+
+    def record(self, db: Session, booking: Booking):
+        """Count a newly created booking; call after it was committed"""
+        day = _journey_day(booking)
+        passenger = f"{booking.user_id}:{booking.passenger_name.strip().lower()}"
+        hll_id = (HLL, f"route:{booking.route_id}", day)
+        cms_id = (CMS, ROUTES_KEY, day)
+        while True:
+            hll, cms = self._sketch(db, hll_id), self._sketch(db, cms_id)
+            with self._lock:
+                # A persist may have taken the sketches since; then count in the new ones
+                if self._sketches.get(hll_id) is hll and self._sketches.get(cms_id) is cms:
+                    hll.add(passenger)
+                    cms.add(booking.route_id)
+                    self._dirty.update((hll_id, cms_id))
+                    return
+
+    def distinct_passengers(self, db: Session, day: date, route_id: int) -> int:
+        sketch = self._sketch(db, (HLL, f"route:{route_id}", day))
+        with self._lock:
+            return sketch.count()
+
+    def distinct_passengers_by_route(self, db: Session, day: date) -> Dict[int, int]:
+        keys = {key for key, in db.query(AnalyticsSketch.sketch_key).filter(
+            AnalyticsSketch.kind == HLL, AnalyticsSketch.day == day
+        )}
+        with self._lock:
+            keys |= {key for kind, key, d in self._sketches if kind == HLL and d == day}
+        sketches = {int(key.split(":")[1]): self._sketch(db, (HLL, key, day)) for key in keys}
+        with self._lock:
+            return {route_id: sketch.count() for route_id, sketch in sketches.items()}
+
+    def top_routes(self, db: Session, day: date, k: int) -> Tuple[List[Tuple[int, int]], int]:
+        """The k busiest routes with estimated bookings, and the day's total bookings"""
+        sketch = self._sketch(db, (CMS, ROUTES_KEY, day))
+        with self._lock:
+            return sketch.top(k), sketch.total()
+
+    def _save(self, db: Session, sketch_id: SketchId, merge: Callable[[Optional[bytes]], bytes]):
+        kind, key, day = sketch_id
+        for attempt in range(2):
+            try:
+                row = db.query(AnalyticsSketch).filter(
+                    AnalyticsSketch.kind == kind, AnalyticsSketch.sketch_key == key, AnalyticsSketch.day == day
+                ).with_for_update().first()
+                data = merge(row.data if row else None)
+                if row is None:
+                    db.add(AnalyticsSketch(kind=kind, sketch_key=key, day=day, data=data))
+                elif data != row.data:
+                    row.data = data
+                db.commit()
+                return
+            except IntegrityError:
+                # Another worker inserted the row first; merge into theirs
+                db.rollback()
+                if attempt:
+                    raise
+
+    def _restore(self, unsaved: Dict[SketchId, object]):
+        """Put back the changes of sketches a failed persist did not save, for the next persist"""
+        with self._lock:
+            for sketch_id, sketch in unsaved.items():
+                current = self._sketches.get(sketch_id)
+                if current is None:
+                    self._sketches[sketch_id] = sketch
+                elif sketch_id[0] == HLL:
+                    current.merge(sketch)
+                else:
+                    current.add_pending(sketch)
+                self._dirty.add(sketch_id)
+
+    def persist(self, db: Session, today: Optional[date] = None):
+        """
+        Merge the sketches changed since the last persist into their stored
+        copies and expire old days. The cache is emptied at the start, so
+        bookings recorded meanwhile go to freshly read sketches and later
+        reads pick up what other workers stored.
+        """
+        with self._lock:
+            cached, self._sketches = self._sketches, {}
+            dirty, self._dirty = self._dirty, set()
+        unsaved = {sketch_id: cached[sketch_id] for sketch_id in dirty}
+        try:
+            for sketch_id in dirty:
+                sketch = unsaved[sketch_id]
+                if sketch_id[0] == HLL:
+                    def merge(stored, sketch=sketch):
+                        merged = HyperLogLog(registers=stored)
+                        merged.merge(sketch)
+                        return merged.to_bytes()
+                else:
+                    def merge(stored, sketch=sketch):
+                        return sketch.merged_with(TopK.from_bytes(stored) if stored is not None else None).to_bytes()
+                self._save(db, sketch_id, merge)
+                del unsaved[sketch_id]
+        finally:
+            if unsaved:
+                self._restore(unsaved)
+
+        cutoff = (today or datetime.now(timezone.utc).date()) - timedelta(days=self.retention_days)
+        db.query(AnalyticsSketch).filter(AnalyticsSketch.day < cutoff).delete()
+        db.commit()
+
+booking_sketches = BookingSketches(settings.SKETCH_RETENTION_DAYS)
+
+def persist_sketches():
+    """Persist using a short-lived session"""
+    db = SessionLocal()
+    try:
+        booking_sketches.persist(db)
+    finally:
+        db.close()
+
+async def run_persist_loop(interval_seconds: float):
+    """Periodically merge the in-memory sketches with the stored ones"""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await run_in_threadpool(persist_sketches)
+        except Exception:
+            logger.exception("Failed to persist analytics sketches")
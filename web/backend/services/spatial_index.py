@@ -0,0 +1,141 @@
+"""
+Uniform grid spatial index for nearby bus and stop queries
+"""
+import math
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from models import Stop
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_DEGREE_LAT = 111320.0
+# ~1.1 km cells: a 1 km query visits at most 3 x 3 cells
+GRID_CELL_DEGREES = 0.01
+# Upper bound on the radius accepted by the /nearby endpoints
+MAX_NEARBY_RADIUS_M = 10000
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+class GridIndex:
+    """
+    Points bucketed into fixed-size lat/lon cells.
+
+    A radius query only visits the cells overlapping the search circle,
+    so its cost depends on how many points are nearby rather than on the
+    total number of points indexed.
+    """
+
+    def __init__(self, cell_degrees: float = GRID_CELL_DEGREES):
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._cells: Dict[Tuple[int, int], Dict[Hashable, Tuple[float, float]]] = {}
+        self._where: Dict[Hashable, Tuple[int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def clear(self):
+        with self._lock:
+            self._cells.clear()
+            self._where.clear()
+
+    def update(self, key: Hashable, lat: float, lon: float):
+        cell = self._cell(lat, lon)
+        with self._lock:
+            previous = self._where.get(key)
+            if previous is not None and previous != cell:
+                self._remove_from_cell(previous, key)
+            self._cells.setdefault(cell, {})[key] = (lat, lon)
+            self._where[key] = cell
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            cell = self._where.pop(key, None)
+            if cell is not None:
+                self._remove_from_cell(cell, key)
+
+    def nearby(
+        self,
+        lat: float,
+        lon: float,
+        radius_m: float,
+        limit: int,
+        accept: Optional[Callable[[Hashable], bool]] = None
+    ) -> List[Tuple[Hashable, float]]:
+        """Keys within radius_m of the point as (key, distance), nearest first"""
+        dlat = radius_m / METERS_PER_DEGREE_LAT
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        low = self._cell(lat - dlat, lon - dlon)
+        high = self._cell(lat + dlat, lon + dlon)
+
+        found = []
+        with self._lock:
+            for i in range(low[0], high[0] + 1):
+                for j in range(low[1], high[1] + 1):
+                    for key, (point_lat, point_lon) in self._cells.get((i, j), {}).items():
+                        distance = haversine_m(lat, lon, point_lat, point_lon)
+                        if distance <= radius_m and (accept is None or accept(key)):
+                            found.append((key, distance))
+        found.sort(key=lambda item: item[1])
+        return found[:limit]
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_degrees), math.floor(lon / self.cell_degrees))
+
+    def _remove_from_cell(self, cell: Tuple[int, int], key: Hashable):
+        points = self._cells.get(cell)
+        if points is not None:
+            points.pop(key, None)
+            if not points:
+                del self._cells[cell]
+
+class StopIndex:
+    """Stop rows held in memory with a grid over their coordinates"""
+
+    def __init__(self):
+        self.grid = GridIndex()
+        self._stops: Dict[int, dict] = {}
+
+    def load(self, db: Session):
+        stops = db.query(Stop).filter(Stop.latitude.isnot(None), Stop.longitude.isnot(None)).all()
+        self.grid.clear()
+        self._stops = {}
+        for stop in stops:
+            self.upsert(stop)
+
+    def upsert(self, stop: Stop):
+        if stop.latitude is None or stop.longitude is None:
+            self.remove(stop.id)
+            return
+        self._stops[stop.id] = {
+            "id": stop.id,
+            "route_id": stop.route_id,
+            "stop_name": stop.stop_name,
+            "stop_order": stop.stop_order,
+            "latitude": stop.latitude,
+            "longitude": stop.longitude,
+            "estimated_arrival_time": stop.estimated_arrival_time,
+            "created_at": stop.created_at,
+        }
+        self.grid.update(stop.id, stop.latitude, stop.longitude)
+
+    def remove(self, stop_id: int):
+        self._stops.pop(stop_id, None)
+        self.grid.remove(stop_id)
+
+    def nearby(self, lat: float, lon: float, radius_m: float, limit: int) -> List[dict]:
+        return [
+            {**self._stops[stop_id], "distance_m": round(distance, 1)}
+            for stop_id, distance in self.grid.nearby(lat, lon, radius_m, limit)
+            if stop_id in self._stops
+        ]
+
+stop_index = StopIndex()
@@ -0,0 +1,135 @@
+"""
+Index from live tracking subscriptions to the connections interested in them
+"""
+import math
+from typing import Dict, Hashable, Iterable, Set, Tuple
+
+# Bounding boxes are bucketed into a grid of this many degrees (~5.5 km of latitude)
+BBOX_CELL_DEGREES = 0.05
+# Boxes spanning more cells than this are kept in a list and checked directly
+MAX_BBOX_CELLS = 400
+
+BBox = Tuple[float, float, float, float]  # (min_lat, min_lon, max_lat, max_lon)
+
+# Message field carrying each kind of topic
+TOPIC_FIELDS = {"route": "route_id", "bus": "bus_id", "bbox": "bbox"}
+
+def _cell(lat: float, lon: float) -> Tuple[int, int]:
+    return (math.floor(lat / BBOX_CELL_DEGREES), math.floor(lon / BBOX_CELL_DEGREES))
+
+def _contains(bbox: BBox, lat: float, lon: float) -> bool:
+    return bbox[0] <= lat <= bbox[2] and bbox[1] <= lon <= bbox[3]
+
+class SubscriptionIndex:
+    """
+    Maps subscription keys to subscribers so an update is matched in
+    roughly constant time instead of by scanning every connection.
+
+    Route and bus subscriptions are exact keys. Bounding boxes are
+    registered in every grid cell they overlap; a position then only has
+    to be checked against the boxes registered in its own cell.
+    """
+
+    def __init__(self):
+        self._by_key: Dict[Tuple[str, int], Set[Hashable]] = {}
+        self._by_cell: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._wide: Set[Hashable] = set()
+        self._keys: Dict[Hashable, Set[Tuple[str, int]]] = {}
+        self._bboxes: Dict[Hashable, Set[BBox]] = {}
+
+    def has_subscriptions(self, subscriber: Hashable) -> bool:
+        return bool(self._keys.get(subscriber)) or bool(self._bboxes.get(subscriber))
+
+    def subscribe(self, subscriber: Hashable, kind: str, value):
+        if kind == "bbox":
+            self._add_bbox(subscriber, value)
+        else:
+            key = (kind, value)
+            self._by_key.setdefault(key, set()).add(subscriber)
+            self._keys.setdefault(subscriber, set()).add(key)
+
+    def unsubscribe(self, subscriber: Hashable, kind: str, value):
+        if kind == "bbox":
+            self._remove_bbox(subscriber, value)
+        else:
+            key = (kind, value)
+            self._discard(self._by_key, key, subscriber)
+            self._keys.get(subscriber, set()).discard(key)
+
+    def remove(self, subscriber: Hashable):
+        """Forget every subscription held by a subscriber"""
+        for key in self._keys.pop(subscriber, set()):
+            self._discard(self._by_key, key, subscriber)
+        for bbox in list(self._bboxes.get(subscriber, ())):
+            self._remove_bbox(subscriber, bbox)
+        self._bboxes.pop(subscriber, None)
+
+    def match(self, bus_id: int, route_ids: Iterable[int], lat: float, lon: float) -> Set[Hashable]:
+        """Subscribers interested in a position of the given bus"""
+        matched = set(self._by_key.get(("bus", bus_id), ()))
+        for route_id in route_ids:
+            matched.update(self._by_key.get(("route", route_id), ()))
+        if lat is not None and lon is not None:
+            candidates = self._by_cell.get(_cell(lat, lon), set()) | self._wide
+            for subscriber in candidates:
+                if subscriber not in matched and any(
+                    _contains(bbox, lat, lon) for bbox in self._bboxes.get(subscriber, ())
+                ):
+                    matched.add(subscriber)
+        return matched
+
+    def _cells(self, bbox: BBox):
+        low, high = _cell(bbox[0], bbox[1]), _cell(bbox[2], bbox[3])
+        if (high[0] - low[0] + 1) * (high[1] - low[1] + 1) > MAX_BBOX_CELLS:
+            return None
+        return [(i, j) for i in range(low[0], high[0] + 1) for j in range(low[1], high[1] + 1)]
+
+    def _add_bbox(self, subscriber: Hashable, bbox: BBox):
+        self._bboxes.setdefault(subscriber, set()).add(bbox)
+        cells = self._cells(bbox)
+        if cells is None:
+            self._wide.add(subscriber)
+            return
+        for cell in cells:
+            self._by_cell.setdefault(cell, set()).add(subscriber)
+
+    def _remove_bbox(self, subscriber: Hashable, bbox: BBox):
+        boxes = self._bboxes.get(subscriber)
+        if not boxes or bbox not in boxes:
+            return
+        boxes.discard(bbox)
+        # Cells shared with another of the subscriber's boxes stay registered
+        keep = set()
+        wide = False
+        for other in boxes:
+            cells = self._cells(other)
+            if cells is None:
+                wide = True
+            else:
+                keep.update(cells)
+        if not wide:
+            self._wide.discard(subscriber)
+        for cell in self._cells(bbox) or ():
+            if cell not in keep:
+                self._discard(self._by_cell, cell, subscriber)
+
+    @staticmethod
+    def _discard(index: dict, key, subscriber: Hashable):
+        subscribers = index.get(key)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del index[key]
+
+def parse_topic(request: dict) -> Tuple[str, object]:
+    """Read the topic of a subscribe/unsubscribe message as (kind, value)"""
+    if TOPIC_FIELDS["route"] in request:
+        return "route", int(request[TOPIC_FIELDS["route"]])
+    if TOPIC_FIELDS["bus"] in request:
+        return "bus", int(request[TOPIC_FIELDS["bus"]])
+    if TOPIC_FIELDS["bbox"] in request:
+        min_lat, min_lon, max_lat, max_lon = (float(v) for v in request[TOPIC_FIELDS["bbox"]])
+        if not (-90 <= min_lat <= max_lat <= 90 and -180 <= min_lon <= max_lon <= 180):
+            raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon]")
+        return "bbox", (min_lat, min_lon, max_lat, max_lon)
+    raise ValueError("Expected route_id, bus_id or bbox")
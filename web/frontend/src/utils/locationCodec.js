@@ -0,0 +1,38 @@
+// Reference decoder for binary live tracking frames
+// Format documented in web/backend/services/location_codec.py
+
+export const BINARY_SUBPROTOCOL = 'dtms.location.v1.binary'
+
+const HEADER_SIZE = 10
+const RECORD_SIZE = 16
+const NO_HEADING = 0xffff
+const FRAME_NAMES = ['keyframe', 'delta']
+
+// Decode an ArrayBuffer into { type, seq, buses } matching the JSON frames
+export function decodeLocationFrame(buffer) {
+  const view = new DataView(buffer)
+  const version = view.getUint8(0)
+  if (version !== 1) {
+    throw new Error(`Unsupported frame version: ${version}`)
+  }
+  const type = FRAME_NAMES[view.getUint8(1)]
+  const seq = view.getUint32(2, true)
+  const count = view.getUint32(6, true)
+  if (buffer.byteLength !== HEADER_SIZE + RECORD_SIZE * count) {
+    throw new Error('Frame length does not match record count')
+  }
+
+  const buses = new Array(count)
+  for (let i = 0; i < count; i++) {
+    const offset = HEADER_SIZE + i * RECORD_SIZE
+    const heading = view.getUint16(offset + 14, true)
+    buses[i] = {
+      bus_id: view.getUint32(offset, true),
+      latitude: view.getInt32(offset + 4, true) / 1e6,
+      longitude: view.getInt32(offset + 8, true) / 1e6,
+      speed: view.getUint16(offset + 12, true) / 10,
+      heading: heading === NO_HEADING ? null : heading / 10
+    }
+  }
+  return { type, seq, buses }
+}